@@ -1,27 +1,25 @@
 import json
 import os
+import threading
 from datetime import datetime
-from queue import Queue
-from tinydb import TinyDB, Query
+from catalogo import obter_catalogo
+from pipeline import Pipeline, TempoEsgotadoPipeline
+from resposta import resposta_lambda
+from listarCatalogoUsuario import invalidar_visao_usuario
+from usuarios import gravar_filmes_usuario, ids_usuarios_por_nome, inserir_usuario, obter_usuario, versao_lista
 
-# Filas para simular o pipeline (SQS/SNS)
-filaFilmeAdicionado = Queue()
-filaNotificaAdicao = Queue()
+STATUS_VALIDOS = {'assistido', 'quero assistir'}
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-USUARIO_JSON = os.path.join(BASE_DIR, 'data', 'filmeUsuario.json')
-CATALOGO_JSON = os.path.join(BASE_DIR, 'data', 'filmes.json')
+# Quantidade máxima de filmes aceitos por adicionaFilmes
+MAX_FILMES_LOTE = 10000
 
+# Serializa o ler-modificar-gravar da lista de um mesmo usuário entre os
+# workers; usuários diferentes caem (quase sempre) em travas diferentes
+_locks_usuarios = [threading.Lock() for _ in range(64)]
 
-def _get_usuario_db():
-    """
-    Retorna uma instância do TinyDB para o arquivo de filmes do usuário.
-    O TinyDB cria o arquivo automaticamente caso não exista.
-    """
-    db = TinyDB(USUARIO_JSON, ensure_ascii=False, indent=2, encoding='utf-8')
-    # Garante que a tabela 'usuarios' exista
-    db.table('usuarios')
-    return db
+
+def _lock_usuario(nome):
+    return _locks_usuarios[hash(nome.lower()) % len(_locks_usuarios)]
 
 
 def _carrega_json_resiliente(path):
@@ -45,80 +43,38 @@ def _carrega_json_resiliente(path):
         return data, 'latin-1'
 
 
-def _get_catalogo_table():
-    db = TinyDB(CATALOGO_JSON, ensure_ascii=False, indent=2, encoding='utf-8')
-    return db.table("Filmes")
-
-def _bootstrap_catalogo_db():
-    """
-    Garante que o arquivo de catálogo esteja no formato esperado pelo TinyDB.
-    Se estiver no formato antigo (lista simples ou dict com chave 'filmes'),
-    converte automaticamente para o formato interno do TinyDB.
-    """
-    if not os.path.exists(CATALOGO_JSON):
-        TinyDB(CATALOGO_JSON, ensure_ascii=False, indent=2, encoding='utf-8').close()
-        return
-
-    try:
-        with open(CATALOGO_JSON, 'r', encoding='utf-8') as f:
-            if os.path.getsize(CATALOGO_JSON) == 0:
-                raise json.JSONDecodeError('empty', '', 0)
-            raw_data = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        TinyDB(CATALOGO_JSON, ensure_ascii=False, indent=2, encoding='utf-8').close()
-        return
-
-    if isinstance(raw_data, dict) and ("_default" in raw_data or "Filmes" in raw_data):
-        return
-
-    filmes = []
-    if isinstance(raw_data, dict) and isinstance(raw_data.get('filmes'), list):
-        filmes = raw_data['filmes']
-    elif isinstance(raw_data, list):
-        filmes = raw_data
-
-
-    db = TinyDB(CATALOGO_JSON, ensure_ascii=False, indent=2, encoding='utf-8')
-    table = db.table("Filmes")
-    table.truncate()
-    if filmes:
-        table.insert_multiple(filmes)
-    db.close()
-
-def _obter_filme_catalogo(payload_filme):
+def _obter_filme_catalogo(payload_filme, catalogo=None):
     """
     Busca o filme no catálogo oficial para garantir que os IDs e metadados
     sejam sincronizados. Primeiro tenta por ID, depois por nome.
+    `catalogo` permite resolver um lote inteiro contra o mesmo snapshot.
     """
     if not isinstance(payload_filme, dict):
         return None
 
-    _bootstrap_catalogo_db()
-    db = _get_catalogo_table()
-    filmes = db.all()
-    Filme = Query()
-    filme_catalogo = None
-
-    filme_id = payload_filme.get('id')
-    if filme_id is not None:
-        filme_catalogo = db.get(Filme.id == filme_id)
+    if catalogo is None:
+        catalogo = obter_catalogo()
+    filme_catalogo = catalogo.filme_por_id(payload_filme.get('id'))
 
     if not filme_catalogo:
-        nome_payload = payload_filme.get('nome')
-        if isinstance(nome_payload, str):
-            filme_catalogo = db.get(
-                Filme.nome.test(
-                    lambda valor: isinstance(valor, str) and valor.lower().strip() == nome_filme.lower().strip()
-                )
-            )
+        filme_catalogo = catalogo.filme_por_nome(payload_filme.get('nome'))
 
     return filme_catalogo.copy() if filme_catalogo else None
 
 
 def adicionaFilme(payload):
     """
-    Função principal: recebe o filme enviado pelo cliente, coloca na fila
-    `filaFilmeAdicionado`, executa a validação e dispara a notificação final.
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para adicionaFilmeDados.
+    """
+    return resposta_lambda(*adicionaFilmeDados(payload))
+
+
+def adicionaFilmeDados(payload):
+    """
+    Função principal: recebe o filme enviado pelo cliente, publica na fila
+    `filaFilmeAdicionado` e espera apenas pela própria notificação final.
+    Retorna a tupla (corpo, statusCode).
 
     payload esperado:
     {
@@ -128,61 +84,124 @@ def adicionaFilme(payload):
     }
     """
     try:
-        filaFilmeAdicionado.put(payload)
-        validaAdicao()
-        return disparaNotificacaoAdicao()
+        return pipelineAdicao.processar(payload)
+    except TempoEsgotadoPipeline:
+        return {
+            'sucesso': False,
+            'mensagem': 'Nenhuma notificação disponível.'
+        }, 504
     except Exception as exc:
         return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'sucesso': False,
-                'mensagem': f'Erro ao adicionar filme: {exc}'
-            }, ensure_ascii=False)
-        }
+            'sucesso': False,
+            'mensagem': f'Erro ao adicionar filme: {exc}'
+        }, 500
+
+
+def adicionaFilmes(payload):
+    """
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para adicionaFilmesDados.
+    """
+    return resposta_lambda(*adicionaFilmesDados(payload))
 
 
-def validaAdicao():
+def adicionaFilmesDados(payload):
     """
-    Consome `filaFilmeAdicionado`, valida status e atualiza `filmeUsuario.json`.
-    Ao final, insere a confirmação/erro em `filaNotificaAdicao`.
+    Importa vários filmes para a lista do usuário de uma vez (ex.: o
+    histórico de outra plataforma), com uma única gravação da lista.
+    Retorna a tupla (corpo, statusCode); `resultados` traz uma notificação
+    por item, no mesmo formato de adicionaFilmeDados.
+
+    payload esperado:
+    {
+        "usuario": "Débora",
+        "filmes": [
+            {"filme": { ... }, "status": "assistido" | "quero assistir"},
+            ...
+        ]
+    }
     """
     try:
-        mensagem = filaFilmeAdicionado.get(timeout=1)
-    except Exception:
-        return
+        return pipelineAdicaoLote.processar(payload)
+    except TempoEsgotadoPipeline:
+        return {
+            'sucesso': False,
+            'mensagem': 'Nenhuma notificação disponível.'
+        }, 504
+    except Exception as exc:
+        return {
+            'sucesso': False,
+            'mensagem': f'Erro ao adicionar filmes: {exc}'
+        }, 500
 
-    usuario = mensagem.get('usuario')
-    filme = mensagem.get('filme')
-    status = (mensagem.get('status') or '').lower().strip()
 
-    if not usuario or not isinstance(filme, dict):
-        filaNotificaAdicao.put({
+def _valida_item(filme, status, catalogo=None):
+    """
+    Valida um filme/status pedido pelo cliente contra o catálogo oficial.
+
+    Returns:
+        Tupla (filme_catalogo, status normalizado, erro), onde erro é None
+        ou a notificação de falha.
+    """
+    status = (status or '').lower().strip()
+
+    if not isinstance(filme, dict):
+        return None, status, {
             'sucesso': False,
             'mensagem': 'Campos obrigatórios ausentes (usuario/filme).'
-        })
-        return
+        }
 
-    if status not in {'assistido', 'quero assistir'}:
-        filaNotificaAdicao.put({
+    if status not in STATUS_VALIDOS:
+        return None, status, {
             'sucesso': False,
             'mensagem': 'Status inválido. Use "assistido" ou "quero assistir".'
-        })
-        return
+        }
 
-    filme_catalogo = _obter_filme_catalogo(filme)
+    filme_catalogo = _obter_filme_catalogo(filme, catalogo)
     if not filme_catalogo:
-        filaNotificaAdicao.put({
+        return None, status, {
             'sucesso': False,
             'mensagem': 'Filme não encontrado no catálogo oficial.'
-        })
-        return
-
-    with _get_usuario_db() as db:
-        usuarios_table = db.table('usuarios')
-        Usuario = Query()
-        usuario_doc = usuarios_table.get(
-            Usuario.nome.test(lambda valor: isinstance(valor, str) and valor.lower() == usuario.lower())
-        )
+        }
+
+    return filme_catalogo, status, None
+
+
+def _registro_filme(filme_catalogo, status):
+    """
+    Registro gravado na lista do usuário para um filme do catálogo.
+    """
+    return {
+        'id': filme_catalogo.get('id'),
+        'nome': filme_catalogo.get('nome'),
+        'descricao': filme_catalogo.get('descricao'),
+        'status': status,
+        'adicionado_em': datetime.utcnow().isoformat() + 'Z'
+    }
+
+
+def validaAdicao(mensagem):
+    """
+    Estágio que consome `filaFilmeAdicionado`, valida status e atualiza a
+    lista do usuário. Retorna a confirmação/erro para `filaNotificaAdicao`.
+    """
+    usuario = mensagem.get('usuario')
+    filme = mensagem.get('filme')
+
+    if not usuario or not isinstance(filme, dict):
+        return {
+            'sucesso': False,
+            'mensagem': 'Campos obrigatórios ausentes (usuario/filme).'
+        }
+
+    filme_catalogo, status, erro = _valida_item(filme, mensagem.get('status'))
+    if erro:
+        return erro
+
+    with _lock_usuario(usuario):
+        # Índice de nomes (sem diferenciar caixa): o primeiro usuário com esse nome
+        ids_usuario = ids_usuarios_por_nome(usuario)
+        usuario_doc = obter_usuario(ids_usuario[0]) if ids_usuario else None
 
         registros_filmes = []
         if usuario_doc:
@@ -191,69 +210,174 @@ def validaAdicao():
         nome_filme = filme_catalogo.get('nome')
         filme_id = filme_catalogo.get('id')
 
-        existente = next(
+        posicao = next(
             (
-                f for f in registros_filmes
+                i for i, f in enumerate(registros_filmes)
                 if (filme_id is not None and f.get('id') == filme_id)
                 or (nome_filme and f.get('nome', '').lower() == nome_filme.lower())
             ),
             None
         )
 
-        registro_atualizado = {
-            'id': filme_id,
-            'nome': nome_filme,
-            'descricao': filme_catalogo.get('descricao'),
-            'status': status,
-            'adicionado_em': datetime.utcnow().isoformat() + 'Z'
-        }
+        registro_atualizado = _registro_filme(filme_catalogo, status)
 
-        if existente:
-            existente.update(registro_atualizado)
+        if posicao is not None:
+            registros_filmes[posicao] = dict(registros_filmes[posicao], **registro_atualizado)
             msg = f'Filme "{nome_filme}" atualizado para "{status}".'
         else:
+            posicao = len(registros_filmes)
             registros_filmes.append(registro_atualizado)
             msg = f'Filme "{nome_filme}" adicionado com status "{status}".'
 
         usuario_id = None
         if usuario_doc:
             usuario_id = usuario_doc.doc_id
-            usuarios_table.update({'filmes': registros_filmes}, doc_ids=[usuario_id])
+            # Só o filme alterado vai para o armazenamento, não a lista inteira
+            gravar_filmes_usuario(
+                usuario_id, {posicao: registros_filmes[posicao]}, versao_lista(usuario_doc) + 1
+            )
         else:
             # Cria novo usuário e captura o doc_id retornado
-            usuario_id = usuarios_table.insert({'nome': usuario, 'filmes': registros_filmes})
+            usuario_id = inserir_usuario({'nome': usuario, 'filmes': registros_filmes, 'versao_lista': 1})
+        invalidar_visao_usuario(usuario_id)
 
-    filaNotificaAdicao.put({
+    return {
         'sucesso': True,
         'mensagem': msg,
         'usuario': usuario,
         'usuario_id': usuario_id,
         'filme': registro_atualizado
-    })
+    }
 
 
-def disparaNotificacaoAdicao():
+def validaAdicaoLote(mensagem):
     """
-    Consome `filaNotificaAdicao` e devolve resposta simulando um SNS.
+    Estágio que consome `filaFilmesAdicionados`: resolve todos os filmes do
+    lote contra um único snapshot do catálogo, elimina duplicatas por id/nome
+    e grava a lista do usuário uma única vez.
+    Retorna o resumo com o resultado de cada item para `filaNotificaAdicaoLote`.
     """
-    try:
-        notificacao = filaNotificaAdicao.get(timeout=1)
-    except Exception:
+    usuario = mensagem.get('usuario')
+    itens = mensagem.get('filmes')
+
+    if not usuario or not isinstance(itens, list) or not itens:
         return {
-            'statusCode': 504,
-            'body': json.dumps({
-                'sucesso': False,
-                'mensagem': 'Nenhuma notificação disponível.'
-            }, ensure_ascii=False)
+            'sucesso': False,
+            'mensagem': 'Campos obrigatórios ausentes (usuario/filmes).'
         }
 
-    status = 200 if notificacao.get('sucesso') else 400
+    if len(itens) > MAX_FILMES_LOTE:
+        return {
+            'sucesso': False,
+            'mensagem': f'Máximo de {MAX_FILMES_LOTE} filmes por importação'
+        }
+
+    catalogo = obter_catalogo()
+    validados = [
+        _valida_item(item.get('filme'), item.get('status'), catalogo) if isinstance(item, dict)
+        else (None, '', {'sucesso': False, 'mensagem': 'Item inválido. Use {"filme": {...}, "status": "..."}.'})
+        for item in itens
+    ]
+
+    resultados = []
+    with _lock_usuario(usuario):
+        ids_usuario = ids_usuarios_por_nome(usuario)
+        usuario_doc = obter_usuario(ids_usuario[0]) if ids_usuario else None
+        registros_filmes = list(usuario_doc.get('filmes', [])) if usuario_doc else []
+
+        # Posição na lista dos filmes já nela, por id e por nome (sem diferenciar caixa)
+        por_id = {}
+        por_nome = {}
+        for posicao, registro in enumerate(registros_filmes):
+            if registro.get('id') is not None:
+                por_id.setdefault(registro['id'], posicao)
+            if registro.get('nome'):
+                por_nome.setdefault(registro['nome'].lower(), posicao)
+
+        alterados = set()
+        for filme_catalogo, status, erro in validados:
+            if erro:
+                resultados.append(dict(erro, usuario=usuario))
+                continue
+
+            nome_filme = filme_catalogo.get('nome')
+            filme_id = filme_catalogo.get('id')
+            posicao = por_id.get(filme_id) if filme_id is not None else None
+            if posicao is None and nome_filme:
+                posicao = por_nome.get(nome_filme.lower())
+
+            registro_atualizado = _registro_filme(filme_catalogo, status)
+            if posicao is not None:
+                registros_filmes[posicao] = dict(registros_filmes[posicao], **registro_atualizado)
+                msg = f'Filme "{nome_filme}" atualizado para "{status}".'
+            else:
+                posicao = len(registros_filmes)
+                registros_filmes.append(registro_atualizado)
+                msg = f'Filme "{nome_filme}" adicionado com status "{status}".'
+            if filme_id is not None:
+                por_id.setdefault(filme_id, posicao)
+            if nome_filme:
+                por_nome.setdefault(nome_filme.lower(), posicao)
+            alterados.add(posicao)
+
+            resultados.append({
+                'sucesso': True,
+                'mensagem': msg,
+                'usuario': usuario,
+                'filme': dict(registro_atualizado)
+            })
+
+        usuario_id = usuario_doc.doc_id if usuario_doc else None
+        if alterados:
+            # Uma única escrita para o lote inteiro, só com os filmes alterados
+            if usuario_doc:
+                gravar_filmes_usuario(
+                    usuario_id,
+                    {posicao: registros_filmes[posicao] for posicao in alterados},
+                    versao_lista(usuario_doc) + 1
+                )
+            else:
+                usuario_id = inserir_usuario({'nome': usuario, 'filmes': registros_filmes, 'versao_lista': 1})
+            invalidar_visao_usuario(usuario_id)
+
+    for resultado in resultados:
+        resultado['usuario_id'] = usuario_id
+
+    total_sucesso = sum(1 for resultado in resultados if resultado['sucesso'])
     return {
-        'statusCode': status,
-        'body': json.dumps(notificacao, ensure_ascii=False, indent=2)
+        'sucesso': total_sucesso > 0,
+        'mensagem': f'{total_sucesso} de {len(resultados)} filmes importados.',
+        'usuario': usuario,
+        'usuario_id': usuario_id,
+        'total': len(resultados),
+        'total_sucesso': total_sucesso,
+        'total_erros': len(resultados) - total_sucesso,
+        'resultados': resultados
     }
 
 
+def disparaNotificacaoAdicao(notificacao):
+    """
+    Estágio que consome `filaNotificaAdicao` e devolve (corpo, statusCode)
+    simulando um SNS.
+    """
+    status = 200 if notificacao.get('sucesso') else 400
+    return notificacao, status
+
+
+# Pipeline da adição: cada requisição recebe de volta apenas a própria notificação
+pipelineAdicao = Pipeline('adicionaFilme', [
+    ('filaFilmeAdicionado', validaAdicao),
+    ('filaNotificaAdicao', disparaNotificacaoAdicao)
+])
+
+# Pipeline da importação em lote: uma mensagem por lote, mesma notificação final
+pipelineAdicaoLote = Pipeline('adicionaFilmes', [
+    ('filaFilmesAdicionados', validaAdicaoLote),
+    ('filaNotificaAdicaoLote', disparaNotificacaoAdicao)
+])
+
+
 # Teste local rápido
 if __name__ == '__main__':
     exemplo = {
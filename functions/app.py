@@ -1,23 +1,30 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify
 from flask_cors import CORS
 import sys
 import os
-import json
+import threading
 
 # Adiciona o diretório functions ao path para importar as funções
 # Se o app.py estiver na raiz, descomente a linha abaixo
 # sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'functions'))
 
-from buscaFilme import buscaFilme
-from adicionaFilme import adicionaFilme
-from listarCatalogoUsuario import listarCatalogoUsuario
-from cadastraFilmeDesejado import cadastraFilmeDesejado
+from buscaFilme import MODO_BUSCA_PADRAO, buscaFilmeDados, buscaFilmesDados, cacheBuscaFilme
+from adicionaFilme import adicionaFilmeDados, adicionaFilmesDados
+from listarCatalogoUsuario import listarCatalogoUsuarioDados, streamCatalogoUsuario, visaoCatalogoUsuario
+from cadastraFilmeDesejado import cadastraFilmeDesejadoDados
+from cadastraFilmesCatalogo import cadastraFilmesCatalogoDados
+from consultaStreamings import disponiveisStreamingDados, saindoStreamingDados
+from filtraFilmes import filtraFilmesDados
+from migracao import preparar_armazenamento
+from catalogo import CatalogoMapeado, obter_catalogo
+from desejados import obter_desejados
+from usuarios import carregar_usuarios
 
-app = Flask(__name__)
-CORS(app)  # Permite requisições do Postman e outros clientes
+# Rotas da API; registradas na aplicação criada por criar_app
+api = Blueprint('api', __name__)
 
 
-@app.route('/')
+@api.route('/')
 def index():
     """Rota raiz com informações da API"""
     return jsonify({
@@ -29,7 +36,17 @@ def index():
                 'url': '/api/buscar-filme',
                 'descricao': 'Busca um filme no catálogo',
                 'body': {
-                    'nome': 'string (nome do filme)'
+                    'nome': 'string (nome do filme)',
+                    'modo': 'string (opcional: "indice", "vetorial" ou "exaustivo")'
+                }
+            },
+            'buscar_filmes': {
+                'metodo': 'POST',
+                'url': '/api/buscar-filmes',
+                'descricao': 'Busca vários filmes no catálogo de uma vez (ex.: uma watchlist)',
+                'body': {
+                    'nomes': 'lista de strings (nomes dos filmes)',
+                    'modo': 'string (opcional: "indice", "vetorial" ou "exaustivo")'
                 }
             },
             'adicionar_filme': {
@@ -45,12 +62,36 @@ def index():
                     'status': 'string ("assistido" ou "quero assistir")'
                 }
             },
+            'adicionar_filmes': {
+                'metodo': 'POST',
+                'url': '/api/adicionar-filmes',
+                'descricao': 'Importa vários filmes para o catálogo do usuário de uma vez (ex.: histórico)',
+                'body': {
+                    'usuario': 'string (nome do usuário)',
+                    'filmes': 'lista de {"filme": {"id" ou "nome"}, "status": "assistido" ou "quero assistir"}'
+                }
+            },
             'listar_catalogo': {
                 'metodo': 'GET',
                 'url': '/api/listar-catalogo-usuario/<usuario_id>',
                 'descricao': 'Lista o catálogo de filmes do usuário',
                 'parametros': {
-                    'usuario_id': 'integer (ID do usuário)'
+                    'usuario_id': 'integer (ID do usuário)',
+                    'limite': 'integer (opcional, filmes por página, ordem de adicionado_em)',
+                    'cursor': 'string (opcional, "proximo_cursor" da página anterior)',
+                    'status': 'string (opcional: "assistido" ou "quero assistir")'
+                },
+                'cabecalhos': {
+                    'If-None-Match': 'ETag da resposta anterior (opcional, 304 se a lista não mudou)'
+                }
+            },
+            'listar_catalogo_stream': {
+                'metodo': 'GET',
+                'url': '/api/listar-catalogo-usuario/<usuario_id>/stream',
+                'descricao': 'Lista o catálogo inteiro do usuário em streaming (resposta chunked)',
+                'parametros': {
+                    'usuario_id': 'integer (ID do usuário)',
+                    'status': 'string (opcional: "assistido" ou "quero assistir")'
                 }
             },
             'cadastrar_filme_desejado': {
@@ -62,19 +103,68 @@ def index():
                     'usuario': 'string (nome do usuário - apenas se não houver nomes duplicados)',
                     'nome_filme': 'string (nome do filme a ser monitorado)'
                 }
+            },
+            'cadastrar_filmes_catalogo': {
+                'metodo': 'POST',
+                'url': '/api/cadastrar-filmes-catalogo',
+                'descricao': 'Insere/atualiza filmes no catálogo (upsert por id) e notifica quem os desejava',
+                'body': {
+                    'filmes': 'lista de filmes (nome obrigatório; id, descricao, detalhes e streamings opcionais)'
+                }
+            },
+            'filtrar_filmes': {
+                'metodo': 'GET',
+                'url': '/api/filmes',
+                'descricao': 'Filtra o catálogo por gênero, ano, diretor e duração, com contagens por faceta',
+                'parametros': {
+                    'generos': 'string (opcional, separados por vírgula ou repetidos; basta um)',
+                    'diretor': 'string (opcional, separados por vírgula ou repetidos)',
+                    'ano': 'integer (opcional)',
+                    'ano_de': 'integer (opcional)',
+                    'ano_ate': 'integer (opcional)',
+                    'duracao_de': 'integer (opcional, minutos)',
+                    'duracao_ate': 'integer (opcional, minutos)',
+                    'limite': 'integer (opcional, padrão 50, máximo 500)',
+                    'inicio': 'integer (opcional, deslocamento)'
+                }
+            },
+            'streamings_disponiveis': {
+                'metodo': 'GET',
+                'url': '/api/streamings/disponiveis',
+                'descricao': 'Filmes disponíveis numa plataforma em uma data',
+                'parametros': {
+                    'plataforma': 'string (opcional, todas se omitida)',
+                    'data': 'string (opcional, AAAA-MM-DD; padrão: hoje)'
+                }
+            },
+            'streamings_saindo': {
+                'metodo': 'GET',
+                'url': '/api/streamings/saindo',
+                'descricao': 'Filmes que saem de uma plataforma nos próximos N dias',
+                'parametros': {
+                    'plataforma': 'string (opcional, todas se omitida)',
+                    'dias': 'integer (janela em dias)',
+                    'data': 'string (opcional, AAAA-MM-DD; padrão: hoje)'
+                }
+            },
+            'cache_busca': {
+                'metodo': 'GET',
+                'url': '/api/cache-busca',
+                'descricao': 'Estatísticas do cache de resultados de /api/buscar-filme (acertos, falhas, remoções)'
             }
         }
     }), 200
 
 
-@app.route('/api/buscar-filme', methods=['POST'])
+@api.route('/api/buscar-filme', methods=['POST'])
 def api_buscar_filme():
     """
     Endpoint para buscar um filme no catálogo.
     
     Body esperado:
     {
-        "nome": "O Enigma da Aurora"
+        "nome": "O Enigma da Aurora",
+        "modo": "indice"  # opcional: "indice", "vetorial" ou "exaustivo"
     }
     """
     try:
@@ -95,13 +185,51 @@ def api_buscar_filme():
             }), 400
         
         # Chama a função de busca
-        resultado = buscaFilme(nome_filme)
+        corpo, status_code = buscaFilmeDados(nome_filme, modo=data.get('modo'))
+        
+        # Retorna com o status code apropriado
+        return jsonify(corpo), status_code
+    
+    except Exception as e:
+        return jsonify({
+            'sucesso': False,
+            'mensagem': f'Erro ao processar requisição: {str(e)}'
+        }), 500
+
+
+@api.route('/api/buscar-filmes', methods=['POST'])
+def api_buscar_filmes():
+    """
+    Endpoint para buscar vários filmes no catálogo de uma vez.
+    
+    Body esperado:
+    {
+        "nomes": ["O Enigma da Aurora", "Sombras do Atlantico"],
+        "modo": "indice"  # opcional
+    }
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                'sucesso': False,
+                'mensagem': 'Body da requisição não fornecido'
+            }), 400
+        
+        nomes = data.get('nomes')
+        
+        if not nomes or not isinstance(nomes, list):
+            return jsonify({
+                'sucesso': False,
+                'mensagem': 'Campo "nomes" é obrigatório e deve ser uma lista'
+            }), 400
         
-        # Converte o body (que é uma string JSON) de volta para dict
-        body_dict = json.loads(resultado['body'])
+        # Chama a função de busca em lote
+        corpo, status_code = buscaFilmesDados(nomes, modo=data.get('modo'))
         
         # Retorna com o status code apropriado
-        return jsonify(body_dict), resultado['statusCode']
+        return jsonify(corpo), status_code
     
     except Exception as e:
         return jsonify({
@@ -110,7 +238,7 @@ def api_buscar_filme():
         }), 500
 
 
-@app.route('/api/adicionar-filme', methods=['POST'])
+@api.route('/api/adicionar-filme', methods=['POST'])
 def api_adicionar_filme():
     """
     Endpoint para adicionar um filme ao catálogo do usuário.
@@ -171,13 +299,65 @@ def api_adicionar_filme():
         }
         
         # Chama a função de adicionar filme
-        resultado = adicionaFilme(payload)
+        corpo, status_code = adicionaFilmeDados(payload)
         
-        # Converte o body (que é uma string JSON) de volta para dict
-        body_dict = json.loads(resultado['body'])
+        # Retorna com o status code apropriado
+        return jsonify(corpo), status_code
+    
+    except Exception as e:
+        return jsonify({
+            'sucesso': False,
+            'mensagem': f'Erro ao processar requisição: {str(e)}'
+        }), 500
+
+
+@api.route('/api/adicionar-filmes', methods=['POST'])
+def api_adicionar_filmes():
+    """
+    Endpoint para importar vários filmes para o catálogo do usuário de uma vez.
+    
+    Body esperado:
+    {
+        "usuario": "Débora",
+        "filmes": [
+            {"filme": {"id": 1}, "status": "assistido"},
+            {"filme": {"nome": "Sombras do Atlântico"}, "status": "quero assistir"}
+        ]
+    }
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                'sucesso': False,
+                'mensagem': 'Body da requisição não fornecido'
+            }), 400
+        
+        usuario = data.get('usuario')
+        filmes = data.get('filmes')
+        
+        # Validações
+        if not usuario:
+            return jsonify({
+                'sucesso': False,
+                'mensagem': 'Campo "usuario" é obrigatório'
+            }), 400
+        
+        if not filmes or not isinstance(filmes, list):
+            return jsonify({
+                'sucesso': False,
+                'mensagem': 'Campo "filmes" é obrigatório e deve ser uma lista'
+            }), 400
+        
+        # Chama a função de importação em lote
+        corpo, status_code = adicionaFilmesDados({
+            'usuario': usuario,
+            'filmes': filmes
+        })
         
         # Retorna com o status code apropriado
-        return jsonify(body_dict), resultado['statusCode']
+        return jsonify(corpo), status_code
     
     except Exception as e:
         return jsonify({
@@ -186,23 +366,43 @@ def api_adicionar_filme():
         }), 500
 
 
-@app.route('/api/listar-catalogo-usuario/<int:usuario_id>', methods=['GET'])
+@api.route('/api/listar-catalogo-usuario/<int:usuario_id>', methods=['GET'])
 def api_listar_catalogo_usuario(usuario_id):
     """
     Endpoint para listar o catálogo de filmes do usuário.
     
     Parâmetros:
     - usuario_id: ID do usuário (integer)
+    - limite, cursor, status: query string opcional para paginar/filtrar
+      (ex.: ?limite=50&cursor=<proximo_cursor>&status=assistido)
+    
+    A listagem completa (sem esses parâmetros) vem da visão materializada e
+    traz ETag: com If-None-Match igual, a resposta é 304 sem corpo.
     """
     try:
-        # Chama a função de listar catálogo
-        resultado = listarCatalogoUsuario(usuario_id)
+        if not any(request.args.get(nome) for nome in ('limite', 'cursor', 'status')):
+            visao, status_code = visaoCatalogoUsuario(usuario_id)
+            if status_code != 200:
+                return jsonify(visao), status_code
+            
+            if request.if_none_match.contains(visao.etag):
+                resposta = Response(status=304)
+            else:
+                resposta = Response(visao.corpo_json, status=200, mimetype='application/json')
+            resposta.set_etag(visao.etag)
+            resposta.headers['Cache-Control'] = 'no-cache'
+            return resposta
         
-        # Converte o body (que é uma string JSON) de volta para dict
-        body_dict = json.loads(resultado['body'])
+        # Chama a função de listar catálogo
+        corpo, status_code = listarCatalogoUsuarioDados(
+            usuario_id,
+            limite=request.args.get('limite'),
+            cursor=request.args.get('cursor'),
+            status=request.args.get('status')
+        )
         
         # Retorna com o status code apropriado
-        return jsonify(body_dict), resultado['statusCode']
+        return jsonify(corpo), status_code
     
     except ValueError:
         return jsonify({
@@ -217,7 +417,33 @@ def api_listar_catalogo_usuario(usuario_id):
         }), 500
 
 
-@app.route('/api/cadastrar-filme-desejado', methods=['POST'])
+@api.route('/api/listar-catalogo-usuario/<int:usuario_id>/stream', methods=['GET'])
+def api_listar_catalogo_usuario_stream(usuario_id):
+    """
+    Endpoint que lista o catálogo inteiro do usuário em streaming: os filmes
+    são gerados em lotes, então o cliente recebe os primeiros bytes logo e o
+    servidor não monta a resposta inteira em memória.
+    
+    Parâmetros:
+    - usuario_id: ID do usuário (integer)
+    - status: query string opcional ("assistido" ou "quero assistir")
+    """
+    try:
+        corpo, status_code = streamCatalogoUsuario(usuario_id, status=request.args.get('status'))
+        
+        if status_code != 200:
+            return jsonify(corpo), status_code
+        
+        return Response(corpo, status=200, mimetype='application/json')
+    
+    except Exception as e:
+        return jsonify({
+            'sucesso': False,
+            'mensagem': f'Erro ao processar requisição: {str(e)}'
+        }), 500
+
+
+@api.route('/api/cadastrar-filme-desejado', methods=['POST'])
 def api_cadastrar_filme_desejado():
     """
     Endpoint para cadastrar um filme desejado para monitoramento.
@@ -272,13 +498,82 @@ def api_cadastrar_filme_desejado():
             payload['usuario'] = usuario
         
         # Chama a função de cadastrar filme desejado
-        resultado = cadastraFilmeDesejado(payload)
+        corpo, status_code = cadastraFilmeDesejadoDados(payload)
         
-        # Converte o body (que é uma string JSON) de volta para dict
-        body_dict = json.loads(resultado['body'])
+        # Retorna com o status code apropriado
+        return jsonify(corpo), status_code
+    
+    except Exception as e:
+        return jsonify({
+            'sucesso': False,
+            'mensagem': f'Erro ao processar requisição: {str(e)}'
+        }), 500
+
+
+@api.route('/api/cadastrar-filmes-catalogo', methods=['POST'])
+def api_cadastrar_filmes_catalogo():
+    """
+    Endpoint para a chegada de filmes ao catálogo. Os filmes que estavam
+    sendo monitorados como desejados geram uma notificação para todos os
+    interessados e saem do monitoramento.
+    
+    Body esperado:
+    {
+        "filmes": [
+            {"id": 11, "nome": "Matrix 5", "descricao": "...", "detalhes": {...}, "streamings": [...]}
+        ]
+    }
+    """
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({
+                'sucesso': False,
+                'mensagem': 'Body da requisição não fornecido'
+            }), 400
+        
+        filmes = data.get('filmes')
+        
+        if not filmes or not isinstance(filmes, list):
+            return jsonify({
+                'sucesso': False,
+                'mensagem': 'Campo "filmes" é obrigatório e deve ser uma lista'
+            }), 400
+        
+        # Chama a função de ingestão no catálogo
+        corpo, status_code = cadastraFilmesCatalogoDados({'filmes': filmes})
         
         # Retorna com o status code apropriado
-        return jsonify(body_dict), resultado['statusCode']
+        return jsonify(corpo), status_code
+    
+    except Exception as e:
+        return jsonify({
+            'sucesso': False,
+            'mensagem': f'Erro ao processar requisição: {str(e)}'
+        }), 500
+
+
+@api.route('/api/filmes', methods=['GET'])
+def api_filmes():
+    """
+    Endpoint para filtrar o catálogo por facetas.
+    
+    Parâmetros (query string), todos opcionais:
+    - generos, diretor: valores separados por vírgula ou parâmetro repetido
+    - ano, ano_de, ano_ate, duracao_de, duracao_ate: inteiros
+    - limite, inicio: paginação
+    
+    Ex.: /api/filmes?generos=Ficção Científica&ano_de=2020&ano_ate=2024&duracao_ate=130
+    """
+    try:
+        filtros = {nome: request.args.get(nome) for nome in request.args}
+        filtros['generos'] = [v for valor in request.args.getlist('generos') for v in valor.split(',')]
+        filtros['diretor'] = [v for valor in request.args.getlist('diretor') for v in valor.split(',')]
+        
+        corpo, status_code = filtraFilmesDados(filtros)
+        
+        return jsonify(corpo), status_code
     
     except Exception as e:
         return jsonify({
@@ -287,7 +582,68 @@ def api_cadastrar_filme_desejado():
         }), 500
 
 
-@app.errorhandler(404)
+@api.route('/api/streamings/disponiveis', methods=['GET'])
+def api_streamings_disponiveis():
+    """
+    Endpoint para listar os filmes disponíveis numa plataforma em uma data.
+    
+    Parâmetros (query string):
+    - plataforma: nome da plataforma (opcional, todas se omitida)
+    - data: AAAA-MM-DD (opcional, padrão: hoje)
+    """
+    try:
+        corpo, status_code = disponiveisStreamingDados(
+            plataforma=request.args.get('plataforma'),
+            data=request.args.get('data')
+        )
+        
+        return jsonify(corpo), status_code
+    
+    except Exception as e:
+        return jsonify({
+            'sucesso': False,
+            'mensagem': f'Erro ao processar requisição: {str(e)}'
+        }), 500
+
+
+@api.route('/api/streamings/saindo', methods=['GET'])
+def api_streamings_saindo():
+    """
+    Endpoint para listar os filmes que saem de uma plataforma nos próximos dias.
+    
+    Parâmetros (query string):
+    - plataforma: nome da plataforma (opcional, todas se omitida)
+    - dias: janela em dias (obrigatório)
+    - data: AAAA-MM-DD (opcional, padrão: hoje)
+    """
+    try:
+        corpo, status_code = saindoStreamingDados(
+            plataforma=request.args.get('plataforma'),
+            dias=request.args.get('dias'),
+            data=request.args.get('data')
+        )
+        
+        return jsonify(corpo), status_code
+    
+    except Exception as e:
+        return jsonify({
+            'sucesso': False,
+            'mensagem': f'Erro ao processar requisição: {str(e)}'
+        }), 500
+
+
+@api.route('/api/cache-busca', methods=['GET'])
+def api_cache_busca():
+    """
+    Endpoint com as estatísticas do cache de resultados de /api/buscar-filme.
+    """
+    return jsonify({
+        'sucesso': True,
+        'dados': cacheBuscaFilme.estatisticas()
+    }), 200
+
+
+@api.app_errorhandler(404)
 def not_found(error):
     """Handler para rotas não encontradas"""
     return jsonify({
@@ -296,7 +652,7 @@ def not_found(error):
     }), 404
 
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def internal_error(error):
     """Handler para erros internos"""
     return jsonify({
@@ -305,15 +661,86 @@ def internal_error(error):
     }), 500
 
 
+def criar_app():
+    """
+    Fábrica da aplicação Flask com as rotas da API.
+    
+    Converte o catálogo para o formato atual uma única vez, na inicialização
+    (as requisições confiam no marcador de schema gravado pela migração) e,
+    no backend SQLite, importa os dados de data/ na primeira execução.
+    """
+    aplicacao = Flask(__name__)
+    CORS(aplicacao)  # Permite requisições do Postman e outros clientes
+    
+    # Cada resposta é serializada uma única vez, em JSON compacto (inclusive em debug)
+    aplicacao.json.compact = True
+    aplicacao.json.ensure_ascii = False
+    aplicacao.json.sort_keys = False
+    
+    preparar_armazenamento()
+    aplicacao.register_blueprint(api)
+    return aplicacao
+
+
+_lock_app = threading.Lock()
+
+
+def __getattr__(nome):
+    """
+    Ponto de entrada WSGI `app` (`flask --app app run`, `gunicorn app:app`):
+    criado pela fábrica no primeiro acesso a `app.app` e reaproveitado
+    depois. Só importar o módulo continua não criando nenhuma aplicação.
+    """
+    if nome != 'app':
+        raise AttributeError(f'module {__name__!r} has no attribute {nome!r}')
+    with _lock_app:
+        if 'app' not in globals():
+            globals()['app'] = criar_app()
+    return globals()['app']
+
+
+def aquecer_dados():
+    """
+    Carrega os snapshots e monta os índices que as requisições usam
+    (catálogo com o índice de busca, facetas e disponibilidade, filmes
+    desejados, usuários e, no modo 'vetorial', a matriz de trigramas). No modo de
+    produção (gunicorn.conf.py) roda no processo pai antes do fork, e os
+    workers herdam tudo pronto. Com o catálogo compilado (mmap), nenhum blob
+    é decodificado aqui: facetas e disponibilidade são montadas sob demanda.
+    """
+    catalogo = obter_catalogo()
+    if not isinstance(catalogo, CatalogoMapeado):
+        # No catálogo compilado, montar facetas e janelas decodificaria o
+        # blob de todos os filmes; lá elas ficam para a primeira consulta
+        catalogo.facetas()
+        catalogo.disponibilidade()
+    obter_desejados()
+    carregar_usuarios()
+    if MODO_BUSCA_PADRAO == 'vetorial':
+        from buscaVetorial import disponivel, obter_motor
+        if disponivel():
+            obter_motor(catalogo)
+
+
 if __name__ == '__main__':
+    app = criar_app()
+    
     print("=" * 50)
     print("MovieFinder API - Servidor Flask")
     print("=" * 50)
     print("\nEndpoints disponíveis:")
     print("  POST   /api/buscar-filme")
+    print("  POST   /api/buscar-filmes")
     print("  POST   /api/adicionar-filme")
+    print("  POST   /api/adicionar-filmes")
     print("  GET    /api/listar-catalogo-usuario/<usuario_id>")
+    print("  GET    /api/listar-catalogo-usuario/<usuario_id>/stream")
     print("  POST   /api/cadastrar-filme-desejado")
+    print("  POST   /api/cadastrar-filmes-catalogo")
+    print("  GET    /api/filmes?generos=&ano_de=&ano_ate=&diretor=&duracao_ate=")
+    print("  GET    /api/streamings/disponiveis?plataforma=&data=")
+    print("  GET    /api/streamings/saindo?plataforma=&dias=&data=")
+    print("  GET    /api/cache-busca")
     print("\nServidor rodando em: http://localhost:5000")
     print("Documentação da API: http://localhost:5000/")
     print("=" * 50)
@@ -0,0 +1,461 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+from tinydb import TinyDB
+from tinydb.table import Document
+
+try:
+    import fcntl
+except ImportError:  # Windows: trava apenas entre threads do processo
+    fcntl = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SQLITE_DB = os.path.join(BASE_DIR, 'data', 'moviefinder.sqlite3')
+
+# Onde ficam catálogo, listas dos usuários e filmes desejados:
+# - 'tinydb': arquivos JSON em data/ (padrão)
+# - 'sqlite': um banco SQLite com índices (data/moviefinder.sqlite3)
+BACKENDS = ('tinydb', 'sqlite')
+BACKEND = os.environ.get('MOVIEFINDER_BACKEND', 'tinydb')
+
+# Tamanho mínimo (bytes) do journal de uma tabela TinyDB antes de ser
+# consolidado no JSON; acima dele, consolida quando passa do próprio JSON
+LIMITE_JOURNAL_TINYDB = 1 << 20
+
+
+@contextmanager
+def trava_arquivo(path_lock, compartilhada=False):
+    """
+    Trava entre processos (flock) associada a `path_lock`. Sem fcntl
+    (Windows) não faz nada: valem só as travas entre threads.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path_lock, 'a') as trava:
+        fcntl.flock(trava, fcntl.LOCK_SH if compartilhada else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+def abrir_sqlite(path):
+    """
+    Conexão SQLite em WAL e sem transações implícitas (cada escrita abre a
+    sua com BEGIN IMMEDIATE).
+    """
+    conexao = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conexao.execute('PRAGMA journal_mode=WAL')
+    conexao.execute('PRAGMA synchronous=NORMAL')
+    return conexao
+
+
+class TabelaTinyDB:
+    """
+    Tabela de um arquivo TinyDB.
+
+    `colunas` mapeia nome -> função(documento) e define os campos derivados
+    usados em `buscar` (no TinyDB a busca é uma varredura; no SQLite são
+    colunas indexadas), para que os dois backends respondam igual.
+
+    Com `journal=True`, `gravar` não regrava o JSON: anexa uma linha
+    `{"doc_id", "doc"}` por documento (com fsync) a `<nome do arquivo>.journal`,
+    e as leituras aplicam o journal por cima do JSON. O journal é consolidado
+    no JSON quando fica maior que ele (e que LIMITE_JOURNAL_TINYDB), antes de
+    qualquer outra escrita e em `consolidar()`: gravar em lotes custa o tamanho
+    dos lotes mais regravações do JSON em progressão geométrica, não uma
+    regravação inteira por lote.
+    """
+
+    def __init__(self, path, nome, colunas=None, journal=False):
+        self.path = path
+        self.nome = nome
+        self.colunas = colunas or {}
+        self.path_journal = os.path.splitext(path)[0] + '.journal' if journal else None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        db = TinyDB(self.path, ensure_ascii=False, indent=2, encoding='utf-8')
+        db.table(self.nome)
+        return db
+
+    @contextmanager
+    def _escrita(self):
+        # O TinyDB regrava o arquivo inteiro: escritas na mesma tabela são serializadas
+        with self._lock, self._trava_journal():
+            # O JSON só é alterado sem registros pendentes por cima dele
+            self._consolidar()
+            with self._db() as db:
+                yield db.table(self.nome)
+
+    def _trava_journal(self):
+        if self.path_journal is None:
+            return nullcontext()
+        return trava_arquivo(self.path_journal + '.lock')
+
+    def _ler_journal(self):
+        """
+        Pares (doc_id, documento) das linhas completas do journal, em ordem.
+        """
+        try:
+            with open(self.path_journal, 'rb') as f:
+                bloco = f.read()
+        except FileNotFoundError:
+            return []
+        registros = []
+        for linha in bloco[:bloco.rfind(b'\n') + 1].splitlines():  # ignora uma última linha incompleta
+            try:
+                registro = json.loads(linha)
+                registros.append((int(registro['doc_id']), registro['doc']))
+            except (ValueError, TypeError, KeyError):
+                continue
+        return registros
+
+    def _anexar_journal(self, alterados):
+        linhas = b''.join(
+            (json.dumps({'doc_id': doc_id, 'doc': dict(doc)}, ensure_ascii=False) + '\n').encode('utf-8')
+            for doc_id, doc in alterados.items()
+        )
+        with open(self.path_journal, 'a+b') as f:
+            fim = f.seek(0, os.SEEK_END)
+            if fim:
+                f.seek(fim - 1)
+                if f.read(1) != b'\n':
+                    # Sobra de uma escrita interrompida: descarta antes de anexar
+                    f.seek(0)
+                    f.truncate(f.read().rfind(b'\n') + 1)
+            f.write(linhas)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _consolidar(self, sempre=True):
+        """
+        Aplica o journal no JSON (gravado ao lado e trocado de uma vez) e o
+        remove. Chamada com `_lock` e a trava do journal; com `sempre=False`
+        só consolida um journal grande. Interrompida depois da troca, o
+        journal que sobrou é reaplicado sem efeito (os registros são upserts).
+        """
+        if self.path_journal is None:
+            return
+        try:
+            tamanho_journal = os.path.getsize(self.path_journal)
+        except FileNotFoundError:
+            return
+        if not sempre:
+            tamanho_json = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            if tamanho_journal < max(tamanho_json, LIMITE_JOURNAL_TINYDB):
+                return
+
+        dados = self.ler_dados(self.assinatura()) or {}
+        temporario = self.path + '.compactando'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            # Sem indentação: só assim o json usa o codificador em C (o
+            # TinyDB lê igual)
+            f.write(json.dumps(dados, ensure_ascii=False, separators=(',', ':')))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.path)
+        os.remove(self.path_journal)
+
+    def consolidar(self):
+        """
+        Consolida no JSON os registros pendentes no journal.
+        """
+        with self._lock, self._trava_journal():
+            self._consolidar()
+
+    def travar_escrita(self):
+        """
+        Trava exclusiva entre processos para quem lê o snapshot, decide o que
+        gravar (ex.: numera doc_ids e ids novos) e grava. Não é reentrante.
+        """
+        return trava_arquivo(self.path + '.lock')
+
+    def assinatura(self):
+        """
+        Muda sempre que a tabela é gravada (mtime, tamanho e inode do arquivo;
+        com registros no journal, seguidos do inode e tamanho do journal).
+        """
+        try:
+            st = os.stat(self.path)
+            assinatura = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            assinatura = None
+        if self.path_journal is not None:
+            try:
+                st = os.stat(self.path_journal)
+            except FileNotFoundError:
+                return assinatura
+            if st.st_size:
+                return (*(assinatura or (0, 0, 0)), st.st_ino, st.st_size)
+        return assinatura
+
+    def journal_pendente(self, assinatura):
+        """
+        Se a assinatura inclui registros do journal ainda não consolidados.
+        """
+        return assinatura is not None and len(assinatura) > 3
+
+    def ler_dados(self, assinatura):
+        """
+        Conteúdo bruto do arquivo (todas as tabelas), com o journal aplicado, ou None.
+        """
+        dados = None
+        if assinatura is not None and assinatura[1]:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+        if self.journal_pendente(assinatura):
+            tabela = (dados if dados is not None else {}).setdefault(self.nome, {})
+            for doc_id, doc in self._ler_journal():
+                tabela[str(doc_id)] = doc
+            dados = dados if dados is not None else {self.nome: tabela}
+        return dados
+
+    def extrair_documentos(self, dados):
+        """
+        doc_id -> documento da tabela a partir do conteúdo de `ler_dados`.
+        """
+        tabela = (dados or {}).get(self.nome) or {}
+        return {int(doc_id): doc for doc_id, doc in tabela.items()}
+
+    def documentos(self):
+        return self.extrair_documentos(self.ler_dados(self.assinatura()))
+
+    def _todos(self):
+        if self.path_journal is not None:
+            return [Document(doc, doc_id=doc_id) for doc_id, doc in self.documentos().items()]
+        with self._db() as db:
+            return db.table(self.nome).all()
+
+    def obter(self, doc_id):
+        if self.path_journal is not None:
+            doc = self.documentos().get(doc_id)
+            return Document(doc, doc_id=doc_id) if doc is not None else None
+        with self._db() as db:
+            return db.table(self.nome).get(doc_id=doc_id)
+
+    def campo(self, doc_id, campo):
+        """
+        Retorna (existe, valor) do campo de primeiro nível do documento.
+        """
+        doc = self.obter(doc_id)
+        return (doc is not None, doc.get(campo) if doc is not None else None)
+
+    def buscar(self, coluna, valor):
+        funcao = self.colunas[coluna]
+        return [doc for doc in self._todos() if funcao(doc) == valor]
+
+    def ids(self, coluna, valor):
+        return [doc.doc_id for doc in self.buscar(coluna, valor)]
+
+    def inserir(self, doc):
+        with self._escrita() as tabela:
+            return tabela.insert(doc)
+
+    def atualizar(self, doc_id, campos):
+        with self._escrita() as tabela:
+            tabela.update(campos, doc_ids=[doc_id])
+
+    def gravar(self, alterados):
+        """
+        Insere ou substitui os documentos (doc_id -> documento) de uma vez.
+        """
+        if self.path_journal is not None:
+            with self._lock, self._trava_journal():
+                self._anexar_journal(alterados)
+                self._consolidar(sempre=False)
+            return
+        with self._escrita() as tabela:
+            # Uma única regravação do arquivo para o lote inteiro
+            # (upsert documento a documento regravaria o arquivo a cada um)
+            tabela._update_table(lambda docs: docs.update(
+                (doc_id, dict(doc)) for doc_id, doc in alterados.items()
+            ))
+
+    def remover(self, doc_ids):
+        with self._escrita() as tabela:
+            tabela.remove(doc_ids=list(doc_ids))
+
+    def substituir(self, documentos):
+        """
+        Troca todo o conteúdo da tabela pelos documentos informados.
+        """
+        with self._escrita() as tabela:
+            tabela.truncate()
+            tabela.insert_multiple(Document(doc, doc_id=doc_id) for doc_id, doc in documentos.items())
+
+
+class TabelaSQLite:
+    """
+    Tabela num banco SQLite: `doc_id INTEGER PRIMARY KEY`, o documento em
+    JSON e uma coluna indexada para cada entrada de `colunas`.
+    A tabela `versoes` é incrementada na mesma transação de cada escrita e
+    serve de assinatura para os snapshots em memória de todos os processos.
+    """
+
+    def __init__(self, path, nome, colunas=None):
+        self.path = path
+        self.nome = nome
+        self.colunas = colunas or {}
+        self._local = threading.local()
+        self._schema_criado = False
+        self._lock = threading.Lock()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            # Conexões não atravessam threads nem fork
+            conexao = abrir_sqlite(self.path)
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        if not self._schema_criado:
+            with self._lock:
+                if not self._schema_criado:
+                    self._criar_schema(conexao)
+                    self._schema_criado = True
+        return conexao
+
+    def _criar_schema(self, conexao):
+        colunas = ''.join(f', "{coluna}"' for coluna in self.colunas)
+        conexao.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.nome}" '
+            f'(doc_id INTEGER PRIMARY KEY, documento TEXT NOT NULL{colunas})'
+        )
+        for coluna in self.colunas:
+            conexao.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_{self.nome}_{coluna}" ON "{self.nome}" ("{coluna}")'
+            )
+        conexao.execute('CREATE TABLE IF NOT EXISTS versoes (tabela TEXT PRIMARY KEY, versao INTEGER NOT NULL)')
+        conexao.execute('INSERT OR IGNORE INTO versoes (tabela, versao) VALUES (?, 0)', (self.nome,))
+
+    @contextmanager
+    def _transacao(self):
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            yield conexao
+            conexao.execute('UPDATE versoes SET versao = versao + 1 WHERE tabela = ?', (self.nome,))
+            conexao.execute('COMMIT')
+        except BaseException:
+            conexao.execute('ROLLBACK')
+            raise
+
+    def _linha(self, doc_id, doc):
+        valores = [funcao(doc) for funcao in self.colunas.values()]
+        return (doc_id, json.dumps(doc, ensure_ascii=False), *valores)
+
+    def _gravar_linhas(self, conexao, alterados):
+        marcadores = ', '.join('?' * (len(self.colunas) + 2))
+        colunas = ''.join(f', "{coluna}"' for coluna in self.colunas)
+        conexao.executemany(
+            f'INSERT OR REPLACE INTO "{self.nome}" (doc_id, documento{colunas}) VALUES ({marcadores})',
+            (self._linha(doc_id, doc) for doc_id, doc in alterados.items())
+        )
+
+    def travar_escrita(self):
+        """
+        Como em TabelaTinyDB: uma trava por tabela, ao lado do banco.
+        """
+        return trava_arquivo(f'{self.path}-{self.nome}.lock')
+
+    def consolidar(self):
+        # Cada escrita já é uma transação no banco: não há journal a consolidar
+        pass
+
+    def assinatura(self):
+        linha = self._conexao().execute('SELECT versao FROM versoes WHERE tabela = ?', (self.nome,)).fetchone()
+        return linha[0] if linha else None
+
+    def journal_pendente(self, assinatura):
+        return False
+
+    def ler_dados(self, assinatura):
+        cursor = self._conexao().execute(f'SELECT doc_id, documento FROM "{self.nome}"')
+        return {doc_id: json.loads(documento) for doc_id, documento in cursor}
+
+    def extrair_documentos(self, dados):
+        return dados or {}
+
+    def documentos(self):
+        return self.ler_dados(None)
+
+    def obter(self, doc_id):
+        linha = self._conexao().execute(
+            f'SELECT documento FROM "{self.nome}" WHERE doc_id = ?', (doc_id,)
+        ).fetchone()
+        return Document(json.loads(linha[0]), doc_id=doc_id) if linha else None
+
+    def campo(self, doc_id, campo):
+        # json_extract evita decodificar o documento inteiro
+        linha = self._conexao().execute(
+            f'SELECT json_extract(documento, ?) FROM "{self.nome}" WHERE doc_id = ?', (f'$.{campo}', doc_id)
+        ).fetchone()
+        return (linha is not None, linha[0] if linha else None)
+
+    def buscar(self, coluna, valor):
+        if coluna not in self.colunas:
+            raise KeyError(coluna)
+        cursor = self._conexao().execute(
+            f'SELECT doc_id, documento FROM "{self.nome}" WHERE "{coluna}" = ? ORDER BY doc_id', (valor,)
+        )
+        return [Document(json.loads(documento), doc_id=doc_id) for doc_id, documento in cursor]
+
+    def ids(self, coluna, valor):
+        if coluna not in self.colunas:
+            raise KeyError(coluna)
+        cursor = self._conexao().execute(
+            f'SELECT doc_id FROM "{self.nome}" WHERE "{coluna}" = ? ORDER BY doc_id', (valor,)
+        )
+        return [doc_id for doc_id, in cursor]
+
+    def inserir(self, doc):
+        with self._transacao() as conexao:
+            # Mesmo critério do TinyDB: próximo doc_id após o maior existente
+            doc_id = conexao.execute(f'SELECT COALESCE(MAX(doc_id), 0) + 1 FROM "{self.nome}"').fetchone()[0]
+            self._gravar_linhas(conexao, {doc_id: dict(doc)})
+        return doc_id
+
+    def atualizar(self, doc_id, campos):
+        with self._transacao() as conexao:
+            linha = conexao.execute(
+                f'SELECT documento FROM "{self.nome}" WHERE doc_id = ?', (doc_id,)
+            ).fetchone()
+            if linha is None:
+                return
+            doc = json.loads(linha[0])
+            if callable(campos):
+                # Como no TinyDB: uma função que altera o documento no lugar
+                campos(doc)
+            else:
+                doc.update(campos)
+            self._gravar_linhas(conexao, {doc_id: doc})
+
+    def gravar(self, alterados):
+        with self._transacao() as conexao:
+            self._gravar_linhas(conexao, alterados)
+
+    def remover(self, doc_ids):
+        with self._transacao() as conexao:
+            conexao.executemany(f'DELETE FROM "{self.nome}" WHERE doc_id = ?', ((doc_id,) for doc_id in doc_ids))
+
+    def substituir(self, documentos):
+        with self._transacao() as conexao:
+            conexao.execute(f'DELETE FROM "{self.nome}"')
+            self._gravar_linhas(conexao, documentos)
+
+
+def criar_tabela(path_json, nome, colunas=None, backend=None, journal=False):
+    """
+    Cria a tabela `nome` no backend escolhido (MOVIEFINDER_BACKEND por padrão).
+    No TinyDB ela fica em `path_json` (com `journal`, `gravar` anexa ao
+    journal ao lado); no SQLite, em SQLITE_DB.
+    """
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f'Backend inválido: {backend}. Use um de: {", ".join(BACKENDS)}')
+    if backend == 'sqlite':
+        return TabelaSQLite(SQLITE_DB, nome, colunas)
+    return TabelaTinyDB(path_json, nome, colunas, journal)
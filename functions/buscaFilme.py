@@ -1,278 +1,465 @@
+import heapq
 import json
 import os
-from queue import Queue
 from difflib import SequenceMatcher
-from tinydb import TinyDB, Query
+from cache import CacheVersionado
+from catalogo import obter_catalogo
+from indices import CASAS_SIMILARIDADE
+from pipeline import Pipeline, TempoEsgotadoPipeline
+from resposta import resposta_lambda
 
-# Filas globais para simular o comportamento de filas de mensagens
-filaBuscaFilme = Queue()  # Fila que recebe o nome do filme a ser buscado
-filaEncontrado = Queue()  # Fila que recebe os filmes encontrados/validados
+# Como escolher os candidatos da busca aproximada:
+# - 'indice': índice de caracteres do catálogo, mesmo resultado do exaustivo (padrão)
+# - 'vetorial': produto matriz-vetor com NumPy (buscaVetorial.py), para catálogos enormes
+# - 'exaustivo': compara com todos os filmes (referência para medir recall)
+MODOS_BUSCA = ('indice', 'vetorial', 'exaustivo')
+MODO_BUSCA_PADRAO = os.environ.get('MOVIEFINDER_MOTOR_BUSCA', 'indice')
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-CATALOGO_DB_PATH = os.path.join(BASE_DIR, 'data', 'filmes.json')
+# Quantidade máxima de nomes aceitos por buscaFilmes
+MAX_BUSCAS_LOTE = 200
 
-def _get_catalogo_table():
-    db = TinyDB(CATALOGO_DB_PATH, ensure_ascii=False, indent=2, encoding='utf-8')
-    return db.table("Filmes")
+# Cache dos resultados de buscaFilme, marcado com a versão do catálogo
+# (capacidade 0 desliga o cache)
+CAPACIDADE_CACHE_BUSCA = int(os.environ.get('MOVIEFINDER_CACHE_BUSCA', '1024'))
+TTL_CACHE_BUSCA = float(os.environ.get('MOVIEFINDER_CACHE_BUSCA_TTL', '300'))
 
-def _bootstrap_catalogo_db():
+cacheBuscaFilme = CacheVersionado(CAPACIDADE_CACHE_BUSCA, TTL_CACHE_BUSCA)
+
+def similaridade(a, b):
     """
-    Garante que o arquivo de catálogo esteja no formato esperado pelo TinyDB.
-    Se estiver no formato antigo (lista simples ou dict com chave 'filmes'),
-    converte automaticamente para o formato interno do TinyDB.
+    Calcula a similaridade entre duas strings.
+    Retorna um valor entre 0 e 1.
     """
-    if not os.path.exists(CATALOGO_DB_PATH):
-        TinyDB(CATALOGO_DB_PATH, ensure_ascii=False, indent=2, encoding='utf-8').close()
-        return
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
 
-    try:
-        with open(CATALOGO_DB_PATH, 'r', encoding='utf-8') as f:
-            if os.path.getsize(CATALOGO_DB_PATH) == 0:
-                raise json.JSONDecodeError('empty', '', 0)
-            raw_data = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        TinyDB(CATALOGO_DB_PATH, ensure_ascii=False, indent=2, encoding='utf-8').close()
-        return
+def _candidatos_similares(catalogo, nome_busca, modo=None):
+    """
+    Retorna os filmes que passarão pelo cálculo de similaridade, conforme o
+    modo de busca escolhido.
+    """
+    modo = modo or MODO_BUSCA_PADRAO
+    if modo == 'vetorial':
+        from buscaVetorial import candidatos_vetoriais
+        return candidatos_vetoriais(catalogo, nome_busca)
+    if modo == 'exaustivo':
+        return catalogo.filmes
+    return catalogo.candidatos_similares(nome_busca)
 
-    if isinstance(raw_data, dict) and ("_default" in raw_data or "Filmes" in raw_data):
-        return
+def _supera_piso(valor, ordem, melhores, limite, similaridade_minima):
+    """
+    Indica se (valor, ordem) entraria no heap dos `limite` melhores. A
+    comparação usa o valor arredondado como é exibido: em caso de empate
+    nele, o filme que apareceu antes continua na frente.
+    """
+    if valor <= similaridade_minima:
+        return False
+    if len(melhores) < limite:
+        return True
+    return (round(valor, CASAS_SIMILARIDADE), -ordem) > melhores[0][:2]
 
-    filmes = []
-    if isinstance(raw_data, dict) and isinstance(raw_data.get('filmes'), list):
-        filmes = raw_data['filmes']
-    elif isinstance(raw_data, list):
-        filmes = raw_data
+def _ranquear_similares_lote(candidatos_por_busca, limite=5, similaridade_minima=0.5):
+    """
+    Ranqueia várias buscas de uma vez.
+    Recebe nome_busca -> lista de filmes candidatos e retorna
+    nome_busca -> até `limite` pares (filme, similaridade) com similaridade
+    acima de `similaridade_minima`, do mais para o menos parecido. A ordem é
+    a da similaridade arredondada em CASAS_SIMILARIDADE (a exibida, que é a
+    devolvida), desempatada pela posição do filme entre os candidatos (a do
+    catálogo).
 
+    Cada filme candidato é visitado uma única vez: o SequenceMatcher guarda em
+    cache a análise do título (seq2) e o compara com todas as buscas que o
+    têm como candidato. Para cada busca só um heap com os `limite` melhores é
+    mantido, e o `ratio()` é pulado quando os limites superiores baratos
+    (`real_quick_ratio`/`quick_ratio`) já mostram que o filme não supera o
+    pior resultado guardado.
+    """
+    buscas_por_filme = {}  # id(filme) -> (filme, [(nome_busca, ordem)])
+    for nome_busca, filmes in candidatos_por_busca.items():
+        for ordem, filme in enumerate(filmes):
+            buscas_por_filme.setdefault(id(filme), (filme, []))[1].append((nome_busca, ordem))
 
-    db = TinyDB(CATALOGO_DB_PATH, ensure_ascii=False, indent=2, encoding='utf-8')
-    table = db.table("Filmes")
-    table.truncate()
-    if filmes:
-        table.insert_multiple(filmes)
-    db.close()
+    melhores = {nome_busca: [] for nome_busca in candidatos_por_busca}  # heaps de (similaridade arredondada, -ordem, filme)
+    matcher = SequenceMatcher(None)
 
+    for filme, buscas in buscas_por_filme.values():
+        nome_filme_db = (filme.get('nome') or '').lower().strip()
+        if not nome_filme_db:
+            continue
+        matcher.set_seq2(nome_filme_db)
 
-def similaridade(a, b):
+        for nome_busca, ordem in buscas:
+            heap = melhores[nome_busca]
+            matcher.set_seq1(nome_busca)
+            if not _supera_piso(matcher.real_quick_ratio(), ordem, heap, limite, similaridade_minima):
+                continue
+            if not _supera_piso(matcher.quick_ratio(), ordem, heap, limite, similaridade_minima):
+                continue
+
+            sim = matcher.ratio()
+            if not _supera_piso(sim, ordem, heap, limite, similaridade_minima):
+                continue
+
+            item = (round(sim, CASAS_SIMILARIDADE), -ordem, filme)
+            if len(heap) < limite:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heapreplace(heap, item)
+
+    return {
+        nome_busca: [(filme, sim) for sim, _, filme in sorted(heap, key=lambda item: item[:2], reverse=True)]
+        for nome_busca, heap in melhores.items()
+    }
+
+def _ranquear_similares(nome_busca, filmes, limite=5, similaridade_minima=0.5):
     """
-    Calcula a similaridade entre duas strings.
-    Retorna um valor entre 0 e 1.
+    Versão de `_ranquear_similares_lote` para uma única busca.
     """
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+    return _ranquear_similares_lote({nome_busca: filmes}, limite, similaridade_minima)[nome_busca]
 
-def buscaFilme(nome_filme):
+def buscaFilme(nome_filme, modo=None):
+    """
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para buscaFilmeDados.
     """
-    Função principal que imita o comportamento de uma Lambda para buscar um filme.
-    Recebe o nome do filme e insere na filaBuscaFilme.
-    Pode executar validaFilme() e retornaFilme() internamente.
+    return resposta_lambda(*buscaFilmeDados(nome_filme, modo))
+
+def buscaFilmeDados(nome_filme, modo=None):
+    """
+    Função principal para buscar um filme.
+    Recebe o nome do filme e publica no pipeline de busca
+    (filaBuscaFilme -> validaFilme -> filaEncontrado -> retornaFilme).
     
     Args:
         nome_filme: String com o nome do filme a ser buscado
                    Exemplo: "O Enigma da Aurora"
+        modo: Motor de busca aproximada ('indice', 'vetorial' ou 'exaustivo').
+              Se omitido, usa MOVIEFINDER_MOTOR_BUSCA (padrão 'indice').
     
     Returns:
-        Resultado formatado da busca (se executar validaFilme e retornaFilme internamente)
-        ou None (apenas insere na fila)
+        Tupla (corpo, statusCode) com o resultado formatado da busca
     """
     
     try:
         # Se nome_filme for um dicionário, extrai o nome
         if isinstance(nome_filme, dict):
             nome = nome_filme.get('nome') or nome_filme.get('titulo') or nome_filme.get('title')
+            modo = modo or nome_filme.get('modo')
         else:
             nome = nome_filme
         
         if not nome:
             return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'erro': True,
-                    'mensagem': 'Nome do filme não fornecido',
-                    'dados': None
-                }, ensure_ascii=False)
-            }
-        
-        # Insere o nome do filme na filaBuscaFilme
-        filaBuscaFilme.put(nome)
+                'erro': True,
+                'mensagem': 'Nome do filme não fornecido',
+                'dados': None
+            }, 400
         
-        # Executa validaFilme para processar a busca
-        validaFilme()
+        if modo is not None and modo not in MODOS_BUSCA:
+            return {
+                'erro': True,
+                'mensagem': f'Modo de busca inválido. Use um de: {", ".join(MODOS_BUSCA)}',
+                'dados': None
+            }, 400
         
-        # Executa retornaFilme para retornar o resultado
-        resultado = retornaFilme()
+        # Buscas populares saem do cache enquanto o catálogo não mudar
+        chave = (str(nome).lower().strip(), modo or MODO_BUSCA_PADRAO)
+        versao = obter_catalogo().versao
+        guardado = cacheBuscaFilme.obter(chave, versao)
+        if guardado is not None:
+            # Cada acerto devolve um corpo novo: quem alterar a resposta não
+            # altera o que está no cache
+            corpo_json, status_code = guardado
+            return json.loads(corpo_json), status_code
         
+        # Publica a busca na filaBuscaFilme e espera só pelo próprio resultado
+        resultado = pipelineBuscaFilme.processar({'nome': nome, 'modo': modo})
+        corpo, status_code = resultado
+        if status_code < 500:
+            # Guardado já serializado, imutável
+            cacheBuscaFilme.guardar(chave, versao, (json.dumps(corpo, ensure_ascii=False), status_code))
         return resultado
     
+    except TempoEsgotadoPipeline as e:
+        return {
+            'erro': True,
+            'mensagem': f'Tempo esgotado ao buscar filme: {str(e)}',
+            'dados': None
+        }, 504
+    
     except Exception as e:
         return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'erro': True,
-                'mensagem': f'Erro ao buscar filme: {str(e)}',
-                'dados': None
-            }, ensure_ascii=False)
-        }
+            'erro': True,
+            'mensagem': f'Erro ao buscar filme: {str(e)}',
+            'dados': None
+        }, 500
 
-def validaFilme():
+def buscaFilmes(nomes_filmes, modo=None):
     """
-    Função que consome o filme inserido na filaBuscaFilme.
-    Valida se encontrou um match exato ou similares no banco de dados.
-    Retorna o filme se deu match e/ou possíveis similares se não deu match exato.
-    Calcula a similaridade e insere na filaEncontrado.
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para buscaFilmesDados.
+    """
+    return resposta_lambda(*buscaFilmesDados(nomes_filmes, modo))
+
+def buscaFilmesDados(nomes_filmes, modo=None):
+    """
+    Busca vários filmes de uma vez (ex.: uma watchlist inteira).
+    O catálogo e os índices são carregados uma única vez e todas as buscas
+    sem match exato são pontuadas numa única passada pelos candidatos.
+    
+    Args:
+        nomes_filmes: Lista de nomes (ou dicts com 'nome') dos filmes
+        modo: Motor de busca aproximada, como em buscaFilme
     
     Returns:
-        None (resultado é inserido na filaEncontrado)
+        Tupla (corpo, statusCode); o corpo traz, para cada nome, o
+        statusCode e o resultado no mesmo formato de retornaFilme
     """
     
     try:
-        nome_filme = filaBuscaFilme.get(timeout=1)
-
-        _bootstrap_catalogo_db()
-        db = _get_catalogo_table()
-        filmes = db.all()
-        Filme = Query()
-        match_doc = db.get(
-            Filme.nome.test(
-                lambda valor: isinstance(valor, str) and valor.lower().strip() == nome_filme.lower().strip()
-            )
-        )
-
-
-        if not filmes:
-            filaEncontrado.put({
+        if not isinstance(nomes_filmes, list) or not nomes_filmes:
+            return {
                 'erro': True,
-                'mensagem': 'Catálogo de filmes vazio',
-                'dados': None,
-                'match_exato': False,
-                'similares': []
+                'mensagem': 'Lista de nomes de filmes não fornecida',
+                'dados': None
+            }, 400
+        
+        if len(nomes_filmes) > MAX_BUSCAS_LOTE:
+            return {
+                'erro': True,
+                'mensagem': f'Máximo de {MAX_BUSCAS_LOTE} filmes por busca em lote',
+                'dados': None
+            }, 400
+        
+        if modo is not None and modo not in MODOS_BUSCA:
+            return {
+                'erro': True,
+                'mensagem': f'Modo de busca inválido. Use um de: {", ".join(MODOS_BUSCA)}',
+                'dados': None
+            }, 400
+        
+        nomes = []
+        for item in nomes_filmes:
+            if isinstance(item, dict):
+                item = item.get('nome') or item.get('titulo') or item.get('title')
+            nomes.append(item if isinstance(item, str) and item.strip() else None)
+        
+        mensagens = iter(_valida_buscas([nome for nome in nomes if nome], modo))
+        
+        resultados = []
+        for nome in nomes:
+            if nome is None:
+                corpo, status_code = {
+                    'sucesso': False,
+                    'erro': 'Nome do filme não fornecido',
+                    'dados': None,
+                    'match_exato': False,
+                    'similares': []
+                }, 400
+            else:
+                corpo, status_code = _formata_resultado(next(mensagens))
+            resultados.append({
+                'nome': nome,
+                'statusCode': status_code,
+                'resultado': corpo
             })
-            return
+        
+        return {
+            'sucesso': True,
+            'total': len(resultados),
+            'resultados': resultados
+        }, 200
+    
+    except Exception as e:
+        return {
+            'erro': True,
+            'mensagem': f'Erro ao buscar filmes: {str(e)}',
+            'dados': None
+        }, 500
 
-        nome_busca = nome_filme.lower().strip()
-        filme_match_exato = match_doc.copy() if match_doc else None
-        filmes_similares = []
+def _valida_buscas(nomes, modo=None):
+    """
+    Valida um lote de buscas contra um único snapshot do catálogo.
+    Nomes repetidos são resolvidos uma vez só e a busca aproximada de todos
+    os nomes sem match exato é feita numa única passada pelos candidatos.
+    
+    Returns:
+        Lista de mensagens no formato da filaEncontrado, na ordem de `nomes`
+    """
+    catalogo = obter_catalogo()
+
+    if not len(catalogo):
+        return [{
+            'erro': True,
+            'mensagem': 'Catálogo de filmes vazio',
+            'dados': None,
+            'match_exato': False,
+            'similares': []
+        } for _ in nomes]
 
-        if not filme_match_exato:
-            for filme in filmes:
-                nome_filme_db = (filme.get('nome') or '').lower().strip()
-                if not nome_filme_db:
-                    continue
+    matches = {}
+    candidatos_por_busca = {}
+    for nome_filme in nomes:
+        nome_busca = nome_filme.lower().strip()
+        if nome_busca in matches or nome_busca in candidatos_por_busca:
+            continue
+        match_doc = catalogo.filme_por_nome(nome_filme)
+        if match_doc:
+            matches[nome_busca] = match_doc
+        else:
+            # Só os candidatos do índice de caracteres passam pelo SequenceMatcher
+            candidatos_por_busca[nome_busca] = _candidatos_similares(catalogo, nome_busca, modo)
 
-                sim = similaridade(nome_busca, nome_filme_db)
-                if sim > 0.5:
-                    filme_similar = filme.copy()
-                    filme_similar['similaridade'] = round(sim, 2)
-                    filmes_similares.append(filme_similar)
+    ranking = _ranquear_similares_lote(candidatos_por_busca)
 
-            filmes_similares.sort(key=lambda x: x.get('similaridade', 0), reverse=True)
+    mensagens = []
+    for nome_filme in nomes:
+        nome_busca = nome_filme.lower().strip()
 
-        if filme_match_exato:
-            mensagem = {
+        if nome_busca in matches:
+            mensagens.append({
                 'erro': False,
                 'mensagem': 'Match exato encontrado',
-                'dados': filme_match_exato,
+                'dados': matches[nome_busca].copy(),
                 'match_exato': True,
                 'similares': []
-            }
+            })
+            continue
+
+        # Só os vencedores do top-5 são copiados
+        filmes_similares = []
+        for filme, sim in ranking[nome_busca]:
+            filme_similar = filme.copy()
+            filme_similar['similaridade'] = sim
+            filmes_similares.append(filme_similar)
+
+        mensagens.append({
+            'erro': False,
+            'mensagem': f'Match exato não encontrado. {len(filmes_similares)} similar(es) encontrado(s)' if filmes_similares else 'Nenhum filme encontrado',
+            'dados': None,
+            'match_exato': False,
+            'similares': filmes_similares
+        })
+
+    return mensagens
+
+def validaFilme(mensagem_busca):
+    """
+    Estágio que consome o filme publicado na filaBuscaFilme.
+    Valida se encontrou um match exato ou similares no banco de dados.
+    Retorna o filme se deu match e/ou possíveis similares se não deu match exato.
+    
+    Args:
+        mensagem_busca: Dict com 'nome' e 'modo' (ou apenas o nome)
+    
+    Returns:
+        Mensagem para a filaEncontrado
+    """
+    
+    try:
+        if isinstance(mensagem_busca, dict):
+            nome_filme = mensagem_busca.get('nome')
+            modo = mensagem_busca.get('modo')
         else:
-            mensagem = {
-                'erro': False,
-                'mensagem': f'Match exato não encontrado. {len(filmes_similares)} similar(es) encontrado(s)' if filmes_similares else 'Nenhum filme encontrado',
-                'dados': None,
-                'match_exato': False,
-                'similares': filmes_similares[:5]
-            }
+            nome_filme, modo = mensagem_busca, None
 
-        filaEncontrado.put(mensagem)
+        return _valida_buscas([nome_filme], modo)[0]
 
     except Exception as e:
-        filaEncontrado.put({
+        return {
             'erro': True,
             'mensagem': f'Erro ao validar filme: {str(e)}',
             'dados': None,
             'match_exato': False,
             'similares': []
-        })
+        }
 
-def retornaFilme():
+def retornaFilme(mensagem):
     """
-    Função que consome o filme encontrado da filaEncontrado.
+    Estágio que consome o filme encontrado da filaEncontrado.
     Retorna para o usuário os dados encontrados formatados.
     
+    Args:
+        mensagem: Mensagem produzida por validaFilme
+    
     Returns:
-        Dicionário com statusCode e body contendo o resultado formatado
+        Tupla (corpo, statusCode) com o resultado formatado
     """
     
     try:
-        # Consome mensagem da filaEncontrado
-        mensagem = filaEncontrado.get(timeout=1)
-        
-        # Verifica se houve erro
-        if mensagem.get('erro'):
-            return {
-                'statusCode': 404 if 'não encontrado' in mensagem.get('mensagem', '') else 500,
-                'body': json.dumps({
-                    'sucesso': False,
-                    'erro': mensagem.get('mensagem', 'Erro desconhecido'),
-                    'dados': None,
-                    'match_exato': False,
-                    'similares': []
-                }, ensure_ascii=False)
-            }
-        
-        match_exato = mensagem.get('match_exato', False)
-        dados = mensagem.get('dados')
-        similares = mensagem.get('similares', [])
-        
-        # Formata o resultado para o usuário
-        resultado_formatado = {
-            'sucesso': True,
-            'mensagem': mensagem.get('mensagem', ''),
-            'match_exato': match_exato,
+        return _formata_resultado(mensagem)
+    
+    except Exception as e:
+        return {
+            'sucesso': False,
+            'erro': f'Erro ao retornar filme: {str(e)}',
             'dados': None,
+            'match_exato': False,
             'similares': []
-        }
-        
-        # Se houve match exato
-        if match_exato and dados:
-            resultado_formatado['dados'] = {
-                'id': dados.get('id'),
-                'nome': dados.get('nome'),
-                'descricao': dados.get('descricao'),
-                'detalhes': dados.get('detalhes', {}),
-                'streamings': dados.get('streamings', [])
-            }
-        
-        # Processa similares (indicações)
-        for similar in similares:
-            similar_formatado = {
-                'id': similar.get('id'),
-                'nome': similar.get('nome'),
-                'descricao': similar.get('descricao'),
-                'detalhes': similar.get('detalhes', {}),
-                'streamings': similar.get('streamings', []),
-                'similaridade': similar.get('similaridade', 0)
-            }
-            resultado_formatado['similares'].append(similar_formatado)
-        
-        status_code = 200 if match_exato or similares else 404
-        
+        }, 500
+
+def _formata_resultado(mensagem):
+    """
+    Formata uma mensagem da filaEncontrado para o usuário.
+    
+    Returns:
+        Tupla (corpo, statusCode)
+    """
+    
+    # Verifica se houve erro
+    if mensagem.get('erro'):
         return {
-            'statusCode': status_code,
-            'body': json.dumps(resultado_formatado, ensure_ascii=False, indent=2)
+            'sucesso': False,
+            'erro': mensagem.get('mensagem', 'Erro desconhecido'),
+            'dados': None,
+            'match_exato': False,
+            'similares': []
+        }, 404 if 'não encontrado' in mensagem.get('mensagem', '') else 500
+    
+    match_exato = mensagem.get('match_exato', False)
+    dados = mensagem.get('dados')
+    similares = mensagem.get('similares', [])
+    
+    # Formata o resultado para o usuário
+    resultado_formatado = {
+        'sucesso': True,
+        'mensagem': mensagem.get('mensagem', ''),
+        'match_exato': match_exato,
+        'dados': None,
+        'similares': []
+    }
+    
+    # Se houve match exato
+    if match_exato and dados:
+        resultado_formatado['dados'] = {
+            'id': dados.get('id'),
+            'nome': dados.get('nome'),
+            'descricao': dados.get('descricao'),
+            'detalhes': dados.get('detalhes', {}),
+            'streamings': dados.get('streamings', [])
         }
     
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'sucesso': False,
-                'erro': f'Erro ao retornar filme: {str(e)}',
-                'dados': None,
-                'match_exato': False,
-                'similares': []
-            }, ensure_ascii=False)
+    # Processa similares (indicações)
+    for similar in similares:
+        similar_formatado = {
+            'id': similar.get('id'),
+            'nome': similar.get('nome'),
+            'descricao': similar.get('descricao'),
+            'detalhes': similar.get('detalhes', {}),
+            'streamings': similar.get('streamings', []),
+            'similaridade': similar.get('similaridade', 0)
         }
+        resultado_formatado['similares'].append(similar_formatado)
+    
+    status_code = 200 if match_exato or similares else 404
+    
+    return resultado_formatado, status_code
 
+# Pipeline da busca: cada requisição recebe de volta apenas o próprio resultado
+pipelineBuscaFilme = Pipeline('buscaFilme', [
+    ('filaBuscaFilme', validaFilme),
+    ('filaEncontrado', retornaFilme)
+])
 
 # Exemplo de uso para testes locais
 if __name__ == '__main__':
@@ -0,0 +1,184 @@
+import math
+import random
+import threading
+import time
+from array import array
+from indices import normaliza_nome, trigramas
+
+try:
+    import numpy as np
+except ImportError:  # dependência opcional
+    np = None
+
+
+def disponivel():
+    """
+    Indica se o NumPy está instalado e o motor vetorial pode ser usado.
+    """
+    return np is not None
+
+
+class MotorVetorial:
+    """
+    Motor de busca vetorial (opcional, requer NumPy) para catálogos muito
+    grandes. Selecionado com `modo='vetorial'` em `buscaFilme` ou com a
+    variável de ambiente MOVIEFINDER_MOTOR_BUSCA.
+
+    Cada nome normalizado vira um vetor esparso de trigramas (pesos binários
+    normalizados por L2) numa matriz trigrama x filme em formato CSC. Uma
+    consulta é pontuada contra o catálogo inteiro com um único produto
+    matriz-vetor (cosseno) e só os melhores candidatos seguem para o
+    SequenceMatcher. É imutável: uma nova versão do catálogo gera um novo motor.
+    """
+
+    def __init__(self, catalogo):
+        if np is None:
+            raise RuntimeError('Motor de busca vetorial requer NumPy (pip install numpy)')
+
+        self.versao = catalogo.versao
+        self.doc_ids = np.fromiter(catalogo.documentos.keys(), dtype=np.int64, count=len(catalogo))
+
+        vocabulario = {}
+        colunas = array('i')
+        linhas = array('i')
+        valores = array('f')
+        for linha, filme in enumerate(catalogo.documentos.values()):
+            grams = trigramas(normaliza_nome(filme.get('nome')))
+            if not grams:
+                continue
+            peso = 1.0 / math.sqrt(len(grams))
+            for gram in grams:
+                colunas.append(vocabulario.setdefault(gram, len(vocabulario)))
+                linhas.append(linha)
+                valores.append(peso)
+
+        colunas = np.frombuffer(colunas, dtype=np.int32)
+        ordem = np.argsort(colunas, kind='stable')
+        self._linhas = np.frombuffer(linhas, dtype=np.int32)[ordem]
+        self._valores = np.frombuffer(valores, dtype=np.float32)[ordem]
+        self._inicio = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(colunas, minlength=len(vocabulario)), out=self._inicio[1:])
+        self._vocabulario = vocabulario
+
+    def pontuar(self, nome):
+        """
+        Retorna o vetor de similaridades (cosseno) da consulta contra todos
+        os filmes, na ordem de `doc_ids`.
+        """
+        grams = trigramas(normaliza_nome(nome))
+        colunas = [self._vocabulario[g] for g in grams if g in self._vocabulario]
+        if not colunas:
+            return np.zeros(len(self.doc_ids), dtype=np.float32)
+
+        linhas = np.concatenate([self._linhas[self._inicio[c]:self._inicio[c + 1]] for c in colunas])
+        valores = np.concatenate([self._valores[self._inicio[c]:self._inicio[c + 1]] for c in colunas])
+        peso_busca = 1.0 / math.sqrt(len(grams))
+        return np.bincount(linhas, weights=valores, minlength=len(self.doc_ids)) * peso_busca
+
+    def candidatos(self, nome, limite=250):
+        """
+        Retorna os doc_ids dos `limite` filmes com maior pontuação (> 0).
+        """
+        pontuacoes = self.pontuar(nome)
+        if len(pontuacoes) > limite:
+            melhores = np.argpartition(-pontuacoes, limite)[:limite]
+        else:
+            melhores = np.arange(len(pontuacoes))
+        melhores = melhores[pontuacoes[melhores] > 0]
+        melhores = melhores[np.argsort(-pontuacoes[melhores], kind='stable')]
+        return self.doc_ids[melhores].tolist()
+
+
+_lock = threading.Lock()
+_motor = None
+
+
+def obter_motor(catalogo):
+    """
+    Retorna o motor da versão atual do catálogo, reconstruindo a matriz
+    apenas quando o catálogo muda.
+    """
+    global _motor
+    motor = _motor
+    if motor is None or motor.versao != catalogo.versao:
+        with _lock:
+            if _motor is None or _motor.versao != catalogo.versao:
+                _motor = MotorVetorial(catalogo)
+            motor = _motor
+    return motor
+
+
+def candidatos_vetoriais(catalogo, nome, limite=250):
+    """
+    Retorna os filmes candidatos para o reranqueamento pelo SequenceMatcher,
+    na ordem do catálogo (doc_id), que desempata similaridades iguais.
+    """
+    doc_ids = obter_motor(catalogo).candidatos(nome, limite)
+    return [catalogo.documentos[doc_id] for doc_id in sorted(doc_ids)]
+
+
+def _consultas_com_erros(catalogo, quantidade, semente=42):
+    """
+    Gera consultas a partir de nomes do catálogo com dois caracteres trocados,
+    simulando erros de digitação.
+    """
+    aleatorio = random.Random(semente)
+    nomes = [f.get('nome') for f in catalogo.documentos.values() if f.get('nome')]
+    consultas = []
+    for nome in aleatorio.sample(nomes, min(quantidade, len(nomes))):
+        letras = list(nome.lower())
+        for _ in range(2):
+            letras[aleatorio.randrange(len(letras))] = aleatorio.choice('aeiou ')
+        consultas.append(''.join(letras))
+    return consultas
+
+
+def comparar_recall(catalogo, consultas=None, modos=('indice', 'vetorial')):
+    """
+    Compara o top-5 de cada modo com o top-5 da varredura exaustiva.
+
+    Returns:
+        Dicionário modo -> {'recall': fração dos resultados exaustivos
+        recuperados, 'ms_por_consulta': tempo médio}
+    """
+    from buscaFilme import _candidatos_similares, _ranquear_similares
+
+    if consultas is None:
+        consultas = _consultas_com_erros(catalogo, 200)
+
+    def top5(modo, consulta):
+        nome_busca = consulta.lower().strip()
+        candidatos = _candidatos_similares(catalogo, nome_busca, modo)
+        return [id(filme) for filme, _ in _ranquear_similares(nome_busca, candidatos)]
+
+    inicio = time.perf_counter()
+    referencia = [top5('exaustivo', consulta) for consulta in consultas]
+    duracao = time.perf_counter() - inicio
+    total = sum(len(r) for r in referencia) or 1
+
+    resultado = {
+        'exaustivo': {
+            'recall': 1.0,
+            'ms_por_consulta': round(duracao / max(len(consultas), 1) * 1000, 2)
+        }
+    }
+    for modo in modos:
+        inicio = time.perf_counter()
+        obtidos = [top5(modo, consulta) for consulta in consultas]
+        duracao = time.perf_counter() - inicio
+        acertos = sum(len(set(r) & set(o)) for r, o in zip(referencia, obtidos))
+        resultado[modo] = {
+            'recall': round(acertos / total, 3),
+            'ms_por_consulta': round(duracao / max(len(consultas), 1) * 1000, 2)
+        }
+    return resultado
+
+
+# Comparação de recall com a varredura exaustiva: python buscaVetorial.py
+if __name__ == '__main__':
+    from catalogo import obter_catalogo
+
+    catalogo_atual = obter_catalogo()
+    print(f'Catálogo: {len(catalogo_atual)} filmes')
+    for modo, metricas in comparar_recall(catalogo_atual).items():
+        print(f"  {modo:<9} recall@5={metricas['recall']:.3f}  {metricas['ms_por_consulta']} ms/consulta")
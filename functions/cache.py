@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheVersionado:
+    """
+    Cache LRU com TTL em que cada entrada é marcada com a versão dos dados
+    de origem (ex.: a versão do snapshot do catálogo). Entradas de outra
+    versão nunca são devolvidas: quando a versão muda, o cache inteiro é
+    descartado na próxima consulta.
+
+    Contadores: acertos, falhas, remocoes (LRU), expiradas (TTL) e
+    invalidacoes (troca de versão).
+    """
+
+    def __init__(self, capacidade, ttl=None, relogio=time.monotonic):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._relogio = relogio
+        self._entradas = OrderedDict()  # chave -> (expira_em, valor)
+        self._versao = None
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self.expiradas = 0
+        self.invalidacoes = 0
+
+    def _sincronizar_versao(self, versao):
+        if versao != self._versao:
+            if self._entradas:
+                self.invalidacoes += 1
+            self._entradas.clear()
+            self._versao = versao
+
+    def obter(self, chave, versao):
+        """
+        Retorna o valor guardado para `chave` na `versao` ou None.
+        """
+        if self.capacidade <= 0:
+            return None
+        with self._lock:
+            self._sincronizar_versao(versao)
+            entrada = self._entradas.get(chave)
+            if entrada is not None:
+                expira_em, valor = entrada
+                if expira_em is None or expira_em > self._relogio():
+                    self._entradas.move_to_end(chave)
+                    self.acertos += 1
+                    return valor
+                del self._entradas[chave]
+                self.expiradas += 1
+            self.falhas += 1
+            return None
+
+    def guardar(self, chave, versao, valor):
+        """
+        Guarda o valor calculado a partir da `versao` dos dados. Valores de
+        uma versão que já foi substituída são descartados.
+        """
+        if self.capacidade <= 0:
+            return
+        with self._lock:
+            if self._versao is not None and versao < self._versao:
+                # Os dados mudaram enquanto o valor era calculado
+                return
+            self._sincronizar_versao(versao)
+            expira_em = self._relogio() + self.ttl if self.ttl else None
+            self._entradas[chave] = (expira_em, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+                self.remocoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.falhas
+            return {
+                'capacidade': self.capacidade,
+                'ttl': self.ttl,
+                'versao': self._versao,
+                'entradas': len(self._entradas),
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'taxa_acerto': round(self.acertos / consultas, 4) if consultas else 0.0,
+                'remocoes': self.remocoes,
+                'expiradas': self.expiradas,
+                'invalidacoes': self.invalidacoes
+            }
@@ -0,0 +1,175 @@
+import json
+import sys
+from datetime import datetime
+from catalogo import gravar_filmes
+from desejados import retirar_desejados, trava_desejados
+from indices import normaliza_nome
+from pipeline import Pipeline, TempoEsgotadoPipeline
+from resposta import resposta_lambda
+
+# Quantidade máxima de filmes aceitos por requisição de ingestão
+MAX_FILMES_INGESTAO = 10000
+
+
+def cadastraFilmesCatalogo(payload):
+    """
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para cadastraFilmesCatalogoDados.
+    """
+    return resposta_lambda(*cadastraFilmesCatalogoDados(payload))
+
+
+def cadastraFilmesCatalogoDados(payload):
+    """
+    Função principal: recebe filmes que chegaram à plataforma, publica na
+    fila `filaFilmesCatalogo` e espera apenas pela própria notificação final.
+    Retorna a tupla (corpo, statusCode).
+
+    payload esperado:
+    {
+        "filmes": [
+            {"id": 11, "nome": "Matrix 5", "descricao": "...", "detalhes": {...}, "streamings": [...]},
+            ...
+        ]
+    }
+    """
+    try:
+        return pipelineCatalogo.processar(payload)
+    except TempoEsgotadoPipeline:
+        return {
+            'sucesso': False,
+            'mensagem': 'Nenhuma notificação disponível.'
+        }, 504
+    except Exception as exc:
+        return {
+            'sucesso': False,
+            'mensagem': f'Erro ao cadastrar filmes no catálogo: {exc}'
+        }, 500
+
+
+def valida_filme_catalogo(filme):
+    """
+    Retorna a mensagem de erro do filme ou None se ele pode ser gravado.
+    """
+    if not isinstance(filme, dict) or not normaliza_nome(filme.get('nome')):
+        return 'sem "nome"'
+    if filme.get('id') is not None and (not isinstance(filme['id'], int) or isinstance(filme['id'], bool)):
+        return 'com "id" inválido (deve ser inteiro)'
+    return None
+
+
+def _valida_filmes(filmes):
+    """
+    Retorna a mensagem de erro do lote ou None se todos os filmes são válidos.
+    """
+    if not isinstance(filmes, list) or not filmes:
+        return 'Campo "filmes" é obrigatório e deve ser uma lista'
+
+    if len(filmes) > MAX_FILMES_INGESTAO:
+        return f'Máximo de {MAX_FILMES_INGESTAO} filmes por ingestão'
+
+    for posicao, filme in enumerate(filmes):
+        erro = valida_filme_catalogo(filme)
+        if erro:
+            return f'Filme na posição {posicao} {erro}'
+
+    return None
+
+
+def ingerirFilmes(filmes):
+    """
+    Grava os filmes no catálogo (upsert por `id`, uma escrita) e retira dos
+    filmes desejados os que acabaram de chegar, com a junção feita pelo
+    índice de nome normalizado dos desejados (uma consulta por filme, sem
+    varrer catálogo x desejados).
+
+    Returns:
+        Tupla (gravados, eventos): as tuplas de `gravar_filmes` e um evento
+        de notificação por filme desejado que chegou, com todos os
+        `usuarios_interessados`.
+    """
+    # O catálogo é gravado antes de retirar os desejados, e sob a trava que
+    # o cadastro de desejos usa para consultar o catálogo: nenhum interessado
+    # registrado entre as duas etapas fica sem notificação.
+    gravados = gravar_filmes(filmes)
+    with trava_desejados():
+        retirados = retirar_desejados(filme.get('nome') for _, filme, _ in gravados)
+
+    eventos = []
+    notificado_em = datetime.utcnow().isoformat() + 'Z'
+    for _, filme, _ in gravados:
+        retirado = retirados.pop(normaliza_nome(filme.get('nome')), None)
+        if not retirado:
+            continue
+        documentos, usuarios_interessados = retirado
+        eventos.append({
+            'tipo': 'filme_desejado_disponivel',
+            'mensagem': f'Filme "{filme.get("nome")}" chegou à plataforma!',
+            'filme': {'id': filme.get('id'), 'nome': filme.get('nome')},
+            'desejado_desde': min(doc.get('cadastrado_em') or '' for doc in documentos) or None,
+            'usuarios_interessados': usuarios_interessados,
+            'total_interessados': len(usuarios_interessados),
+            'notificado_em': notificado_em
+        })
+
+    return gravados, eventos
+
+
+def validaFilmesCatalogo(mensagem):
+    """
+    Estágio que consome `filaFilmesCatalogo`: valida e grava os filmes e casa
+    os novos títulos com os filmes desejados.
+    Retorna o resumo com os eventos para `filaNotificaInteressados`.
+    """
+    filmes = mensagem.get('filmes') if isinstance(mensagem, dict) else None
+    erro = _valida_filmes(filmes)
+    if erro:
+        return {
+            'sucesso': False,
+            'mensagem': erro
+        }
+
+    gravados, eventos = ingerirFilmes(filmes)
+    inseridos = sum(1 for _, _, novo in gravados if novo)
+
+    return {
+        'sucesso': True,
+        'mensagem': f'{inseridos} filmes inseridos e {len(gravados) - inseridos} atualizados no catálogo.',
+        'total_inseridos': inseridos,
+        'total_atualizados': len(gravados) - inseridos,
+        'total_notificacoes': len(eventos),
+        'notificacoes': eventos
+    }
+
+
+def notificaInteressados(resultado):
+    """
+    Estágio que consome `filaNotificaInteressados` e devolve (corpo, statusCode)
+    simulando um SNS: cada evento de `notificacoes` é publicado uma única vez
+    para todos os usuários interessados no filme.
+    """
+    status = 200 if resultado.get('sucesso') else 400
+    return resultado, status
+
+
+# Pipeline da ingestão: cada requisição recebe de volta apenas a própria notificação
+pipelineCatalogo = Pipeline('cadastraFilmesCatalogo', [
+    ('filaFilmesCatalogo', validaFilmesCatalogo),
+    ('filaNotificaInteressados', notificaInteressados)
+])
+
+
+# Execução via linha de comando:
+#   python cadastraFilmesCatalogo.py filmes.json   -> arquivo com uma lista de filmes
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', encoding='utf-8') as f:
+            filmes = json.load(f)
+    else:
+        filmes = [{
+            'nome': 'Matrix 5',
+            'descricao': 'Exemplo de ingestão',
+            'detalhes': {},
+            'streamings': []
+        }]
+    print(cadastraFilmesCatalogo({'filmes': filmes})['body'])
@@ -0,0 +1,538 @@
+import heapq
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date
+from difflib import SequenceMatcher
+from armazenamento import TabelaTinyDB, criar_tabela
+from catalogoBinario import DocumentosMapeados, abrir_catalogo_binario
+from indices import CASAS_SIMILARIDADE, ArvoreIntervalos, IndiceCaracteres, IndiceHash, normaliza_nome, texto_comparavel
+from snapshot import SnapshotCompartilhado, SnapshotTabela
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATALOGO_JSON = os.path.join(BASE_DIR, 'data', 'filmes.json')
+TABELA_CATALOGO = 'Filmes'
+TABELA_META = 'Meta'
+VERSAO_SCHEMA_CATALOGO = 1
+
+# Campos indexados da tabela (colunas com índice no SQLite)
+COLUNAS_CATALOGO = {
+    'id': lambda filme: filme.get('id'),
+    'nome_normalizado': lambda filme: normaliza_nome(filme.get('nome')),
+}
+
+
+def versao_schema_catalogo(dados):
+    """
+    Retorna a versão do schema registrada no conteúdo do catálogo
+    (0 quando o marcador não existe, ou seja, o arquivo nunca foi migrado).
+    """
+    if not isinstance(dados, dict) or not isinstance(dados.get(TABELA_META), dict):
+        return 0
+    for doc in dados[TABELA_META].values():
+        if isinstance(doc, dict) and isinstance(doc.get('versao_schema'), int):
+            return doc['versao_schema']
+    return 0
+
+
+def dia_ordinal(texto, padrao=None):
+    """
+    Converte uma data ISO ("AAAA-MM-DD") no número do dia (date.toordinal).
+    Vazio/ausente vira `padrao` (uma date); data inválida vira None.
+    """
+    if texto is None or texto == '':
+        return padrao.toordinal() if padrao else None
+    try:
+        return date.fromisoformat(str(texto)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+class Disponibilidade:
+    """
+    Índice das janelas `disponivel_desde`..`disponivel_ate` dos streamings,
+    por plataforma (nome normalizado). Janelas sem início/fim ficam abertas.
+
+    - arvores: plataforma -> ArvoreIntervalos, para "disponível na data D"
+    - por_fim: plataforma -> janelas ordenadas pelo fim, para "sai nos
+      próximos N dias" (busca binária no fim da janela)
+    """
+
+    def __init__(self, documentos):
+        janelas = {}
+        for doc_id, doc in documentos.items():
+            for streaming in doc.get('streamings') or []:
+                if not isinstance(streaming, dict):
+                    continue
+                plataforma = normaliza_nome(streaming.get('plataforma'))
+                inicio = dia_ordinal(streaming.get('disponivel_desde'), date.min)
+                fim = dia_ordinal(streaming.get('disponivel_ate'), date.max)
+                if plataforma and inicio is not None and fim is not None:
+                    janelas.setdefault(plataforma, []).append((inicio, fim, (doc_id, streaming)))
+
+        self.arvores = {plataforma: ArvoreIntervalos(lista) for plataforma, lista in janelas.items()}
+        self.por_fim = {
+            plataforma: sorted(lista, key=lambda janela: janela[1]) for plataforma, lista in janelas.items()
+        }
+        self._fins = {plataforma: [janela[1] for janela in lista] for plataforma, lista in self.por_fim.items()}
+
+    def _plataformas(self, plataforma):
+        if plataforma is None:
+            return list(self.arvores)
+        return [normaliza_nome(plataforma)]
+
+    def disponiveis(self, plataforma, dia):
+        """
+        Gera (doc_id, streaming) das janelas que contêm o dia.
+        `plataforma` None consulta todas.
+        """
+        for chave in self._plataformas(plataforma):
+            arvore = self.arvores.get(chave)
+            if arvore is not None:
+                for _, _, valor in arvore.contendo(dia):
+                    yield valor
+
+    def saindo(self, plataforma, dia, dias):
+        """
+        Gera (doc_id, streaming) das janelas disponíveis no dia que terminam
+        até `dias` dias depois, em ordem de término.
+        """
+        for chave in self._plataformas(plataforma):
+            fins = self._fins.get(chave, [])
+            janelas = self.por_fim.get(chave, [])
+            for posicao in range(bisect_left(fins, dia), bisect_right(fins, dia + dias)):
+                inicio, _, valor = janelas[posicao]
+                if inicio <= dia:
+                    yield valor
+
+
+def _inteiro_ou_none(valor):
+    return valor if isinstance(valor, int) and not isinstance(valor, bool) else None
+
+
+class Facetas:
+    """
+    Índices invertidos sobre `detalhes` para filtragem por facetas:
+
+    - generos / diretores: valor normalizado -> doc_ids
+    - anos / duracoes: pares (valor, doc_id) ordenados, para faixas por
+      busca binária
+
+    A consulta parte da faceta mais seletiva (tamanhos calculados pelos
+    postings e por bisect, sem varrer o catálogo) e confere as demais nos
+    valores do próprio filme.
+    """
+
+    def __init__(self, documentos):
+        # doc_id -> (gêneros normalizados, ano, diretor normalizado, duração)
+        self.valores = {}
+        self.generos = {}
+        self.diretores = {}
+        # valor normalizado -> grafia original (a primeira encontrada)
+        self.nomes = {}
+        anos = []
+        duracoes = []
+
+        for doc_id, doc in documentos.items():
+            detalhes = doc.get('detalhes') if isinstance(doc.get('detalhes'), dict) else {}
+            generos = detalhes.get('generos') if isinstance(detalhes.get('generos'), list) else []
+            chaves_generos = set()
+            for genero in generos:
+                chave = normaliza_nome(genero)
+                if chave:
+                    chaves_generos.add(chave)
+                    self.nomes.setdefault(('genero', chave), genero)
+            for chave in chaves_generos:
+                self.generos.setdefault(chave, []).append(doc_id)
+
+            diretor = normaliza_nome(detalhes.get('diretor'))
+            if diretor:
+                self.diretores.setdefault(diretor, []).append(doc_id)
+                self.nomes.setdefault(('diretor', diretor), detalhes.get('diretor'))
+
+            ano = _inteiro_ou_none(detalhes.get('ano'))
+            duracao = _inteiro_ou_none(detalhes.get('duracao_min'))
+            if ano is not None:
+                anos.append((ano, doc_id))
+            if duracao is not None:
+                duracoes.append((duracao, doc_id))
+
+            self.valores[doc_id] = (frozenset(chaves_generos), ano, diretor, duracao)
+
+        anos.sort()
+        duracoes.sort()
+        self._anos = [ano for ano, _ in anos]
+        self._anos_ids = [doc_id for _, doc_id in anos]
+        self._duracoes = [duracao for duracao, _ in duracoes]
+        self._duracoes_ids = [doc_id for _, doc_id in duracoes]
+
+    @staticmethod
+    def _faixa(valores, ids, de, ate):
+        inicio = bisect_left(valores, de) if de is not None else 0
+        fim = bisect_right(valores, ate) if ate is not None else len(valores)
+        return ids[inicio:fim] if fim > inicio else []
+
+    def filtrar(self, generos=None, diretores=None, ano_de=None, ano_ate=None, duracao_de=None, duracao_ate=None):
+        """
+        Retorna os doc_ids que atendem a todas as facetas informadas. Dentro
+        de uma faceta com vários valores (gêneros, diretores) basta um.
+        """
+        generos = {normaliza_nome(genero) for genero in generos or ()} - {''}
+        diretores = {normaliza_nome(diretor) for diretor in diretores or ()} - {''}
+        filtra_ano = ano_de is not None or ano_ate is not None
+        filtra_duracao = duracao_de is not None or duracao_ate is not None
+
+        # Fontes de candidatos: (tamanho, função que materializa os doc_ids)
+        fontes = []
+        if generos:
+            fontes.append((
+                sum(len(self.generos.get(genero, ())) for genero in generos),
+                lambda: {doc_id for genero in generos for doc_id in self.generos.get(genero, ())}
+            ))
+        if diretores:
+            fontes.append((
+                sum(len(self.diretores.get(diretor, ())) for diretor in diretores),
+                lambda: {doc_id for diretor in diretores for doc_id in self.diretores.get(diretor, ())}
+            ))
+        if filtra_ano:
+            fontes.append((
+                (bisect_right(self._anos, ano_ate) if ano_ate is not None else len(self._anos))
+                - (bisect_left(self._anos, ano_de) if ano_de is not None else 0),
+                lambda: self._faixa(self._anos, self._anos_ids, ano_de, ano_ate)
+            ))
+        if filtra_duracao:
+            fontes.append((
+                (bisect_right(self._duracoes, duracao_ate) if duracao_ate is not None else len(self._duracoes))
+                - (bisect_left(self._duracoes, duracao_de) if duracao_de is not None else 0),
+                lambda: self._faixa(self._duracoes, self._duracoes_ids, duracao_de, duracao_ate)
+            ))
+
+        if not fontes:
+            return list(self.valores)
+
+        _, materializar = min(fontes, key=lambda fonte: fonte[0])
+
+        def atende(doc_id):
+            generos_filme, ano, diretor, duracao = self.valores[doc_id]
+            if generos and generos.isdisjoint(generos_filme):
+                return False
+            if diretores and diretor not in diretores:
+                return False
+            if filtra_ano and (ano is None or (ano_de is not None and ano < ano_de)
+                               or (ano_ate is not None and ano > ano_ate)):
+                return False
+            if filtra_duracao and (duracao is None or (duracao_de is not None and duracao < duracao_de)
+                                   or (duracao_ate is not None and duracao > duracao_ate)):
+                return False
+            return True
+
+        return [doc_id for doc_id in materializar() if atende(doc_id)]
+
+    def contagens(self, doc_ids):
+        """
+        Contagem de cada valor das facetas entre os filmes informados,
+        da mais frequente para a menos frequente.
+        """
+        generos, anos, diretores = {}, {}, {}
+        for doc_id in doc_ids:
+            generos_filme, ano, diretor, _ = self.valores[doc_id]
+            for genero in generos_filme:
+                generos[genero] = generos.get(genero, 0) + 1
+            if ano is not None:
+                anos[ano] = anos.get(ano, 0) + 1
+            if diretor:
+                diretores[diretor] = diretores.get(diretor, 0) + 1
+
+        def ordenar(contagem, faceta=None):
+            itens = sorted(contagem.items(), key=lambda item: (-item[1], str(item[0])))
+            if faceta is None:
+                return [{'valor': valor, 'total': total} for valor, total in itens]
+            return [{'valor': self.nomes[(faceta, valor)], 'total': total} for valor, total in itens]
+
+        return {
+            'generos': ordenar(generos, 'genero'),
+            'anos': ordenar(anos),
+            'diretores': ordenar(diretores, 'diretor')
+        }
+
+
+class Catalogo(SnapshotTabela):
+    """
+    Fotografia imutável do catálogo carregada em memória.
+    Todas as funções leem desta estrutura em vez de reabrir `filmes.json`.
+
+    Índices mantidos:
+    - por_id: `id` do filme -> doc_ids
+    - por_nome: nome normalizado (sem acentos/caixa) -> doc_ids
+    - indice_caracteres: caracteres do nome em minúsculas -> doc_ids
+    - disponibilidade(): janelas dos streamings por plataforma (sob demanda)
+    - facetas(): postings de gênero, ano, diretor e duração (sob demanda)
+    """
+
+    @property
+    def filmes(self):
+        return list(self.documentos.values())
+
+    def _criar_indices(self):
+        self.por_id = IndiceHash()
+        self.por_nome = IndiceHash()
+        self.indice_caracteres = IndiceCaracteres()
+        # Maiores doc_id e `id` já vistos, para numerar filmes novos sem varrer o catálogo
+        self.maior_doc_id = 0
+        self.maior_id = 0
+        self._criar_indices_sob_demanda()
+
+    def _criar_indices_sob_demanda(self):
+        # Índices construídos na primeira consulta de cada versão do catálogo
+        self._sob_demanda = {}
+        self._lock_sob_demanda = threading.Lock()
+
+    def _indice_sob_demanda(self, classe):
+        indice = self._sob_demanda.get(classe)
+        if indice is None:
+            with self._lock_sob_demanda:
+                indice = self._sob_demanda.get(classe)
+                if indice is None:
+                    indice = self._sob_demanda[classe] = classe(self.documentos)
+        return indice
+
+    def _copiar_indices(self):
+        self.por_id = self.por_id.copiar()
+        self.por_nome = self.por_nome.copiar()
+        self.indice_caracteres = self.indice_caracteres.copiar()
+        self._criar_indices_sob_demanda()
+
+    def _indexar(self, doc_id, doc):
+        nome = doc.get('nome')
+        self._indexar_chaves(doc_id, doc.get('id'), texto_comparavel(nome), normaliza_nome(nome))
+
+    def _indexar_chaves(self, doc_id, filme_id, nome, nome_normalizado):
+        self.por_id.adicionar(doc_id, filme_id)
+        self.por_nome.adicionar(doc_id, nome_normalizado)
+        self.indice_caracteres.adicionar(doc_id, nome)
+        self.maior_doc_id = max(self.maior_doc_id, doc_id)
+        if isinstance(filme_id, int):
+            self.maior_id = max(self.maior_id, filme_id)
+
+    def _desindexar(self, doc_id, doc):
+        self.por_id.remover(doc_id, doc.get('id'))
+        self.por_nome.remover(doc_id, normaliza_nome(doc.get('nome')))
+        self.indice_caracteres.remover(doc_id)
+
+    def filme_por_id(self, filme_id):
+        """
+        Retorna o filme com o `id` informado ou None.
+        """
+        doc_id = self.por_id.primeiro(filme_id)
+        return self.documentos[doc_id] if doc_id is not None else None
+
+    def filmes_por_ids(self, filme_ids):
+        """
+        Resolve vários `id` de uma vez pelo índice por_id.
+        Retorna um dict `id` -> filme apenas com os ids encontrados.
+        """
+        encontrados = {}
+        for filme_id in set(filme_ids):
+            doc_id = self.por_id.primeiro(filme_id)
+            if doc_id is not None:
+                encontrados[filme_id] = self.documentos[doc_id]
+        return encontrados
+
+    def filme_por_nome(self, nome):
+        """
+        Retorna o primeiro filme cujo nome coincide, ignorando acentos,
+        maiúsculas/minúsculas e espaços extras, ou None.
+        """
+        doc_id = self.por_nome.primeiro(normaliza_nome(nome))
+        return self.documentos[doc_id] if doc_id is not None else None
+
+    def disponibilidade(self):
+        """
+        Retorna o índice de janelas dos streamings desta versão do catálogo.
+        """
+        return self._indice_sob_demanda(Disponibilidade)
+
+    def facetas(self):
+        """
+        Retorna o índice de facetas (gênero, ano, diretor e duração) desta
+        versão do catálogo.
+        """
+        return self._indice_sob_demanda(Facetas)
+
+    def candidatos_similares(self, nome, limite=5, similaridade_minima=0.5):
+        """
+        Retorna, na ordem do catálogo, os filmes que podem estar entre os
+        `limite` mais parecidos com `nome` (similaridade acima de
+        `similaridade_minima`). É o conjunto (pequeno) que deve passar pelo
+        ranqueamento, com o mesmo resultado da varredura exaustiva.
+
+        Os títulos são visitados do maior para o menor `quick_ratio()`
+        (índice de caracteres); a visita para quando esse limite superior,
+        arredondado como a similaridade exibida, fica abaixo do `limite`-ésimo
+        melhor `ratio()` arredondado já calculado: nenhum título restante
+        consegue mais entrar no resultado, nem empatado (o ranking ordena pelo
+        valor arredondado e desempata pela ordem do catálogo).
+        """
+        nome_busca = texto_comparavel(nome)
+        matcher = SequenceMatcher(None)
+        matcher.set_seq1(nome_busca)
+        melhores = []  # heap com os `limite` maiores ratios arredondados vistos
+        escolhidos = set()
+        for limite_superior, doc_id in self.indice_caracteres.limites_superiores(nome_busca, similaridade_minima):
+            if len(melhores) >= limite and round(limite_superior, CASAS_SIMILARIDADE) < melhores[0]:
+                break
+            matcher.set_seq2(texto_comparavel(self.documentos[doc_id].get('nome')))
+            sim = matcher.ratio()
+            if sim <= similaridade_minima:
+                continue
+            escolhidos.add(doc_id)
+            sim = round(sim, CASAS_SIMILARIDADE)
+            if len(melhores) < limite:
+                heapq.heappush(melhores, sim)
+            elif sim > melhores[0]:
+                heapq.heapreplace(melhores, sim)
+
+        if len(escolhidos) <= 1:
+            return [self.documentos[doc_id] for doc_id in escolhidos]
+        # Mantém a ordem do catálogo: ela desempata similaridades iguais
+        return [self.documentos[doc_id] for doc_id in self.documentos if doc_id in escolhidos]
+
+
+class CatalogoMapeado(Catalogo):
+    """
+    Catálogo lido do arquivo compilado (catalogoBinario.py) em vez do JSON:
+    os documentos ficam nas páginas mapeadas e os índices são montados só
+    com os ids e nomes normalizados, sem decodificar descrições, detalhes e
+    streamings. Alterações (`com_alteracoes`) geram uma versão com os
+    documentos num dict comum, ainda decodificados sob demanda.
+    """
+
+    def __init__(self, arquivo, versao):
+        self.arquivo = arquivo
+        self.documentos = DocumentosMapeados(arquivo)
+        self.versao = versao
+        self._criar_indices()
+        for doc_id, filme_id, nome, nome_normalizado in arquivo.chaves():
+            self._indexar_chaves(doc_id, filme_id, texto_comparavel(nome), nome_normalizado)
+
+
+class CatalogoCompartilhado(SnapshotCompartilhado):
+    """
+    Snapshot do catálogo compartilhado pelo processo. No TinyDB confia no
+    marcador de schema gravado pela migração; só migra se encontrar um
+    arquivo sem ele. Se houver um catálogo compilado gerado a partir da
+    versão atual do filmes.json, ele é mapeado em vez de ler o JSON.
+    """
+
+    def __init__(self, fonte=None):
+        super().__init__(fonte or tabela_catalogo(), Catalogo)
+
+    def _carregar(self, assinatura):
+        arquivo = abrir_catalogo_binario(assinatura) if isinstance(self.fonte, TabelaTinyDB) else None
+        if arquivo is None:
+            super()._carregar(assinatura)
+            return
+        self._snapshot = CatalogoMapeado(arquivo, self._snapshot.versao + 1)
+        self._assinatura = assinatura
+
+    def _preparar_dados(self, dados, assinatura):
+        if isinstance(self.fonte, TabelaTinyDB) and versao_schema_catalogo(dados) < VERSAO_SCHEMA_CATALOGO:
+            # Arquivo nunca migrado (ex.: copiado manualmente para data/):
+            # migra uma vez e confia no marcador dali em diante.
+            from migracao import migrar_catalogo
+            migrar_catalogo(self.fonte.path)
+            assinatura = self._assinatura_arquivo()
+            dados = self._ler_dados(assinatura)
+        return dados, assinatura
+
+
+def tabela_catalogo(backend=None):
+    """
+    Tabela do catálogo no backend configurado.
+    """
+    return criar_tabela(CATALOGO_JSON, TABELA_CATALOGO, COLUNAS_CATALOGO, backend, journal=True)
+
+
+_catalogo_compartilhado = CatalogoCompartilhado()
+
+# Serializa as escritas no catálogo entre as threads deste processo (entre
+# processos vale a trava de escrita da tabela)
+_lock_escrita_catalogo = threading.Lock()
+
+
+def obter_catalogo():
+    """
+    Retorna o snapshot do catálogo compartilhado pelo processo.
+    """
+    return _catalogo_compartilhado.obter()
+
+
+def registrar_alteracoes_catalogo(alterados=None, removidos=(), assinatura_anterior=None):
+    """
+    Propaga para o snapshot compartilhado as alterações que o processo
+    acabou de gravar no catálogo. `assinatura_anterior` é a assinatura da
+    tabela lida antes da escrita (sem ela o snapshot é relido).
+    """
+    _catalogo_compartilhado.aplicar_alteracoes(alterados, removidos, assinatura_anterior)
+
+
+def gravar_filmes(filmes):
+    """
+    Insere ou atualiza filmes no catálogo pelo `id` (upsert), numa única
+    escrita, e aplica as mudanças nos índices do snapshot incrementalmente.
+    Filmes sem `id` recebem o próximo `id` livre.
+
+    A trava de escrita da tabela vale entre processos (workers do gunicorn,
+    importações): o snapshot é relido dentro dela, então doc_ids e ids novos
+    são numerados a partir da última gravação de qualquer processo.
+
+    Returns:
+        Lista de tuplas (doc_id, filme gravado, novo), na ordem recebida
+    """
+    filmes = [dict(filme) for filme in filmes]
+    with _lock_escrita_catalogo, _catalogo_compartilhado.fonte.travar_escrita():
+        catalogo = obter_catalogo()
+        proximo_doc_id = catalogo.maior_doc_id + 1
+        # Ids gerados ficam acima de todos os ids informados no próprio lote
+        proximo_id = max(
+            [catalogo.maior_id] + [filme['id'] for filme in filmes if isinstance(filme.get('id'), int)]
+        ) + 1
+
+        alterados = {}
+        doc_ids_lote = {}
+        gravados = []
+        for filme in filmes:
+            if filme.get('id') is None:
+                filme['id'] = proximo_id
+                proximo_id += 1
+
+            doc_id = doc_ids_lote.get(filme['id'])
+            if doc_id is None:
+                doc_id = catalogo.por_id.primeiro(filme['id'])
+            novo = doc_id is None
+            if doc_id is None:
+                doc_id = proximo_doc_id
+                proximo_doc_id += 1
+            doc_ids_lote[filme['id']] = doc_id
+
+            alterados[doc_id] = filme
+            gravados.append((doc_id, filme, novo))
+
+        if alterados:
+            assinatura = _catalogo_compartilhado.assinatura_fonte()
+            _catalogo_compartilhado.fonte.gravar(alterados)
+            registrar_alteracoes_catalogo(alterados, assinatura_anterior=assinatura)
+
+    return gravados
+
+
+def consolidar_catalogo():
+    """
+    Incorpora ao filmes.json os lotes anexados ao journal do catálogo (só
+    no TinyDB; no SQLite não faz nada). As importações chamam no fim, para
+    que o catálogo compilado volte a valer.
+    """
+    with _lock_escrita_catalogo, _catalogo_compartilhado.fonte.travar_escrita():
+        assinatura = _catalogo_compartilhado.assinatura_fonte()
+        _catalogo_compartilhado.fonte.consolidar()
+        registrar_alteracoes_catalogo({}, assinatura_anterior=assinatura)
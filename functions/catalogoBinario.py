@@ -0,0 +1,381 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from tinydb.table import Document
+from indices import normaliza_nome
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATALOGO_BINARIO = os.environ.get(
+    'MOVIEFINDER_CATALOGO_BINARIO',
+    os.path.join(BASE_DIR, 'data', 'filmes.bin')
+)
+
+# Formato do arquivo compilado (little-endian, seções alinhadas em 8 bytes):
+#   cabeçalho: assinatura, versão do formato, total de filmes, mtime_ns e
+#              tamanho do filmes.json de origem, início de cada seção
+#   doc_ids         uint32 x N  (ordem crescente)
+#   ids             int64  x N  (`id` do filme; SEM_ID quando não há)
+#   flags           uint8  x N  (TEM_ID / TEM_NOME)
+#   pos_nomes       uint32 x N+1, pos_normalizados uint32 x N+1,
+#   pos_blobs       uint64 x N+1 (limites de cada filme nos blocos abaixo)
+#   bloco de nomes, bloco de nomes normalizados (UTF-8)
+#   bloco de blobs: o resto de cada filme (descricao, detalhes, streamings...)
+#                   em JSON, decodificado só quando alguém lê esses campos
+ASSINATURA = b'MFCATBIN'
+VERSAO_FORMATO = 1
+CABECALHO = struct.Struct('<8sIIqq9Q')
+SECOES = ('doc_ids', 'ids', 'flags', 'pos_nomes', 'pos_normalizados', 'pos_blobs',
+          'nomes', 'normalizados', 'blobs')
+SEM_ID = -2 ** 63
+TEM_ID = 1
+TEM_NOME = 2
+
+# Campos que vêm das tabelas fixas, sem decodificar o blob
+CAMPOS_TITULO = ('id', 'nome')
+
+
+class ArquivoCatalogo:
+    """
+    Catálogo compilado aberto com mmap (somente leitura). As tabelas de
+    tamanho fixo são lidas direto das páginas mapeadas, então todos os
+    processos que abrem o mesmo arquivo compartilham uma única cópia no
+    page cache.
+    """
+
+    def __init__(self, path):
+        if sys.byteorder != 'little':
+            raise ValueError('O catálogo compilado só pode ser lido em máquinas little-endian')
+        with open(path, 'rb') as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mapa) < CABECALHO.size:
+            raise ValueError(f'Catálogo compilado inválido: {path}')
+        assinatura, formato, total, mtime_ns, tamanho, *inicios = CABECALHO.unpack_from(self._mapa, 0)
+        if assinatura != ASSINATURA or formato != VERSAO_FORMATO:
+            raise ValueError(f'Catálogo compilado inválido ou de outra versão: {path}')
+
+        self.path = path
+        self.total = total
+        self.origem = (mtime_ns, tamanho)
+        secoes = dict(zip(SECOES, inicios))
+        memoria = memoryview(self._mapa)
+
+        def coluna(nome, formato, quantidade):
+            inicio = secoes[nome]
+            return memoria[inicio:inicio + quantidade * struct.calcsize(formato)].cast(formato)
+
+        self.doc_ids = coluna('doc_ids', 'I', total)
+        self.ids = coluna('ids', 'q', total)
+        self.flags = coluna('flags', 'B', total)
+        self._pos_nomes = coluna('pos_nomes', 'I', total + 1)
+        self._pos_normalizados = coluna('pos_normalizados', 'I', total + 1)
+        self._pos_blobs = coluna('pos_blobs', 'Q', total + 1)
+        self._inicio_nomes = secoes['nomes']
+        self._inicio_normalizados = secoes['normalizados']
+        self._inicio_blobs = secoes['blobs']
+
+    def linha(self, doc_id):
+        """
+        Posição do documento nas tabelas (busca binária em doc_ids) ou None.
+        """
+        if not isinstance(doc_id, int):
+            return None
+        linha = bisect_left(self.doc_ids, doc_id)
+        if linha < self.total and self.doc_ids[linha] == doc_id:
+            return linha
+        return None
+
+    def _texto(self, inicio, posicoes, linha):
+        return self._mapa[inicio + posicoes[linha]:inicio + posicoes[linha + 1]].decode('utf-8')
+
+    def filme_id(self, linha):
+        return self.ids[linha] if self.flags[linha] & TEM_ID else None
+
+    def nome(self, linha):
+        return self._texto(self._inicio_nomes, self._pos_nomes, linha)
+
+    def nome_normalizado(self, linha):
+        return self._texto(self._inicio_normalizados, self._pos_normalizados, linha)
+
+    def blob(self, linha):
+        return self._mapa[self._inicio_blobs + self._pos_blobs[linha]:self._inicio_blobs + self._pos_blobs[linha + 1]]
+
+    def titulo(self, linha):
+        """
+        Campos `id` e `nome` do filme (só os que o documento tem).
+        """
+        flags = self.flags[linha]
+        campos = {}
+        if flags & TEM_ID:
+            campos['id'] = self.ids[linha]
+        if flags & TEM_NOME:
+            campos['nome'] = self.nome(linha)
+        return campos
+
+    def chaves(self):
+        """
+        Gera (doc_id, id, nome, nome normalizado) de cada filme, sem tocar
+        nos blobs.
+        """
+        for linha in range(self.total):
+            nome = self.nome(linha) if self.flags[linha] & TEM_NOME else None
+            yield self.doc_ids[linha], self.filme_id(linha), nome, self.nome_normalizado(linha)
+
+
+class FilmeMapeado(Document):
+    """
+    Documento do catálogo compilado. Nasce só com `id` e `nome` (lidos das
+    tabelas mapeadas); o blob com o resto é decodificado no primeiro acesso
+    a qualquer outro campo, ou quando o documento é copiado, comparado,
+    iterado ou serializado. Depois disso se comporta como um Document comum.
+    """
+
+    def __init__(self, arquivo, linha):
+        super().__init__(arquivo.titulo(linha), doc_id=arquivo.doc_ids[linha])
+        self._arquivo = arquivo
+        self._linha = linha
+        self._completo = False
+
+    def _materializar(self):
+        if not self._completo:
+            # Só acrescenta chaves: leitores concorrentes nunca veem o
+            # documento encolher
+            dict.update(self, json.loads(self._arquivo.blob(self._linha)))
+            self._completo = True
+
+    def _campo(self, chave):
+        if not self._completo and (chave not in CAMPOS_TITULO or not dict.__contains__(self, chave)):
+            self._materializar()
+
+    def __getitem__(self, chave):
+        self._campo(chave)
+        return dict.__getitem__(self, chave)
+
+    def get(self, chave, padrao=None):
+        self._campo(chave)
+        return dict.get(self, chave, padrao)
+
+    def __contains__(self, chave):
+        self._campo(chave)
+        return dict.__contains__(self, chave)
+
+    def __iter__(self):
+        self._materializar()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self._materializar()
+        return dict.__len__(self)
+
+    def keys(self):
+        self._materializar()
+        return dict.keys(self)
+
+    def values(self):
+        self._materializar()
+        return dict.values(self)
+
+    def items(self):
+        self._materializar()
+        return dict.items(self)
+
+    def copy(self):
+        self._materializar()
+        return dict.copy(self)
+
+    def __eq__(self, outro):
+        self._materializar()
+        if isinstance(outro, FilmeMapeado):
+            outro._materializar()
+        return dict.__eq__(self, outro)
+
+    def __ne__(self, outro):
+        resultado = self.__eq__(outro)
+        return resultado if resultado is NotImplemented else not resultado
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._materializar()
+        return dict.__repr__(self)
+
+    def __reduce_ex__(self, protocolo):
+        # copy/deepcopy/pickle viram um Document comum (sem o mmap)
+        self._materializar()
+        return Document, (dict.copy(self), self.doc_id)
+
+
+class DocumentosMapeados(Mapping):
+    """
+    doc_id -> FilmeMapeado sobre um ArquivoCatalogo. Cada documento lido por
+    chave é guardado, então um filme consultado de novo não decodifica o blob
+    outra vez; só os filmes realmente lidos ocupam o heap do processo.
+    Varreduras completas (`values`/`items`, usadas pelos índices sob
+    demanda) reaproveitam os documentos guardados, mas não guardam os demais.
+    """
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self._documentos = {}
+
+    def __getitem__(self, doc_id):
+        documento = self._documentos.get(doc_id)
+        if documento is None:
+            linha = self.arquivo.linha(doc_id)
+            if linha is None:
+                raise KeyError(doc_id)
+            # setdefault: duas threads que montam o mesmo filme ficam com o mesmo objeto
+            documento = self._documentos.setdefault(doc_id, FilmeMapeado(self.arquivo, linha))
+        return documento
+
+    def _documento_da_linha(self, linha):
+        documento = self._documentos.get(self.arquivo.doc_ids[linha])
+        return documento if documento is not None else FilmeMapeado(self.arquivo, linha)
+
+    def __iter__(self):
+        return iter(self.arquivo.doc_ids)
+
+    def __len__(self):
+        return self.arquivo.total
+
+    def __contains__(self, doc_id):
+        return self.arquivo.linha(doc_id) is not None
+
+    # Geradores: numa varredura, cada documento não guardado pode ser
+    # descartado (junto com o blob decodificado) logo depois de lido
+    def values(self):
+        for linha in range(self.arquivo.total):
+            yield self._documento_da_linha(linha)
+
+    def items(self):
+        for linha in range(self.arquivo.total):
+            yield self.arquivo.doc_ids[linha], self._documento_da_linha(linha)
+
+
+def abrir_catalogo_binario(assinatura_json, path=None):
+    """
+    Abre o catálogo compilado se ele existir e tiver sido gerado a partir do
+    filmes.json com a assinatura informada (mtime_ns, tamanho, ...).
+    Retorna o ArquivoCatalogo ou None (ausente, desatualizado ou inválido).
+    """
+    path = path or CATALOGO_BINARIO
+    if assinatura_json is None or not os.path.exists(path):
+        return None
+    if len(assinatura_json) > 3:
+        # Registros no journal do catálogo (TabelaTinyDB.assinatura): o
+        # compilado cobre só o filmes.json
+        return None
+    try:
+        arquivo = ArquivoCatalogo(path)
+    except (OSError, ValueError):
+        return None
+    if arquivo.origem != tuple(assinatura_json[:2]):
+        return None
+    return arquivo
+
+
+def _alinhar(saida):
+    saida.write(b'\0' * (-saida.tell() % 8))
+    return saida.tell()
+
+
+def compilar_catalogo(path_json=None, destino=None):
+    """
+    Gera o catálogo compilado a partir do filmes.json (migrado para o schema
+    atual antes, se preciso). O arquivo é gravado ao lado e trocado de uma
+    vez, então processos com a versão anterior mapeada continuam lendo-a.
+
+    Returns:
+        Dicionário com o destino, a quantidade de filmes, o tamanho em bytes
+        e os segundos gastos
+    """
+    from armazenamento import TabelaTinyDB
+    from catalogo import CATALOGO_JSON, TABELA_CATALOGO
+    from migracao import migrar_catalogo
+
+    inicio_compilacao = time.perf_counter()
+    path_json = path_json or CATALOGO_JSON
+    destino = destino or CATALOGO_BINARIO
+    migrar_catalogo(path_json)
+
+    tabela = TabelaTinyDB(path_json, TABELA_CATALOGO, journal=True)
+    tabela.consolidar()
+    assinatura = tabela.assinatura()
+    documentos = tabela.extrair_documentos(tabela.ler_dados(assinatura))
+    if tabela.assinatura() != assinatura:
+        raise RuntimeError('filmes.json foi alterado durante a compilação; tente novamente')
+
+    doc_ids = array('I')
+    ids = array('q')
+    flags = array('B')
+    pos_nomes, pos_normalizados, pos_blobs = array('I', [0]), array('I', [0]), array('Q', [0])
+    nomes, normalizados, blobs = [], [], []
+    tamanhos = [0, 0, 0]
+
+    for doc_id in sorted(documentos):
+        doc = dict(documentos[doc_id])
+        flag = 0
+        filme_id = doc.get('id')
+        if isinstance(filme_id, int) and not isinstance(filme_id, bool) and SEM_ID < filme_id < 2 ** 63:
+            flag |= TEM_ID
+            del doc['id']
+        nome = doc.get('nome')
+        if isinstance(nome, str):
+            flag |= TEM_NOME
+            del doc['nome']
+
+        nome_bytes = nome.encode('utf-8') if flag & TEM_NOME else b''
+        normalizado_bytes = normaliza_nome(nome).encode('utf-8')
+        blob = json.dumps(doc, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        doc_ids.append(doc_id)
+        ids.append(filme_id if flag & TEM_ID else SEM_ID)
+        flags.append(flag)
+        for indice, (bloco, posicoes, conteudo) in enumerate((
+            (nomes, pos_nomes, nome_bytes),
+            (normalizados, pos_normalizados, normalizado_bytes),
+            (blobs, pos_blobs, blob)
+        )):
+            bloco.append(conteudo)
+            tamanhos[indice] += len(conteudo)
+            posicoes.append(tamanhos[indice])
+
+    temporario = destino + '.compilando'
+    with open(temporario, 'wb') as saida:
+        saida.write(b'\0' * CABECALHO.size)
+        inicios = []
+        for conteudo in (doc_ids, ids, flags, pos_nomes, pos_normalizados, pos_blobs):
+            inicios.append(_alinhar(saida))
+            conteudo.tofile(saida)
+        for bloco in (nomes, normalizados, blobs):
+            inicios.append(_alinhar(saida))
+            saida.writelines(bloco)
+        tamanho_arquivo = saida.tell()
+
+        saida.seek(0)
+        saida.write(CABECALHO.pack(
+            ASSINATURA, VERSAO_FORMATO, len(doc_ids), assinatura[0], assinatura[1], *inicios
+        ))
+        saida.flush()
+        os.fsync(saida.fileno())
+    os.replace(temporario, destino)
+
+    return {
+        'destino': destino,
+        'filmes': len(doc_ids),
+        'bytes': tamanho_arquivo,
+        'segundos': round(time.perf_counter() - inicio_compilacao, 3)
+    }
+
+
+# Execução via linha de comando:
+#   python catalogoBinario.py                      -> data/filmes.json -> data/filmes.bin
+#   python catalogoBinario.py filmes.json saida.bin
+if __name__ == '__main__':
+    resumo = compilar_catalogo(*sys.argv[1:3])
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
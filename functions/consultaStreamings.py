@@ -0,0 +1,154 @@
+from datetime import date
+from catalogo import dia_ordinal, obter_catalogo
+from resposta import resposta_lambda
+
+# Maior janela aceita em `dias` para "saindo da plataforma"
+MAX_DIAS_SAINDO = 3650
+
+
+def disponiveisStreaming(plataforma=None, data=None):
+    """
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para disponiveisStreamingDados.
+    """
+    return resposta_lambda(*disponiveisStreamingDados(plataforma, data))
+
+
+def saindoStreaming(plataforma=None, dias=None, data=None):
+    """
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para saindoStreamingDados.
+    """
+    return resposta_lambda(*saindoStreamingDados(plataforma, dias, data))
+
+
+def _erro(mensagem, status_code=400):
+    return {
+        'sucesso': False,
+        'mensagem': mensagem,
+        'dados': None
+    }, status_code
+
+
+def _dia_consulta(data):
+    """
+    Dia (ordinal) consultado: `data` em ISO ou hoje. None se for inválida.
+    """
+    if data is None or data == '':
+        return date.today().toordinal()
+    return dia_ordinal(data)
+
+
+def _filme_streaming(catalogo, doc_id, streaming):
+    filme = catalogo.documentos[doc_id]
+    return {
+        'id': filme.get('id'),
+        'nome': filme.get('nome'),
+        'plataforma': streaming.get('plataforma'),
+        'disponivel_desde': streaming.get('disponivel_desde'),
+        'disponivel_ate': streaming.get('disponivel_ate')
+    }
+
+
+def disponiveisStreamingDados(plataforma=None, data=None):
+    """
+    Lista os filmes disponíveis numa plataforma (ou em todas) na data,
+    consultando a árvore de intervalos das janelas dos streamings.
+
+    Args:
+        plataforma: Nome da plataforma (sem diferenciar acentos/caixa); None para todas
+        data: Data ISO "AAAA-MM-DD" (padrão: hoje)
+
+    Returns:
+        Tupla (corpo, statusCode) com os filmes ordenados por nome
+    """
+    try:
+        dia = _dia_consulta(data)
+        if dia is None:
+            return _erro('Parâmetro "data" inválido. Use o formato AAAA-MM-DD.')
+
+        catalogo = obter_catalogo()
+        filmes = []
+        vistos = set()
+        for doc_id, streaming in catalogo.disponibilidade().disponiveis(plataforma, dia):
+            chave = (doc_id, streaming.get('plataforma'))
+            if chave not in vistos:
+                vistos.add(chave)
+                filmes.append(_filme_streaming(catalogo, doc_id, streaming))
+        filmes.sort(key=lambda filme: (filme['nome'] or '', filme['plataforma'] or ''))
+
+        return {
+            'sucesso': True,
+            'mensagem': f'{len(filmes)} filme(s) disponível(is)',
+            'dados': {
+                'plataforma': plataforma,
+                'data': date.fromordinal(dia).isoformat(),
+                'filmes': filmes,
+                'total': len(filmes)
+            }
+        }, 200
+
+    except Exception as e:
+        return _erro(f'Erro ao consultar disponibilidade: {str(e)}', 500)
+
+
+def saindoStreamingDados(plataforma=None, dias=None, data=None):
+    """
+    Lista os filmes disponíveis numa plataforma (ou em todas) na data cuja
+    janela termina nos próximos `dias` dias, por busca binária no fim das
+    janelas.
+
+    Args:
+        plataforma: Nome da plataforma (sem diferenciar acentos/caixa); None para todas
+        dias: Quantidade de dias a partir da data
+        data: Data ISO "AAAA-MM-DD" (padrão: hoje)
+
+    Returns:
+        Tupla (corpo, statusCode) com os filmes em ordem de saída
+    """
+    try:
+        dia = _dia_consulta(data)
+        if dia is None:
+            return _erro('Parâmetro "data" inválido. Use o formato AAAA-MM-DD.')
+
+        try:
+            dias = int(dias)
+        except (TypeError, ValueError):
+            return _erro('Parâmetro "dias" é obrigatório e deve ser um número inteiro')
+        if dias < 0 or dias > MAX_DIAS_SAINDO:
+            return _erro(f'Parâmetro "dias" deve estar entre 0 e {MAX_DIAS_SAINDO}')
+
+        catalogo = obter_catalogo()
+        filmes = []
+        for doc_id, streaming in catalogo.disponibilidade().saindo(plataforma, dia, dias):
+            filme = _filme_streaming(catalogo, doc_id, streaming)
+            filme['dias_restantes'] = dia_ordinal(streaming.get('disponivel_ate')) - dia
+            filmes.append(filme)
+        if plataforma is None:
+            # Várias plataformas: intercala as listas já ordenadas pelo fim
+            filmes.sort(key=lambda filme: filme['dias_restantes'])
+
+        return {
+            'sucesso': True,
+            'mensagem': f'{len(filmes)} filme(s) saindo nos próximos {dias} dia(s)',
+            'dados': {
+                'plataforma': plataforma,
+                'data': date.fromordinal(dia).isoformat(),
+                'dias': dias,
+                'filmes': filmes,
+                'total': len(filmes)
+            }
+        }, 200
+
+    except Exception as e:
+        return _erro(f'Erro ao consultar disponibilidade: {str(e)}', 500)
+
+
+# Teste local rápido
+if __name__ == '__main__':
+    print("=== Disponíveis na Netflix em 2024-06-01 ===")
+    print(disponiveisStreaming('Netflix', '2024-06-01')['body'])
+    print()
+
+    print("=== Saindo de todas as plataformas em 60 dias a partir de 2025-01-15 ===")
+    print(saindoStreaming(None, 60, '2025-01-15')['body'])
@@ -0,0 +1,580 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from armazenamento import BACKEND, BACKENDS, SQLITE_DB, abrir_sqlite, criar_tabela
+from indices import ConjuntoIds, IndiceHash, normaliza_nome
+from snapshot import SnapshotCompartilhado, SnapshotTabela
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DESEJADOS_JSON = os.path.join(BASE_DIR, 'data', 'filmesDesejados.json')
+DESEJADOS_JOURNAL = os.path.join(BASE_DIR, 'data', 'filmesDesejados.journal')
+TABELA_DESEJADOS = 'FilmesDesejados'
+TABELA_INTERESSADOS = 'Interessados'
+TABELA_TOTAIS_INTERESSADOS = 'TotaisInteressados'
+
+# Interessados novos que ficam num set antes de entrar no segmento ordenado
+# (no mínimo; depois, uma fração do segmento, para a fusão custar O(1) amortizado)
+LIMITE_SEGMENTO = 1024
+# Linhas mortas (de filmes retirados) a partir das quais o journal é reescrito
+LIMITE_COMPACTACAO_INTERESSADOS = 1000
+
+# Campos indexados da tabela (colunas com índice no SQLite)
+COLUNAS_DESEJADOS = {
+    'nome_normalizado': lambda desejado: normaliza_nome(desejado.get('nome')),
+}
+
+# Campos dos documentos antigos, que guardavam os interessados no próprio filme
+CAMPOS_LEGADOS = ('usuarios_interessados', 'total_interessados')
+
+
+def interessados_legados(doc):
+    """
+    Usuários da lista `usuarios_interessados` que os documentos antigos
+    guardavam dentro do filme desejado (ver migracao.migrar_desejados).
+    """
+    return [
+        int(usuario_id) for usuario_id in doc.get('usuarios_interessados') or []
+        if (isinstance(usuario_id, int) and not isinstance(usuario_id, bool))
+        or (isinstance(usuario_id, str) and usuario_id.isdigit())
+    ]
+
+
+class InteressadosJournal:
+    """
+    Interessados dos filmes desejados no backend TinyDB: um registro JSON por
+    linha, só de acréscimo, em `filmesDesejados.journal`
+    (`{"desejado": doc_id, "usuario": usuario_id}`, ou `{"desejado": doc_id,
+    "retirado": true}` quando o filme sai do monitoramento). Cadastrar um
+    interessado custa o append de uma linha, sem regravar o filme desejado
+    nem o filmesDesejados.json.
+
+    Em memória, cada filme tem um segmento ordenado (ConjuntoIds) mais um
+    set com os interessados recentes, fundidos quando o set passa de
+    LIMITE_SEGMENTO ou de 1/8 do segmento, e o contador de interessados. Outros processos acompanham o
+    journal pelo tamanho/inode e leem só os bytes novos. As escritas devem
+    ser feitas com `trava_desejados()`.
+    """
+
+    def __init__(self, path=DESEJADOS_JOURNAL):
+        self.path = path
+        self._lock = threading.Lock()
+        self._limpar()
+
+    def _limpar(self):
+        self._segmentos = {}  # doc_id do desejado -> ConjuntoIds
+        self._recentes = {}   # doc_id do desejado -> set
+        self._totais = {}     # doc_id do desejado -> quantidade de interessados
+        self._linhas = 0
+        self._journal = None  # (inode, bytes já aplicados)
+
+    def _aplicar(self, registro):
+        self._linhas += 1
+        desejado = registro.get('desejado')
+        if registro.get('retirado'):
+            self._segmentos.pop(desejado, None)
+            self._recentes.pop(desejado, None)
+            self._totais.pop(desejado, None)
+            return
+        usuario_id = registro.get('usuario')
+        if isinstance(usuario_id, int) and 0 <= usuario_id < 2 ** 32 and not self._contem(desejado, usuario_id):
+            self._incluir(desejado, usuario_id)
+
+    def _contem(self, desejado, usuario_id):
+        return usuario_id in self._recentes.get(desejado, ()) or usuario_id in self._segmentos.get(desejado, ())
+
+    def _incluir(self, desejado, usuario_id):
+        recentes = self._recentes.setdefault(desejado, set())
+        recentes.add(usuario_id)
+        self._totais[desejado] = self._totais.get(desejado, 0) + 1
+        segmento = self._segmentos.get(desejado) or ConjuntoIds()
+        if len(recentes) >= max(LIMITE_SEGMENTO, len(segmento) // 8):
+            self._segmentos[desejado] = segmento.uniao(recentes)
+            recentes.clear()
+
+    def _sincronizar(self):
+        """
+        Aplica as linhas completas do journal ainda não vistas.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._limpar()
+            return
+
+        inicio = 0
+        if self._journal is not None and self._journal[0] == st.st_ino and st.st_size >= self._journal[1]:
+            inicio = self._journal[1]
+            if st.st_size == inicio:
+                return
+        else:
+            # Journal novo ou reescrito pela compactação: relê desde o início
+            self._limpar()
+
+        with open(self.path, 'rb') as f:
+            f.seek(inicio)
+            bloco = f.read()
+
+        fim = bloco.rfind(b'\n') + 1  # ignora uma última linha incompleta
+        for linha in bloco[:fim].splitlines():
+            try:
+                self._aplicar(json.loads(linha))
+            except (ValueError, TypeError, AttributeError):
+                continue
+        self._journal = (st.st_ino, inicio + fim)
+
+    def _anexar(self, registros):
+        linhas = b''.join(
+            (json.dumps(registro) + '\n').encode('utf-8') for registro in registros
+        )
+        with open(self.path, 'ab') as f:
+            aplicado = self._journal[1] if self._journal else 0
+            if f.tell() != aplicado:
+                # Sobra de uma escrita interrompida: descarta antes de anexar
+                f.truncate(aplicado)
+            f.write(linhas)
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal = (os.fstat(f.fileno()).st_ino, aplicado + len(linhas))
+
+    def registrar(self, desejado, usuario_id):
+        """
+        Inclui o usuário entre os interessados no filme desejado.
+
+        Returns:
+            Tupla (novo, total): se o registro foi gravado agora e o total de
+            interessados no filme
+        """
+        with self._lock:
+            self._sincronizar()
+            if self._contem(desejado, usuario_id):
+                return False, self._totais[desejado]
+            self._anexar([{'desejado': desejado, 'usuario': usuario_id}])
+            self._linhas += 1
+            self._incluir(desejado, usuario_id)
+            return True, self._totais[desejado]
+
+    def registrar_varios(self, registros):
+        """
+        Inclui vários pares (desejado, usuario_id) com um único append.
+        """
+        with self._lock:
+            self._sincronizar()
+            novos = []
+            for desejado, usuario_id in registros:
+                if not self._contem(desejado, usuario_id):
+                    self._incluir(desejado, usuario_id)
+                    novos.append({'desejado': desejado, 'usuario': usuario_id})
+            if novos:
+                try:
+                    self._anexar(novos)
+                except BaseException:
+                    # O journal não mudou: descarta o que foi incluído em memória
+                    self._journal = None
+                    raise
+                self._linhas += len(novos)
+
+    def total(self, desejado):
+        with self._lock:
+            self._sincronizar()
+            return self._totais.get(desejado, 0)
+
+    def usuarios(self, desejado):
+        """
+        Interessados no filme desejado, em ordem crescente.
+        """
+        with self._lock:
+            self._sincronizar()
+            return sorted(self._usuarios(desejado))
+
+    def _usuarios(self, desejado):
+        return [*self._segmentos.get(desejado, ()), *self._recentes.get(desejado, ())]
+
+    def retirar(self, desejados):
+        """
+        Descarta os interessados dos filmes que saíram do monitoramento.
+        Quando o journal passa a ter mais linhas mortas do que registros
+        válidos, ele é reescrito só com os válidos.
+        """
+        with self._lock:
+            self._sincronizar()
+            retirados = [desejado for desejado in desejados if desejado in self._totais]
+            if not retirados:
+                return
+            self._anexar([{'desejado': desejado, 'retirado': True} for desejado in retirados])
+            for desejado in retirados:
+                self._aplicar({'desejado': desejado, 'retirado': True})
+
+            validos = sum(self._totais.values())
+            if self._linhas - validos > max(validos, LIMITE_COMPACTACAO_INTERESSADOS):
+                self._reescrever(list(self._registros()))
+
+    def _registros(self):
+        for desejado in self._totais:
+            for usuario_id in self._usuarios(desejado):
+                yield desejado, usuario_id
+
+    def registros(self):
+        """
+        Todos os pares (desejado, usuario_id) registrados.
+        """
+        with self._lock:
+            self._sincronizar()
+            return list(self._registros())
+
+    def substituir(self, registros):
+        """
+        Troca todos os registros pelos pares (desejado, usuario_id) informados.
+        """
+        with self._lock:
+            self._reescrever(registros)
+
+    def _reescrever(self, registros):
+        temporario = self.path + '.compactando'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            for desejado, usuario_id in registros:
+                f.write(json.dumps({'desejado': desejado, 'usuario': usuario_id}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        # Troca atômica: outros processos veem o inode novo e releem tudo
+        os.replace(temporario, self.path)
+        self._limpar()
+        self._sincronizar()
+
+
+class InteressadosSQLite:
+    """
+    Interessados dos filmes desejados no backend SQLite: uma linha por par
+    (desejado, usuário), com chave primária nos dois (pertinência e inclusão
+    em O(log n)), e o contador de cada filme em `TotaisInteressados`,
+    atualizado na mesma transação.
+    """
+
+    def __init__(self, path=SQLITE_DB):
+        self.path = path
+        self._local = threading.local()
+        self._schema_criado = False
+        self._lock = threading.Lock()
+
+    def _conexao(self):
+        conexao = getattr(self._local, 'conexao', None)
+        if conexao is None or self._local.pid != os.getpid():
+            # Conexões não atravessam threads nem fork
+            conexao = abrir_sqlite(self.path)
+            self._local.conexao = conexao
+            self._local.pid = os.getpid()
+        if not self._schema_criado:
+            with self._lock:
+                if not self._schema_criado:
+                    conexao.execute(
+                        f'CREATE TABLE IF NOT EXISTS "{TABELA_INTERESSADOS}" '
+                        '(desejado INTEGER NOT NULL, usuario INTEGER NOT NULL, '
+                        'PRIMARY KEY (desejado, usuario)) WITHOUT ROWID'
+                    )
+                    conexao.execute(
+                        f'CREATE TABLE IF NOT EXISTS "{TABELA_TOTAIS_INTERESSADOS}" '
+                        '(desejado INTEGER PRIMARY KEY, total INTEGER NOT NULL)'
+                    )
+                    self._schema_criado = True
+        return conexao
+
+    @contextmanager
+    def _transacao(self):
+        conexao = self._conexao()
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            yield conexao
+            conexao.execute('COMMIT')
+        except BaseException:
+            conexao.execute('ROLLBACK')
+            raise
+
+    def registrar(self, desejado, usuario_id):
+        with self._transacao() as conexao:
+            novo = conexao.execute(
+                f'INSERT OR IGNORE INTO "{TABELA_INTERESSADOS}" (desejado, usuario) VALUES (?, ?)',
+                (desejado, usuario_id)
+            ).rowcount == 1
+            if novo:
+                conexao.execute(
+                    f'INSERT INTO "{TABELA_TOTAIS_INTERESSADOS}" (desejado, total) VALUES (?, 1) '
+                    'ON CONFLICT (desejado) DO UPDATE SET total = total + 1',
+                    (desejado,)
+                )
+            total = conexao.execute(
+                f'SELECT total FROM "{TABELA_TOTAIS_INTERESSADOS}" WHERE desejado = ?', (desejado,)
+            ).fetchone()[0]
+        return novo, total
+
+    def registrar_varios(self, registros):
+        with self._transacao() as conexao:
+            conexao.executemany(
+                f'INSERT OR IGNORE INTO "{TABELA_INTERESSADOS}" (desejado, usuario) VALUES (?, ?)', registros
+            )
+            self._recontar(conexao)
+
+    def _recontar(self, conexao):
+        conexao.execute(f'DELETE FROM "{TABELA_TOTAIS_INTERESSADOS}"')
+        conexao.execute(
+            f'INSERT INTO "{TABELA_TOTAIS_INTERESSADOS}" (desejado, total) '
+            f'SELECT desejado, COUNT(*) FROM "{TABELA_INTERESSADOS}" GROUP BY desejado'
+        )
+
+    def total(self, desejado):
+        linha = self._conexao().execute(
+            f'SELECT total FROM "{TABELA_TOTAIS_INTERESSADOS}" WHERE desejado = ?', (desejado,)
+        ).fetchone()
+        return linha[0] if linha else 0
+
+    def usuarios(self, desejado):
+        cursor = self._conexao().execute(
+            f'SELECT usuario FROM "{TABELA_INTERESSADOS}" WHERE desejado = ? ORDER BY usuario', (desejado,)
+        )
+        return [usuario_id for usuario_id, in cursor]
+
+    def retirar(self, desejados):
+        desejados = [(desejado,) for desejado in desejados]
+        with self._transacao() as conexao:
+            conexao.executemany(f'DELETE FROM "{TABELA_INTERESSADOS}" WHERE desejado = ?', desejados)
+            conexao.executemany(f'DELETE FROM "{TABELA_TOTAIS_INTERESSADOS}" WHERE desejado = ?', desejados)
+
+    def registros(self):
+        return self._conexao().execute(
+            f'SELECT desejado, usuario FROM "{TABELA_INTERESSADOS}" ORDER BY desejado, usuario'
+        ).fetchall()
+
+    def substituir(self, registros):
+        with self._transacao() as conexao:
+            conexao.execute(f'DELETE FROM "{TABELA_INTERESSADOS}"')
+            conexao.executemany(
+                f'INSERT OR IGNORE INTO "{TABELA_INTERESSADOS}" (desejado, usuario) VALUES (?, ?)', registros
+            )
+            self._recontar(conexao)
+
+
+class Desejados(SnapshotTabela):
+    """
+    Fotografia em memória da tabela `FilmesDesejados`, indexada pelo nome
+    normalizado do filme (sem acentos/caixa). Os interessados não ficam nos
+    documentos: são registros à parte (InteressadosJournal/InteressadosSQLite).
+    """
+
+    def _criar_indices(self):
+        self.por_nome = IndiceHash()
+        # doc_ids com os campos antigos, ainda não migrados para os registros
+        self.legados = set()
+
+    def _copiar_indices(self):
+        self.por_nome = self.por_nome.copiar()
+        self.legados = set(self.legados)
+
+    def _indexar(self, doc_id, doc):
+        self.por_nome.adicionar(doc_id, normaliza_nome(doc.get('nome')))
+        if any(campo in doc for campo in CAMPOS_LEGADOS):
+            self.legados.add(doc_id)
+
+    def _desindexar(self, doc_id, doc):
+        self.por_nome.remover(doc_id, normaliza_nome(doc.get('nome')))
+        self.legados.discard(doc_id)
+
+    def desejados_por_nome(self, nome):
+        """
+        Retorna todos os documentos com o nome normalizado informado.
+        """
+        return [self.documentos[doc_id] for doc_id in self.por_nome.todos(normaliza_nome(nome))]
+
+    def desejado_por_nome(self, nome):
+        """
+        Retorna o documento (com `doc_id`) do filme desejado ou None.
+        """
+        doc_id = self.por_nome.primeiro(normaliza_nome(nome))
+        return self.documentos[doc_id] if doc_id is not None else None
+
+
+def tabela_desejados(backend=None):
+    """
+    Tabela de filmes desejados no backend configurado.
+    """
+    return criar_tabela(DESEJADOS_JSON, TABELA_DESEJADOS, COLUNAS_DESEJADOS, backend)
+
+
+def criar_interessados(backend=None):
+    """
+    Registros de interessados no backend configurado.
+    """
+    backend = backend or BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f'Backend inválido: {backend}. Use um de: {", ".join(BACKENDS)}')
+    if backend == 'sqlite':
+        return InteressadosSQLite()
+    return InteressadosJournal()
+
+
+_tabela_desejados = tabela_desejados()
+_interessados = criar_interessados()
+
+_lock_desejados = threading.Lock()
+_desejados_compartilhados = SnapshotCompartilhado(_tabela_desejados, Desejados)
+
+
+def migrar_interessados_legados(tabela, interessados, documentos):
+    """
+    Passa para os registros (desejado, usuário) os interessados que os
+    documentos antigos guardavam na lista `usuarios_interessados` e regrava
+    esses documentos sem os campos antigos, numa única escrita. Os registros
+    são gravados antes: se a escrita dos documentos falhar, a próxima
+    migração os inclui de novo sem duplicar.
+
+    Returns:
+        Dict doc_id -> documento regravado (vazio se nada foi migrado)
+    """
+    antigos = {
+        doc_id: doc for doc_id, doc in documentos.items()
+        if any(campo in doc for campo in CAMPOS_LEGADOS)
+    }
+    if not antigos:
+        return {}
+
+    interessados.registrar_varios(
+        (doc_id, usuario_id) for doc_id, doc in antigos.items() for usuario_id in interessados_legados(doc)
+    )
+    migrados = {
+        doc_id: {campo: valor for campo, valor in doc.items() if campo not in CAMPOS_LEGADOS}
+        for doc_id, doc in antigos.items()
+    }
+    tabela.gravar(migrados)
+    return migrados
+
+
+def _migrar_snapshot_legado():
+    """
+    Migra os documentos antigos que o snapshot atual ainda tiver. Chamada
+    dentro de `trava_desejados()`, antes de qualquer leitura dos interessados.
+    """
+    desejados = obter_desejados()
+    if not desejados.legados:
+        return
+    assinatura = _desejados_compartilhados.assinatura_fonte()
+    migrados = migrar_interessados_legados(
+        _tabela_desejados, _interessados, {doc_id: desejados.documentos[doc_id] for doc_id in desejados.legados}
+    )
+    registrar_alteracoes_desejados(migrados, assinatura_anterior=assinatura)
+
+
+@contextmanager
+def trava_desejados():
+    """
+    Serializa o ler-modificar-gravar dos filmes desejados (cadastro de
+    interessados e retirada dos filmes que chegaram ao catálogo) entre as
+    threads e entre os processos. Quem a segura deve ler o snapshot
+    (`obter_desejados`) depois de obtê-la.
+
+    Ao obtê-la, documentos antigos com `usuarios_interessados` (ex.: um
+    filmesDesejados.json anterior aos registros, em quem nunca passou por
+    `migracao.preparar_armazenamento`) são migrados antes de qualquer uso:
+    nenhum interessado antigo fica de fora de contagens e notificações.
+    """
+    with _lock_desejados, _tabela_desejados.travar_escrita():
+        _migrar_snapshot_legado()
+        yield
+
+
+def obter_desejados():
+    """
+    Retorna o snapshot de filmes desejados compartilhado pelo processo.
+    """
+    return _desejados_compartilhados.obter()
+
+
+def registrar_alteracoes_desejados(alterados=None, removidos=(), assinatura_anterior=None):
+    """
+    Propaga para o snapshot compartilhado as alterações que o processo
+    acabou de gravar nos filmes desejados. `assinatura_anterior` é a
+    assinatura da tabela lida antes da escrita (sem ela o snapshot é relido).
+    """
+    _desejados_compartilhados.aplicar_alteracoes(alterados, removidos, assinatura_anterior)
+
+
+def inserir_desejado(doc):
+    """
+    Grava um novo filme desejado e o aplica no snapshot. Retorna o doc_id.
+    Deve ser chamada com `trava_desejados()`.
+    """
+    assinatura = _desejados_compartilhados.assinatura_fonte()
+    doc_id = _tabela_desejados.inserir(doc)
+    registrar_alteracoes_desejados({doc_id: doc}, assinatura_anterior=assinatura)
+    if _interessados.total(doc_id):
+        # Sobra de um filme retirado com o mesmo doc_id (queda entre a
+        # remoção do documento e a dos interessados)
+        _interessados.retirar([doc_id])
+    return doc_id
+
+
+def registrar_interessado(doc_id, usuario_id):
+    """
+    Inclui o usuário entre os interessados no filme desejado `doc_id`
+    gravando só o registro (desejado, usuário). Deve ser chamada com
+    `trava_desejados()`.
+
+    Returns:
+        Total de interessados no filme depois do cadastro
+    """
+    _, total = _interessados.registrar(doc_id, usuario_id)
+    return total
+
+
+def _legados_pendentes(doc_id):
+    # Fora de `trava_desejados()` o documento pode ainda não ter sido migrado
+    desejados = obter_desejados()
+    return interessados_legados(desejados.documentos[doc_id]) if doc_id in desejados.legados else []
+
+
+def total_interessados(doc_id):
+    """
+    Quantidade de interessados no filme desejado, pelo contador mantido.
+    """
+    if _legados_pendentes(doc_id):
+        return len(usuarios_interessados(doc_id))
+    return _interessados.total(doc_id)
+
+
+def usuarios_interessados(doc_id):
+    """
+    Interessados no filme desejado `doc_id`, em ordem crescente.
+    """
+    legados = _legados_pendentes(doc_id)
+    usuarios = _interessados.usuarios(doc_id)
+    return sorted(set(usuarios).union(legados)) if legados else usuarios
+
+
+def retirar_desejados(nomes):
+    """
+    Junta os nomes de filmes que chegaram ao catálogo com os filmes desejados
+    pelo índice de nome normalizado (uma consulta por nome) e remove do
+    monitoramento, numa única escrita, os que foram encontrados, junto com
+    os registros de interessados.
+    Deve ser chamada com `trava_desejados()`.
+
+    Returns:
+        Dict nome normalizado -> (documentos retirados, interessados em
+        ordem crescente)
+    """
+    desejados = obter_desejados()
+    retirados = {}
+    for nome in nomes:
+        chave = normaliza_nome(nome)
+        if chave and chave not in retirados:
+            documentos = desejados.desejados_por_nome(chave)
+            if documentos:
+                interessados = set()
+                for doc in documentos:
+                    interessados.update(usuarios_interessados(doc.doc_id))
+                retirados[chave] = documentos, sorted(interessados)
+
+    doc_ids = [doc.doc_id for documentos, _ in retirados.values() for doc in documentos]
+    if doc_ids:
+        assinatura = _desejados_compartilhados.assinatura_fonte()
+        _tabela_desejados.remover(doc_ids)
+        registrar_alteracoes_desejados(removidos=doc_ids, assinatura_anterior=assinatura)
+        _interessados.retirar(doc_ids)
+    return retirados
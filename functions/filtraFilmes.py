@@ -0,0 +1,120 @@
+from catalogo import obter_catalogo
+from resposta import resposta_lambda
+
+# Tamanho padrão e máximo da página de resultados
+LIMITE_PADRAO_FILTRO = 50
+MAX_LIMITE_FILTRO = 500
+
+# Filtros numéricos aceitos: nome do parâmetro -> argumento de Facetas.filtrar
+FILTROS_NUMERICOS = ('ano_de', 'ano_ate', 'duracao_de', 'duracao_ate')
+
+
+def filtraFilmes(filtros):
+    """
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para filtraFilmesDados.
+    """
+    return resposta_lambda(*filtraFilmesDados(filtros))
+
+
+def _erro(mensagem):
+    return {
+        'sucesso': False,
+        'mensagem': mensagem,
+        'dados': None
+    }, 400
+
+
+def _lista(valor):
+    """
+    Aceita lista ou string separada por vírgulas.
+    """
+    if valor is None:
+        return []
+    if isinstance(valor, str):
+        valor = valor.split(',')
+    return [item.strip() for item in valor if isinstance(item, str) and item.strip()]
+
+
+def filtraFilmesDados(filtros):
+    """
+    Filtra o catálogo por facetas usando os índices invertidos do snapshot
+    (sem varrer o catálogo) e devolve as contagens de cada faceta entre os
+    filmes encontrados.
+
+    filtros aceitos (todos opcionais; facetas diferentes se combinam com E,
+    vários valores na mesma faceta com OU):
+    {
+        "generos": ["Ficção Científica"] ou "Ficção Científica,Suspense",
+        "diretor": ["Clara Menezes"] ou "Clara Menezes",
+        "ano": 2023, "ano_de": 2020, "ano_ate": 2024,
+        "duracao_de": 90, "duracao_ate": 130,
+        "limite": 50, "inicio": 0
+    }
+
+    Returns:
+        Tupla (corpo, statusCode) com os filmes (ordenados por nome), o total
+        e as facetas
+    """
+    try:
+        filtros = filtros or {}
+        numericos = {}
+        for nome in FILTROS_NUMERICOS + ('ano', 'limite', 'inicio'):
+            valor = filtros.get(nome)
+            if valor is None or valor == '':
+                continue
+            try:
+                numericos[nome] = int(valor)
+            except (TypeError, ValueError):
+                return _erro(f'Parâmetro "{nome}" deve ser um número inteiro')
+
+        if 'ano' in numericos:
+            numericos['ano_de'] = numericos['ano_ate'] = numericos.pop('ano')
+
+        limite = numericos.pop('limite', LIMITE_PADRAO_FILTRO)
+        inicio = numericos.pop('inicio', 0)
+        if limite < 1 or limite > MAX_LIMITE_FILTRO:
+            return _erro(f'Parâmetro "limite" deve estar entre 1 e {MAX_LIMITE_FILTRO}')
+        if inicio < 0:
+            return _erro('Parâmetro "inicio" não pode ser negativo')
+
+        catalogo = obter_catalogo()
+        facetas = catalogo.facetas()
+        doc_ids = facetas.filtrar(
+            generos=_lista(filtros.get('generos')),
+            diretores=_lista(filtros.get('diretor')),
+            **numericos
+        )
+
+        filmes = [catalogo.documentos[doc_id] for doc_id in doc_ids]
+        filmes.sort(key=lambda filme: (filme.get('nome') or '', filme.get('id') or 0))
+
+        return {
+            'sucesso': True,
+            'mensagem': f'{len(filmes)} filme(s) encontrado(s)',
+            'dados': {
+                'filmes': filmes[inicio:inicio + limite],
+                'total': len(filmes),
+                'limite': limite,
+                'inicio': inicio,
+                'facetas': facetas.contagens(doc_ids)
+            }
+        }, 200
+
+    except Exception as e:
+        return {
+            'sucesso': False,
+            'mensagem': f'Erro ao filtrar filmes: {str(e)}',
+            'dados': None
+        }, 500
+
+
+# Teste local rápido
+if __name__ == '__main__':
+    print("=== Ficção Científica, 2020-2024, até 130 min ===")
+    print(filtraFilmes({
+        'generos': 'Ficção Científica',
+        'ano_de': 2020,
+        'ano_ate': 2024,
+        'duracao_ate': 130
+    })['body'])
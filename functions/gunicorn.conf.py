@@ -0,0 +1,38 @@
+# Modo de produção (pre-fork), a partir de functions/:
+#   gunicorn -c gunicorn.conf.py
+#
+# O processo pai importa a aplicação e carrega o catálogo, os índices de
+# busca e os demais snapshots uma única vez (preload_app + aquecer_dados);
+# depois cria os workers com fork, que herdam essas páginas de memória
+# copy-on-write em vez de cada um reler e reindexar os arquivos.
+import gc
+import multiprocessing
+import os
+
+# `app.app` é criada pela fábrica no primeiro acesso: uma vez, no processo
+# pai (preload_app)
+wsgi_app = 'app:app'
+preload_app = True
+
+bind = os.environ.get('MOVIEFINDER_BIND', '0.0.0.0:5000')
+# Um worker por núcleo: o trabalho de CPU (busca aproximada, serialização)
+# não é paralelizado entre threads de um mesmo processo
+workers = int(os.environ.get('MOVIEFINDER_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('MOVIEFINDER_THREADS', '1'))
+timeout = int(os.environ.get('MOVIEFINDER_TIMEOUT_WORKER', '30'))
+accesslog = '-'
+
+
+def when_ready(server):
+    """
+    Roda no processo pai depois do preload e antes do primeiro fork.
+    """
+    from app import aquecer_dados
+
+    aquecer_dados()
+    # Tira os objetos já carregados das varreduras do coletor de lixo: sem
+    # isso, cada coleta num worker escreveria nos cabeçalhos desses objetos
+    # e copiaria as páginas compartilhadas
+    gc.collect()
+    gc.freeze()
+    server.log.info('Catálogo e índices carregados antes do fork')
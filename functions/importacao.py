@@ -0,0 +1,200 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+from catalogo import consolidar_catalogo
+from cadastraFilmesCatalogo import ingerirFilmes, valida_filme_catalogo
+
+FORMATOS_IMPORTACAO = ('jsonl', 'csv')
+
+# Filmes gravados por escrita no catálogo
+TAMANHO_LOTE_IMPORTACAO = 1000
+
+# Quantidade de erros de linha guardados no resumo
+MAX_ERROS_RELATADOS = 20
+
+# Colunas do CSV que vão para `detalhes` (o resto fica na raiz do filme)
+COLUNAS_DETALHES = ('ano', 'diretor', 'generos', 'duracao_min')
+
+
+def _inteiro(valor):
+    valor = (valor or '').strip()
+    return int(valor) if valor else None
+
+
+def ler_jsonl(path):
+    """
+    Gera (linha, filme) para cada linha não vazia de um arquivo JSONL, sem
+    carregar o arquivo inteiro. Linhas que não são um objeto JSON geram
+    (linha, ValueError).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for linha, texto in enumerate(f, start=1):
+            if not texto.strip():
+                continue
+            try:
+                filme = json.loads(texto)
+            except json.JSONDecodeError as exc:
+                yield linha, ValueError(f'JSON inválido: {exc.msg}')
+                continue
+            if not isinstance(filme, dict):
+                yield linha, ValueError('A linha não é um objeto JSON')
+                continue
+            yield linha, filme
+
+
+def _filme_csv(registro):
+    """
+    Converte uma linha do CSV no documento do catálogo.
+
+    Colunas: id, nome, descricao, ano, diretor, generos (separados por "|"),
+    duracao_min e streamings (lista em JSON). Colunas ausentes ou vazias
+    ficam de fora.
+    """
+    filme = {}
+    detalhes = {}
+    for coluna, valor in registro.items():
+        if coluna is None or valor is None or valor == '':
+            continue
+        if coluna in ('id', 'ano', 'duracao_min'):
+            valor = _inteiro(valor)
+        elif coluna == 'generos':
+            valor = [genero.strip() for genero in valor.split('|') if genero.strip()]
+        elif coluna == 'streamings':
+            valor = json.loads(valor)
+        (detalhes if coluna in COLUNAS_DETALHES else filme)[coluna] = valor
+    if detalhes:
+        filme['detalhes'] = detalhes
+    return filme
+
+
+def ler_csv(path):
+    """
+    Gera (linha, filme) para cada linha de um CSV com cabeçalho, sem carregar
+    o arquivo inteiro. Linhas com valores inválidos geram (linha, ValueError).
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        leitor = csv.DictReader(f)
+        for registro in leitor:
+            try:
+                yield leitor.line_num, _filme_csv(registro)
+            except (ValueError, json.JSONDecodeError) as exc:
+                yield leitor.line_num, ValueError(f'Valor inválido: {exc}')
+
+
+def _gravar_lote(filmes, resumo):
+    gravados, eventos = ingerirFilmes(filmes)
+    inseridos = sum(1 for _, _, novo in gravados if novo)
+    resumo['inseridos'] += inseridos
+    resumo['atualizados'] += len(gravados) - inseridos
+    resumo['notificacoes'] += len(eventos)
+    resumo['escritas'] += 1
+
+
+def _atualizar_vazao(resumo, inicio):
+    resumo['segundos'] = round(time.perf_counter() - inicio, 3)
+    resumo['filmes_por_segundo'] = round(resumo['lidos'] / resumo['segundos'], 1) if resumo['segundos'] else 0.0
+
+
+def importar_catalogo(path, formato=None, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, progresso=None):
+    """
+    Importa um dump do catálogo (JSONL ou CSV) lendo o arquivo em streaming
+    e validando em lotes de `tamanho_lote` filmes. Cada escrita é um upsert
+    por `id`, com os índices de busca do snapshot atualizados
+    incrementalmente e os filmes desejados que chegaram notificados e
+    retirados (como em cadastraFilmesCatalogo).
+
+    Cada lote é gravado assim que é lido, e só um lote fica em memória. No
+    TinyDB os lotes são anexados ao journal do catálogo (filmes.journal) em
+    vez de regravar o filmes.json a cada escrita; o journal é incorporado ao
+    filmes.json no fim.
+
+    Args:
+        path: Caminho do arquivo
+        formato: "jsonl" ou "csv" (padrão: pela extensão do arquivo)
+        tamanho_lote: Filmes por lote (e por escrita)
+        progresso: Função chamada com o resumo parcial após cada lote
+
+    Returns:
+        Dicionário com o resumo da importação (lidos, inseridos, atualizados,
+        erros, notificações, segundos e filmes por segundo)
+    """
+    formato = formato or os.path.splitext(path)[1].lstrip('.').lower()
+    if formato not in FORMATOS_IMPORTACAO:
+        raise ValueError(f'Formato inválido: {formato}. Use um de: {", ".join(FORMATOS_IMPORTACAO)}')
+    if tamanho_lote < 1:
+        raise ValueError('O tamanho do lote deve ser positivo')
+
+    registros = ler_jsonl(path) if formato == 'jsonl' else ler_csv(path)
+    resumo = {
+        'arquivo': path,
+        'lidos': 0,
+        'inseridos': 0,
+        'atualizados': 0,
+        'erros': 0,
+        'notificacoes': 0,
+        'lotes': 0,
+        'escritas': 0,
+        'segundos': 0.0,
+        'filmes_por_segundo': 0.0,
+        'primeiros_erros': []
+    }
+    inicio = time.perf_counter()
+
+    while True:
+        lote = list(islice(registros, tamanho_lote))
+        if not lote:
+            break
+
+        filmes = []
+        for linha, filme in lote:
+            if isinstance(filme, Exception):
+                erro = str(filme)
+            else:
+                erro = valida_filme_catalogo(filme)
+                erro = erro and f'Filme {erro}'
+            if erro:
+                resumo['erros'] += 1
+                if len(resumo['primeiros_erros']) < MAX_ERROS_RELATADOS:
+                    resumo['primeiros_erros'].append({'linha': linha, 'erro': erro})
+            else:
+                filmes.append(filme)
+
+        if filmes:
+            _gravar_lote(filmes, resumo)
+
+        resumo['lidos'] += len(lote)
+        resumo['lotes'] += 1
+        _atualizar_vazao(resumo, inicio)
+        if progresso:
+            progresso(dict(resumo))
+
+    consolidar_catalogo()
+    _atualizar_vazao(resumo, inicio)
+    return resumo
+
+
+def _imprime_progresso(resumo):
+    print(
+        f'{resumo["lidos"]} lidos | {resumo["inseridos"]} inseridos | '
+        f'{resumo["atualizados"]} atualizados | {resumo["erros"]} erros | '
+        f'{resumo["filmes_por_segundo"]} filmes/s',
+        file=sys.stderr
+    )
+
+
+# Execução via linha de comando:
+#   python importacao.py catalogo.jsonl
+#   python importacao.py catalogo.csv --lote 5000
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Importa um dump do catálogo (JSONL ou CSV) em lotes.')
+    parser.add_argument('arquivo')
+    parser.add_argument('--formato', choices=FORMATOS_IMPORTACAO, help='padrão: pela extensão do arquivo')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_IMPORTACAO, help='filmes por escrita')
+    args = parser.parse_args()
+
+    resumo = importar_catalogo(args.arquivo, args.formato, args.lote, progresso=_imprime_progresso)
+    print(json.dumps(resumo, ensure_ascii=False, indent=2))
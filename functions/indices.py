@@ -0,0 +1,306 @@
+import heapq
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+# Casas decimais da similaridade exibida na busca aproximada. O ranking
+# ordena pelo valor exibido, então os empates seguem a ordem do catálogo.
+CASAS_SIMILARIDADE = 2
+
+
+def normaliza_nome(texto):
+    """
+    Normaliza um nome para comparação: sem acentos, minúsculas, sem espaços
+    nas pontas e com espaços internos colapsados.
+    Ex.: "A Última  Canção do Vento " -> "a ultima cancao do vento"
+    """
+    if not isinstance(texto, str):
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto.casefold())
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.split())
+
+
+def trigramas(texto):
+    """
+    Retorna o conjunto de trigramas de caracteres do texto já normalizado.
+    O texto recebe dois espaços no início e um no fim (como no pg_trgm),
+    para que nomes curtos e inícios de palavra também gerem trigramas.
+    """
+    if not texto:
+        return set()
+    texto = f'  {texto} '
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def texto_comparavel(texto):
+    """
+    Texto como a busca aproximada o compara: minúsculas e sem espaços nas
+    pontas (mantém acentos, ao contrário de normaliza_nome).
+    """
+    return texto.lower().strip() if isinstance(texto, str) else ''
+
+
+def pares_caracteres(texto):
+    """
+    Pares (caractere, n-ésima ocorrência) do texto.
+    Ex.: "ana" -> ("a", 1), ("n", 1), ("a", 2)
+    """
+    vistos = {}
+    pares = []
+    for caractere in texto:
+        ocorrencia = vistos[caractere] = vistos.get(caractere, 0) + 1
+        pares.append((caractere, ocorrencia))
+    return tuple(pares)
+
+
+class IndiceHash:
+    """
+    Multimapa valor -> tupla de chaves (na ordem de inserção), para buscas
+    exatas com um único acesso ao dicionário. As tuplas são imutáveis, então
+    copiar o índice é só copiar o dicionário.
+    """
+
+    def __init__(self):
+        self._mapa = {}
+
+    def __len__(self):
+        return len(self._mapa)
+
+    def copiar(self):
+        copia = IndiceHash()
+        copia._mapa = dict(self._mapa)
+        return copia
+
+    def adicionar(self, chave, valor):
+        if valor is None or valor == '':
+            return
+        try:
+            self._mapa[valor] = self._mapa.get(valor, ()) + (chave,)
+        except TypeError:
+            # Valores não hasháveis não são indexados
+            return
+
+    def remover(self, chave, valor):
+        if valor is None or valor == '':
+            return
+        restantes = tuple(k for k in self.todos(valor) if k != chave)
+        if restantes:
+            self._mapa[valor] = restantes
+        else:
+            self._mapa.pop(valor, None)
+
+    def primeiro(self, valor):
+        """
+        Retorna a primeira chave associada ao valor ou None.
+        """
+        chaves = self.todos(valor)
+        return chaves[0] if chaves else None
+
+    def todos(self, valor):
+        """
+        Retorna todas as chaves associadas ao valor (tupla possivelmente vazia).
+        """
+        if valor is None:
+            return ()
+        try:
+            return self._mapa.get(valor, ())
+        except TypeError:
+            # Valor não hashável (ex.: lista enviada no payload) nunca casa
+            return ()
+
+
+class IndiceCaracteres:
+    """
+    Índice invertido (caractere, ocorrência) -> chaves dos documentos, sobre
+    o texto que a busca aproximada compara com o SequenceMatcher.
+    Um título com três letras "a" aparece nas postings ("a", 1), ("a", 2) e
+    ("a", 3); somar as postings dos pares da busca dá quantos caracteres os
+    dois textos têm em comum, que é exatamente o `quick_ratio()` e portanto
+    um limite superior de `ratio()`. Descartar títulos por esse limite nunca
+    perde um resultado.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._pares_por_chave = {}
+        # Pares cujos conjuntos pertencem a esta instância (podem ser
+        # alterados in-place); os demais são compartilhados com cópias.
+        self._proprios = set()
+
+    def __len__(self):
+        return len(self._pares_por_chave)
+
+    def copiar(self):
+        """
+        Cópia rasa com copy-on-write: os conjuntos de postings só são
+        duplicados quando alguma das duas instâncias os altera.
+        """
+        copia = IndiceCaracteres()
+        copia._postings = dict(self._postings)
+        copia._pares_por_chave = dict(self._pares_por_chave)
+        self._proprios = set()
+        return copia
+
+    def _postings_para_escrita(self, par):
+        if par not in self._proprios:
+            self._postings[par] = set(self._postings.get(par, ()))
+            self._proprios.add(par)
+        return self._postings[par]
+
+    def adicionar(self, chave, texto):
+        self.remover(chave)
+        if not texto:
+            return
+        pares = pares_caracteres(texto)
+        self._pares_por_chave[chave] = len(texto), pares
+        postings, proprios = self._postings, self._proprios
+        for par in pares:
+            if par in proprios:
+                postings[par].add(chave)
+            else:
+                self._postings_para_escrita(par).add(chave)
+
+    def remover(self, chave):
+        _, pares = self._pares_por_chave.pop(chave, (0, ()))
+        for par in pares:
+            postings = self._postings_para_escrita(par)
+            postings.discard(chave)
+            if not postings:
+                del self._postings[par]
+                self._proprios.discard(par)
+
+    def limites_superiores(self, texto, minimo):
+        """
+        Gera pares (limite, chave) do maior para o menor limite, só para as
+        chaves cujo limite supera `minimo`. O limite é calculado como o
+        `SequenceMatcher(None, texto, titulo).quick_ratio()`.
+        """
+        if not texto:
+            return
+        contagem = Counter()
+        for par in pares_caracteres(texto):
+            postings = self._postings.get(par)
+            if postings:
+                contagem.update(postings)
+
+        tamanho = len(texto)
+        heap = []
+        for chave, comuns in contagem.items():
+            limite = 2.0 * comuns / (tamanho + self._pares_por_chave[chave][0])
+            if limite > minimo:
+                heap.append((-limite, chave))
+        # Heap em vez de ordenar tudo: quem consome costuma parar cedo
+        heapq.heapify(heap)
+        while heap:
+            limite, chave = heapq.heappop(heap)
+            yield -limite, chave
+
+
+class ConjuntoIds:
+    """
+    Conjunto imutável de ids inteiros (0 <= id < 2**32) guardado como um
+    array('I') ordenado: 4 bytes por id e pertinência por busca binária
+    (O(log n)). Serve de segmento consolidado para conjuntos grandes, que
+    recebem inclusões num set à parte e são fundidos com `uniao` em lote.
+    """
+
+    __slots__ = ('_ids',)
+
+    def __init__(self, ids=()):
+        self._ids = array('I', sorted({self._valida(i) for i in ids}))
+
+    @staticmethod
+    def _valida(valor):
+        if isinstance(valor, bool) or not isinstance(valor, int) or not 0 <= valor < 2 ** 32:
+            raise ValueError(f'Id inválido para o conjunto: {valor!r}')
+        return valor
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __contains__(self, valor):
+        if isinstance(valor, bool) or not isinstance(valor, int):
+            return False
+        posicao = bisect_left(self._ids, valor)
+        return posicao < len(self._ids) and self._ids[posicao] == valor
+
+    def uniao(self, outro):
+        # Só os ids novos são validados: os do array já passaram por _valida
+        novos = {self._valida(i) for i in outro}.difference(self._ids)
+        if not novos:
+            return self
+        conjunto = ConjuntoIds.__new__(ConjuntoIds)
+        conjunto._ids = array('I', sorted(novos.union(self._ids)))
+        return conjunto
+
+
+class ArvoreIntervalos:
+    """
+    Árvore de intervalos centrada, estática: cada nó guarda os intervalos que
+    contêm o seu centro ordenados pelo início e pelo fim, e os que ficam
+    inteiramente à esquerda/direita descem para os filhos. Uma consulta por
+    ponto custa O(log n + k).
+
+    Intervalos são tuplas (inicio, fim, valor), fechados nas duas pontas.
+    """
+
+    __slots__ = ('_raiz', '_tamanho')
+
+    def __init__(self, intervalos):
+        intervalos = [intervalo for intervalo in intervalos if intervalo[0] <= intervalo[1]]
+        self._tamanho = len(intervalos)
+        self._raiz = self._construir(intervalos)
+
+    def __len__(self):
+        return self._tamanho
+
+    @classmethod
+    def _construir(cls, intervalos):
+        if not intervalos:
+            return None
+        pontas = sorted(ponta for intervalo in intervalos for ponta in intervalo[:2])
+        centro = pontas[len(pontas) // 2]
+        esquerda, meio, direita = [], [], []
+        for intervalo in intervalos:
+            if intervalo[1] < centro:
+                esquerda.append(intervalo)
+            elif intervalo[0] > centro:
+                direita.append(intervalo)
+            else:
+                meio.append(intervalo)
+        # O centro é a ponta de algum intervalo, então `meio` nunca fica vazio
+        return (
+            centro,
+            sorted(meio, key=lambda intervalo: intervalo[0]),
+            sorted(meio, key=lambda intervalo: intervalo[1], reverse=True),
+            cls._construir(esquerda),
+            cls._construir(direita)
+        )
+
+    def contendo(self, ponto):
+        """
+        Gera os intervalos que contêm `ponto`.
+        """
+        no = self._raiz
+        while no is not None:
+            centro, por_inicio, por_fim, esquerda, direita = no
+            if ponto < centro:
+                for intervalo in por_inicio:
+                    if intervalo[0] > ponto:
+                        break
+                    yield intervalo
+                no = esquerda
+            elif ponto > centro:
+                for intervalo in por_fim:
+                    if intervalo[1] < ponto:
+                        break
+                    yield intervalo
+                no = direita
+            else:
+                yield from por_inicio
+                return
@@ -1,155 +1,410 @@
+import base64
+import hashlib
 import json
 import os
-from tinydb import TinyDB, Query
+import threading
+from collections import OrderedDict, namedtuple
+from catalogo import obter_catalogo
+from resposta import resposta_lambda
+from usuarios import obter_usuario, versao_lista_usuario
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-USUARIO_JSON = os.path.join(BASE_DIR, 'data', 'filmeUsuario.json')
-CATALOGO_JSON = os.path.join(BASE_DIR, 'data', 'filmes.json')
+# Filtros de status aceitos (o valor gravado e o nome do campo na resposta)
+STATUS_LISTAGEM = {
+    'assistido': 'assistido',
+    'assistidos': 'assistido',
+    'quero assistir': 'quero assistir',
+    'quero_assistir': 'quero assistir',
+}
 
+# Tamanho máximo de página aceito em `limite`
+MAX_LIMITE_PAGINA = 500
 
-def _get_usuario_db():
+# Filmes enriquecidos por vez na resposta em streaming
+LOTE_STREAMING = 100
+
+# Usuários com a listagem completa materializada em memória (LRU)
+MAX_VISOES_USUARIOS = int(os.environ.get('MOVIEFINDER_VISOES_USUARIOS', '1024'))
+
+# Listagem completa já serializada: válida enquanto a lista do usuário
+# (`versao_lista`) e o snapshot do catálogo forem os mesmos
+VisaoCatalogo = namedtuple('VisaoCatalogo', ['versao_lista', 'versao_catalogo', 'etag', 'corpo_json'])
+
+_visoes = OrderedDict()  # usuario_id -> VisaoCatalogo
+_lock_visoes = threading.Lock()
+
+
+def listarCatalogoUsuario(usuario_id, limite=None, cursor=None, status=None):
+    """
+    Adaptador no formato de Lambda (statusCode + body em string JSON)
+    para listarCatalogoUsuarioDados.
+    """
+    return resposta_lambda(*listarCatalogoUsuarioDados(usuario_id, limite, cursor, status))
+
+
+def _chave_ordem(filme):
     """
-    Retorna uma instância do TinyDB para o arquivo de filmes do usuário.
+    Ordem estável da paginação: `adicionado_em`, desempatado por id e nome.
     """
-    db = TinyDB(USUARIO_JSON, ensure_ascii=False, indent=2, encoding='utf-8')
-    db.table('usuarios')
-    return db
+    filme_id = filme.get('id')
+    return (
+        filme.get('adicionado_em') or '',
+        filme_id if isinstance(filme_id, int) else -1,
+        filme.get('nome') or ''
+    )
+
+
+def _codifica_cursor(chave):
+    return base64.urlsafe_b64encode(json.dumps(list(chave)).encode('utf-8')).decode('ascii')
 
 
-def _get_catalogo_db():
+def _decodifica_cursor(cursor):
     """
-    Retorna uma instância do TinyDB para o catálogo de filmes.
+    Converte o cursor opaco devolvido em `proximo_cursor` de volta na chave
+    de ordenação do último filme entregue. Lança ValueError se for inválido.
     """
-    return TinyDB(CATALOGO_JSON, ensure_ascii=False, indent=2, encoding='utf-8')
+    try:
+        adicionado_em, filme_id, nome = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Cursor inválido')
+    if not isinstance(adicionado_em, str) or not isinstance(filme_id, int) or not isinstance(nome, str):
+        raise ValueError('Cursor inválido')
+    return (adicionado_em, filme_id, nome)
+
+
+def _normaliza_status(status):
+    return (status or '').lower().strip()
 
 
-def listarCatalogoUsuario(usuario_id):
+def _filme_completo(filme, filme_catalogo):
+    """
+    Registro da lista do usuário enriquecido com detalhes e streamings do catálogo.
+    """
+    filme_completo = {
+        'id': filme.get('id'),
+        'nome': filme.get('nome'),
+        'descricao': filme.get('descricao'),
+        'status': _normaliza_status(filme.get('status')),
+        'adicionado_em': filme.get('adicionado_em')
+    }
+
+    # Adiciona detalhes do catálogo se encontrado
+    if filme_catalogo:
+        filme_completo['detalhes'] = filme_catalogo.get('detalhes', {})
+        filme_completo['streamings'] = filme_catalogo.get('streamings', [])
+
+    return filme_completo
+
+
+def _enriquecer(filmes):
+    """
+    Junta os filmes com o catálogo de uma vez: todos os ids resolvidos
+    pelo índice por_id numa única passada (sem consulta por filme).
+    """
+    filmes_catalogo = obter_catalogo().filmes_por_ids(
+        filme.get('id') for filme in filmes if filme.get('id') is not None
+    )
+    return [_filme_completo(filme, filmes_catalogo.get(filme.get('id'))) for filme in filmes]
+
+
+def _valida_parametros(usuario_id, limite, cursor, status):
+    """
+    Valida e normaliza os parâmetros da listagem.
+
+    Returns:
+        Tupla (usuario_id, limite, chave_cursor, status, erro), onde erro é
+        None ou a tupla (corpo, statusCode) a devolver.
+    """
+    def invalido(mensagem):
+        return None, None, None, None, ({
+            'sucesso': False,
+            'mensagem': mensagem,
+            'dados': None
+        }, 400)
+
+    # Converte para inteiro se for string
+    if isinstance(usuario_id, str):
+        try:
+            usuario_id = int(usuario_id)
+        except ValueError:
+            return invalido('ID do usuário inválido. Deve ser um número.')
+
+    if usuario_id is None:
+        return invalido('ID do usuário não fornecido')
+
+    if limite is not None:
+        try:
+            limite = int(limite)
+        except (TypeError, ValueError):
+            return invalido('Parâmetro "limite" deve ser um número inteiro')
+        if limite < 1 or limite > MAX_LIMITE_PAGINA:
+            return invalido(f'Parâmetro "limite" deve estar entre 1 e {MAX_LIMITE_PAGINA}')
+
+    chave_cursor = None
+    if cursor:
+        try:
+            chave_cursor = _decodifica_cursor(cursor)
+        except ValueError:
+            return invalido('Parâmetro "cursor" inválido')
+
+    if status is not None:
+        status = STATUS_LISTAGEM.get(_normaliza_status(status))
+        if status is None:
+            return invalido('Status deve ser "assistido" ou "quero assistir"')
+
+    return usuario_id, limite, chave_cursor, status, None
+
+
+def _usuario_nao_encontrado(usuario_id):
+    return {
+        'sucesso': False,
+        'mensagem': f'Usuário com ID "{usuario_id}" não encontrado',
+        'dados': {
+            'usuario_id': usuario_id,
+            'assistidos': [],
+            'quero_assistir': [],
+            'total': 0
+        }
+    }, 404
+
+
+def _filmes_ordenados(filmes_usuario, status=None, chave_cursor=None):
+    """
+    Filmes do usuário na ordem de `adicionado_em` (filtrados por status),
+    a partir do filme seguinte ao cursor.
+    """
+    filmes = [
+        filme for filme in filmes_usuario
+        if status is None or _normaliza_status(filme.get('status')) == status
+    ]
+    filmes.sort(key=_chave_ordem)
+    if chave_cursor is not None:
+        filmes = [filme for filme in filmes if _chave_ordem(filme) > chave_cursor]
+    return filmes
+
+
+def listarCatalogoUsuarioDados(usuario_id, limite=None, cursor=None, status=None):
     """
     Função principal que consulta no banco de dados e lista os filmes do usuário,
     separados por status (assistido ou quero assistir).
-    
+
+    Sem `limite`, `cursor` e `status` a lista inteira é devolvida na ordem em
+    que está gravada. Com qualquer um deles os filmes seguem a ordem estável
+    de `adicionado_em` e a resposta traz `paginacao.proximo_cursor` (None na
+    última página).
+
     Args:
         usuario_id: Integer ou String com o ID do usuário (doc_id do TinyDB)
-    
+        limite: Quantidade máxima de filmes na página (opcional)
+        cursor: `proximo_cursor` da página anterior (opcional)
+        status: "assistido" ou "quero assistir" para filtrar (opcional)
+
     Returns:
-        Dicionário com statusCode e body contendo a lista de filmes separados por status
+        Tupla (corpo, statusCode) com a lista de filmes separados por status
     """
-    
+
     try:
-        # Converte para inteiro se for string
-        if isinstance(usuario_id, str):
-            try:
-                usuario_id = int(usuario_id)
-            except ValueError:
-                return {
-                    'statusCode': 400,
-                    'body': json.dumps({
-                        'sucesso': False,
-                        'mensagem': 'ID do usuário inválido. Deve ser um número.',
-                        'dados': None
-                    }, ensure_ascii=False)
-                }
-        
-        if usuario_id is None:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'sucesso': False,
-                    'mensagem': 'ID do usuário não fornecido',
-                    'dados': None
-                }, ensure_ascii=False)
-            }
-        
-        # Consulta o banco de dados do usuário
-        with _get_usuario_db() as db:
-            usuarios_table = db.table('usuarios')
-            
-            # Busca o usuário pelo doc_id (ID único do TinyDB)
-            usuario_doc = usuarios_table.get(doc_id=usuario_id)
-            
-            if not usuario_doc:
-                return {
-                    'statusCode': 404,
-                    'body': json.dumps({
-                        'sucesso': False,
-                        'mensagem': f'Usuário com ID "{usuario_id}" não encontrado',
-                        'dados': {
-                            'usuario_id': usuario_id,
-                            'assistidos': [],
-                            'quero_assistir': [],
-                            'total': 0
-                        }
-                    }, ensure_ascii=False)
-                }
-            
-            filmes_usuario = usuario_doc.get('filmes', [])
-            
-            # Separa filmes por status
-            filmes_assistidos = []
-            filmes_quero_assistir = []
-            
-            # Consulta o catálogo para enriquecer os dados dos filmes
-            with _get_catalogo_db() as catalogo_db:
-                Filme = Query()
-                
-                for filme in filmes_usuario:
-                    filme_id = filme.get('id')
-                    status = filme.get('status', '').lower().strip()
-                    
-                    # Busca informações completas no catálogo
-                    filme_catalogo = None
-                    if filme_id is not None:
-                        filme_catalogo = catalogo_db.get(Filme.id == filme_id)
-                    
-                    # Prepara o filme com informações do catálogo
-                    filme_completo = {
-                        'id': filme_id,
-                        'nome': filme.get('nome'),
-                        'descricao': filme.get('descricao'),
-                        'status': status,
-                        'adicionado_em': filme.get('adicionado_em')
-                    }
-                    
-                    # Adiciona detalhes do catálogo se encontrado
-                    if filme_catalogo:
-                        filme_completo['detalhes'] = filme_catalogo.get('detalhes', {})
-                        filme_completo['streamings'] = filme_catalogo.get('streamings', [])
-                    
-                    # Separa por status
-                    if status == 'assistido':
-                        filmes_assistidos.append(filme_completo)
-                    elif status == 'quero assistir':
-                        filmes_quero_assistir.append(filme_completo)
-            
-            # Prepara resposta
-            resultado = {
-                'sucesso': True,
-                'mensagem': f'Catálogo do usuário listado com sucesso',
-                'dados': {
-                    'usuario_id': usuario_id,
-                    'usuario': usuario_doc.get('nome'),
-                    'assistidos': filmes_assistidos,
-                    'quero_assistir': filmes_quero_assistir,
-                    'total': len(filmes_usuario),
-                    'total_assistidos': len(filmes_assistidos),
-                    'total_quero_assistir': len(filmes_quero_assistir)
-                }
-            }
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps(resultado, ensure_ascii=False, indent=2)
+        usuario_id, limite, chave_cursor, status, erro = _valida_parametros(usuario_id, limite, cursor, status)
+        if erro:
+            return erro
+
+        # Busca o usuário pelo doc_id (ID único do TinyDB)
+        usuario_doc = obter_usuario(usuario_id)
+
+        if not usuario_doc:
+            return _usuario_nao_encontrado(usuario_id)
+
+        filmes_usuario = usuario_doc.get('filmes', [])
+        paginado = limite is not None or chave_cursor is not None or status is not None
+
+        paginacao = None
+        if paginado:
+            filmes = _filmes_ordenados(filmes_usuario, status, chave_cursor)
+            proximo_cursor = None
+            if limite is not None and len(filmes) > limite:
+                filmes = filmes[:limite]
+                proximo_cursor = _codifica_cursor(_chave_ordem(filmes[-1]))
+            paginacao = {
+                'limite': limite,
+                'cursor': cursor or None,
+                'status': status,
+                'proximo_cursor': proximo_cursor
             }
-    
+        else:
+            filmes = filmes_usuario
+
+        # Separa filmes por status
+        filmes_assistidos = []
+        filmes_quero_assistir = []
+
+        for filme_completo in _enriquecer(filmes):
+            if filme_completo['status'] == 'assistido':
+                filmes_assistidos.append(filme_completo)
+            elif filme_completo['status'] == 'quero assistir':
+                filmes_quero_assistir.append(filme_completo)
+
+        dados = {
+            'usuario_id': usuario_id,
+            'usuario': usuario_doc.get('nome'),
+            'assistidos': filmes_assistidos,
+            'quero_assistir': filmes_quero_assistir,
+            'total': len(filmes_usuario),
+            'total_assistidos': len(filmes_assistidos),
+            'total_quero_assistir': len(filmes_quero_assistir)
+        }
+
+        if paginacao:
+            # Totais da lista inteira, não apenas da página
+            status_usuario = [_normaliza_status(filme.get('status')) for filme in filmes_usuario]
+            dados['total_assistidos'] = status_usuario.count('assistido')
+            dados['total_quero_assistir'] = status_usuario.count('quero assistir')
+            dados['paginacao'] = paginacao
+
+        # Prepara resposta
+        resultado = {
+            'sucesso': True,
+            'mensagem': f'Catálogo do usuário listado com sucesso',
+            'dados': dados
+        }
+
+        return resultado, 200
+
     except Exception as e:
         return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'sucesso': False,
-                'mensagem': f'Erro ao listar catálogo do usuário: {str(e)}',
-                'dados': None
-            }, ensure_ascii=False)
-        }
+            'sucesso': False,
+            'mensagem': f'Erro ao listar catálogo do usuário: {str(e)}',
+            'dados': None
+        }, 500
+
+
+def invalidar_visao_usuario(usuario_id):
+    """
+    Descarta a listagem materializada do usuário (chamada quando a lista
+    dele é gravada neste processo; nos demais, `versao_lista` a invalida).
+    """
+    with _lock_visoes:
+        _visoes.pop(usuario_id, None)
+
+
+def visaoCatalogoUsuario(usuario_id):
+    """
+    Listagem completa do usuário (a mesma de listarCatalogoUsuarioDados sem
+    paginação) materializada: o corpo é montado e serializado uma vez e
+    reaproveitado até a lista do usuário ou o catálogo mudarem. Uma consulta
+    com a visão válida só lê a `versao_lista` do usuário.
+
+    Returns:
+        Tupla (VisaoCatalogo, 200) ou, em caso de erro, (corpo, statusCode)
+        como em listarCatalogoUsuarioDados. O `etag` (sem aspas) é o hash do
+        corpo serializado.
+    """
+    try:
+        usuario_id, _, _, _, erro = _valida_parametros(usuario_id, None, None, None)
+        if erro:
+            return erro
+
+        # Versões lidas antes de montar o corpo: na pior das hipóteses a visão
+        # traz dados mais novos que a chave e é remontada na próxima consulta
+        versao = versao_lista_usuario(usuario_id)
+        if versao is None:
+            return _usuario_nao_encontrado(usuario_id)
+        versao_catalogo = obter_catalogo().versao
+
+        with _lock_visoes:
+            visao = _visoes.get(usuario_id)
+            if visao is not None and (visao.versao_lista, visao.versao_catalogo) == (versao, versao_catalogo):
+                _visoes.move_to_end(usuario_id)
+                return visao, 200
+    except Exception as e:
+        return {
+            'sucesso': False,
+            'mensagem': f'Erro ao listar catálogo do usuário: {str(e)}',
+            'dados': None
+        }, 500
+
+    corpo, status_code = listarCatalogoUsuarioDados(usuario_id)
+    if status_code != 200:
+        return corpo, status_code
+
+    corpo_json = json.dumps(corpo, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.blake2b(corpo_json, digest_size=12).hexdigest()
+    visao = VisaoCatalogo(versao, versao_catalogo, etag, corpo_json)
+
+    if MAX_VISOES_USUARIOS > 0:
+        with _lock_visoes:
+            _visoes[usuario_id] = visao
+            _visoes.move_to_end(usuario_id)
+            while len(_visoes) > MAX_VISOES_USUARIOS:
+                _visoes.popitem(last=False)
+
+    return visao, 200
+
+
+def streamCatalogoUsuario(usuario_id, status=None):
+    """
+    Lista o catálogo inteiro do usuário como um gerador de pedaços de JSON,
+    para respostas em streaming: os filmes são enriquecidos e serializados
+    em lotes de LOTE_STREAMING, sem montar a resposta inteira em memória.
+
+    O documento gerado é o mesmo de listarCatalogoUsuarioDados(usuario_id,
+    status=status): filmes separados em `assistidos` e `quero_assistir`, na
+    ordem gravada (ou na de `adicionado_em`, com `status`), `total` e os
+    totais por status da lista inteira e, com `status`, a `paginacao`.
+
+    Returns:
+        Tupla (gerador, 200) ou, em caso de erro, (corpo, statusCode) como
+        em listarCatalogoUsuarioDados.
+    """
+    try:
+        usuario_id, _, _, status, erro = _valida_parametros(usuario_id, None, None, status)
+        if erro:
+            return erro
+
+        usuario_doc = obter_usuario(usuario_id)
+        if not usuario_doc:
+            return _usuario_nao_encontrado(usuario_id)
+    except Exception as e:
+        return {
+            'sucesso': False,
+            'mensagem': f'Erro ao listar catálogo do usuário: {str(e)}',
+            'dados': None
+        }, 500
+
+    def gerar():
+        def serializa(valor):
+            return json.dumps(valor, ensure_ascii=False, separators=(',', ':'))
+
+        filmes_usuario = usuario_doc.get('filmes', [])
+        filmes = _filmes_ordenados(filmes_usuario, status) if status is not None else filmes_usuario
+        status_usuario = [_normaliza_status(filme.get('status')) for filme in filmes_usuario]
+
+        yield (
+            '{"sucesso":true,"mensagem":"Catálogo do usuário listado com sucesso",'
+            f'"dados":{{"usuario_id":{serializa(usuario_id)},'
+            f'"usuario":{serializa(usuario_doc.get("nome"))}'
+        )
+        for campo, status_grupo in (('assistidos', 'assistido'), ('quero_assistir', 'quero assistir')):
+            grupo = [filme for filme in filmes if _normaliza_status(filme.get('status')) == status_grupo]
+            yield f',"{campo}":['
+            for inicio in range(0, len(grupo), LOTE_STREAMING):
+                pedaco = [serializa(filme) for filme in _enriquecer(grupo[inicio:inicio + LOTE_STREAMING])]
+                yield (',' if inicio else '') + ','.join(pedaco)
+            yield ']'
+
+        final = (
+            f',"total":{len(filmes_usuario)},'
+            f'"total_assistidos":{status_usuario.count("assistido")},'
+            f'"total_quero_assistir":{status_usuario.count("quero assistir")}'
+        )
+        if status is not None:
+            final += ',"paginacao":' + serializa({
+                'limite': None,
+                'cursor': None,
+                'status': status,
+                'proximo_cursor': None
+            })
+        yield final + '}}'
+
+    return gerar(), 200
 
 
 # Exemplo de uso para testes locais
@@ -159,21 +414,43 @@ if __name__ == '__main__':
     resultado1 = listarCatalogoUsuario(1)
     print(resultado1['body'])
     print()
-    
+
     # Teste 2: Usuário não encontrado
     print("=== Teste 2: Usuário não encontrado (ID = 999) ===")
     resultado2 = listarCatalogoUsuario(999)
     print(resultado2['body'])
     print()
-    
+
     # Teste 3: ID inválido
     print("=== Teste 3: ID inválido ===")
     resultado3 = listarCatalogoUsuario("abc")
     print(resultado3['body'])
     print()
-    
+
     # Teste 4: Sem ID
     print("=== Teste 4: Sem ID ===")
     resultado4 = listarCatalogoUsuario(None)
     print(resultado4['body'])
+    print()
+
+    # Teste 5: Primeira página com 2 filmes, depois a seguinte
+    print("=== Teste 5: Paginação (limite = 2) ===")
+    pagina1, _ = listarCatalogoUsuarioDados(1, limite=2)
+    print(json.dumps(pagina1['dados']['paginacao'], ensure_ascii=False, indent=2))
+    proximo = pagina1['dados']['paginacao']['proximo_cursor']
+    if proximo:
+        pagina2, _ = listarCatalogoUsuarioDados(1, limite=2, cursor=proximo)
+        print(json.dumps(pagina2['dados']['paginacao'], ensure_ascii=False, indent=2))
+    print()
+
+    # Teste 6: Streaming
+    print("=== Teste 6: Streaming ===")
+    gerador, _ = streamCatalogoUsuario(1)
+    print(''.join(gerador))
+    print()
 
+    # Teste 7: Visão materializada (a segunda consulta reaproveita o corpo)
+    print("=== Teste 7: Visão materializada ===")
+    visao1, _ = visaoCatalogoUsuario(1)
+    visao2, _ = visaoCatalogoUsuario(1)
+    print(visao1.etag, visao2 is visao1)
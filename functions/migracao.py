@@ -0,0 +1,177 @@
+import json
+import os
+import sys
+from datetime import datetime
+from tinydb import TinyDB
+from armazenamento import BACKEND, BACKENDS, SQLITE_DB
+from catalogoBinario import abrir_catalogo_binario
+from catalogo import (
+    CATALOGO_JSON,
+    TABELA_CATALOGO,
+    TABELA_META,
+    VERSAO_SCHEMA_CATALOGO,
+    tabela_catalogo,
+    versao_schema_catalogo,
+)
+from desejados import criar_interessados, migrar_interessados_legados, tabela_desejados, trava_desejados
+from usuarios import (
+    USUARIO_JOURNAL,
+    USUARIOS_SHARDS_DIR,
+    criar_armazenamento_usuarios,
+)
+
+
+def _ler_json(path):
+    """
+    Lê o arquivo JSON bruto. Retorna None se o arquivo não existir,
+    estiver vazio ou não for um JSON válido.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return None
+
+
+def migrar_catalogo(path=CATALOGO_JSON):
+    """
+    Converte o catálogo para o formato interno do TinyDB e grava o marcador
+    de versão do schema. Deve rodar uma única vez (na inicialização ou via
+    linha de comando); depois disso as requisições confiam no marcador.
+
+    Formatos antigos aceitos: lista simples de filmes ou dict com a chave
+    'filmes'.
+
+    Returns:
+        Tupla (versao_schema, migrou) indicando a versão final e se o
+        arquivo precisou ser reescrito.
+    """
+    raw_data = _ler_json(path)
+
+    if versao_schema_catalogo(raw_data) >= VERSAO_SCHEMA_CATALOGO:
+        return VERSAO_SCHEMA_CATALOGO, False
+
+    filmes = None
+    if isinstance(raw_data, dict) and isinstance(raw_data.get('filmes'), list):
+        filmes = raw_data['filmes']
+    elif isinstance(raw_data, list):
+        filmes = raw_data
+
+    if raw_data is None or filmes is not None:
+        # Arquivo ausente, inválido ou em formato antigo: recria a tabela
+        if os.path.exists(path):
+            os.remove(path)
+
+    with TinyDB(path, ensure_ascii=False, indent=2, encoding='utf-8') as db:
+        if filmes:
+            db.table(TABELA_CATALOGO).insert_multiple(filmes)
+        meta = db.table(TABELA_META)
+        meta.truncate()
+        meta.insert({
+            'versao_schema': VERSAO_SCHEMA_CATALOGO,
+            'migrado_em': datetime.utcnow().isoformat() + 'Z'
+        })
+
+    return VERSAO_SCHEMA_CATALOGO, True
+
+
+def migrar_desejados(backend=None):
+    """
+    Move os interessados que os documentos antigos de `FilmesDesejados`
+    guardavam na lista `usuarios_interessados` para os registros
+    (desejado, usuário) e regrava esses documentos sem a lista, numa única
+    escrita. Documentos já migrados não são tocados, então pode rodar a cada
+    inicialização (no backend configurado a migração também acontece ao
+    obter `trava_desejados()`).
+
+    Returns:
+        Quantidade de filmes desejados migrados
+    """
+    tabela = tabela_desejados(backend)
+    with trava_desejados():
+        migrados = migrar_interessados_legados(tabela, criar_interessados(backend), tabela.documentos())
+    return len(migrados)
+
+
+def migrar_backend(destino, origem=None):
+    """
+    Copia catálogo, listas dos usuários e filmes desejados (com os
+    interessados) de um backend para o outro, preservando os doc_ids. O
+    conteúdo das tabelas de destino é substituído.
+
+    No TinyDB, os usuários são lidos no modo de arquivos configurado
+    (MOVIEFINDER_ARMAZENAMENTO_USUARIOS) e gravados em `filmeUsuario.json`;
+    um journal pendente é descartado e os shards são refeitos a partir
+    desse arquivo na próxima execução do modo 'shards'.
+
+    Returns:
+        Dicionário tabela -> quantidade de documentos copiados
+    """
+    if destino not in BACKENDS:
+        raise ValueError(f'Backend inválido: {destino}. Use um de: {", ".join(BACKENDS)}')
+    origem = origem or next(backend for backend in BACKENDS if backend != destino)
+    if origem == destino:
+        raise ValueError('Backends de origem e destino são iguais')
+
+    if origem == 'tinydb':
+        migrar_catalogo()
+
+    filmes = tabela_catalogo(origem).documentos()
+    usuarios = criar_armazenamento_usuarios(origem).todos()
+    desejados = tabela_desejados(origem).documentos()
+    interessados = criar_interessados(origem).registros()
+
+    tabela_catalogo(destino).substituir(filmes)
+    tabela_desejados(destino).substituir(desejados)
+    criar_interessados(destino).substituir(interessados)
+    if destino == 'tinydb':
+        migrar_catalogo()
+        criar_armazenamento_usuarios(destino, 'tinydb').substituir(usuarios)
+        if os.path.exists(USUARIO_JOURNAL):
+            os.remove(USUARIO_JOURNAL)
+        diretorio_shards = os.path.join(USUARIOS_SHARDS_DIR, 'diretorio.json')
+        if os.path.exists(diretorio_shards):
+            os.remove(diretorio_shards)
+    else:
+        criar_armazenamento_usuarios(destino).substituir(usuarios)
+
+    return {'filmes': len(filmes), 'usuarios': len(usuarios), 'desejados': len(desejados)}
+
+
+def preparar_armazenamento():
+    """
+    Executada na inicialização: consolida o journal do catálogo, migra o
+    catálogo JSON, no backend SQLite
+    importa os dados de data/ na primeira execução (banco ainda inexistente)
+    e passa os interessados de filmes desejados antigos para os registros.
+    """
+    # Lotes deixados no journal do catálogo por uma importação interrompida
+    tabela_catalogo().consolidar()
+    # Um catálogo compilado em dia só é gerado a partir de um JSON já migrado:
+    # nesse caso nem é preciso ler o JSON
+    if BACKEND != 'tinydb' or abrir_catalogo_binario(tabela_catalogo().assinatura()) is None:
+        migrar_catalogo()
+    if BACKEND == 'sqlite' and not os.path.exists(SQLITE_DB):
+        migrar_backend('sqlite', 'tinydb')
+    migrar_desejados()
+
+
+# Execução via linha de comando:
+#   python migracao.py          -> migra o catálogo JSON e os filmes desejados
+#   python migracao.py sqlite   -> copia data/*.json para o SQLite
+#   python migracao.py tinydb   -> copia o SQLite de volta para data/*.json
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        totais = migrar_backend(sys.argv[1])
+        print(f'Dados copiados para o backend {sys.argv[1]}: ' + ', '.join(f'{n} {t}' for t, n in totais.items()))
+    else:
+        versao, migrou = migrar_catalogo()
+        if migrou:
+            print(f'Catálogo migrado para o schema v{versao}: {CATALOGO_JSON}')
+        else:
+            print(f'Catálogo já está no schema v{versao}. Nada a fazer.')
+        migrados = migrar_desejados()
+        if migrados:
+            print(f'{migrados} filmes desejados com interessados migrados para os registros')
@@ -0,0 +1,131 @@
+import os
+import queue
+import threading
+import uuid
+from concurrent.futures import Future, InvalidStateError
+from concurrent.futures import TimeoutError as FuturoTimeoutError
+
+# Tempo máximo (segundos) que quem chama espera pelo resultado do pipeline
+TIMEOUT_PIPELINE = float(os.environ.get('MOVIEFINDER_PIPELINE_TIMEOUT', '10'))
+# Quantidade de workers consumindo cada estágio
+WORKERS_POR_ESTAGIO = int(os.environ.get('MOVIEFINDER_PIPELINE_WORKERS', '4'))
+
+
+class TempoEsgotadoPipeline(Exception):
+    """
+    O resultado da mensagem não ficou pronto dentro do timeout.
+    """
+
+
+class Mensagem:
+    """
+    Mensagem que trafega entre os estágios. Carrega o correlation_id e o
+    futuro de quem a enviou, para que o resultado volte só para ele.
+    """
+
+    __slots__ = ('correlation_id', 'corpo', 'futuro')
+
+    def __init__(self, correlation_id, corpo, futuro):
+        self.correlation_id = correlation_id
+        self.corpo = corpo
+        self.futuro = futuro
+
+
+class Pipeline:
+    """
+    Pipeline de mensagens em processo que simula as filas SQS/SNS.
+
+    Cada estágio (nome_da_fila, função) tem sua própria fila e um pool de
+    workers. A função recebe o corpo da mensagem e devolve o corpo para o
+    próximo estágio; o retorno do último estágio resolve o futuro de quem
+    enviou a mensagem. Requisições concorrentes nunca consomem mensagens
+    umas das outras.
+    """
+
+    def __init__(self, nome, estagios, workers=WORKERS_POR_ESTAGIO):
+        self.nome = nome
+        self.estagios = list(estagios)
+        self.workers = workers
+        self._filas = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Threads não sobrevivem a um fork: o processo filho recria os workers
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    def _apos_fork(self):
+        self._lock = threading.Lock()
+        self._filas = None
+        self._pid = None
+
+    def _iniciar(self):
+        if self._filas is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._filas is not None and self._pid == os.getpid():
+                return
+            filas = [queue.Queue() for _ in self.estagios]
+            for indice, (nome_fila, _) in enumerate(self.estagios):
+                for numero in range(self.workers):
+                    threading.Thread(
+                        target=self._consumir,
+                        args=(filas, indice),
+                        name=f'{self.nome}-{nome_fila}-{numero}',
+                        daemon=True
+                    ).start()
+            self._filas = filas
+            self._pid = os.getpid()
+
+    def _consumir(self, filas, indice):
+        fila = filas[indice]
+        _, funcao = self.estagios[indice]
+        while True:
+            mensagem = fila.get()
+            # Quem enviou desistiu (timeout): não processa o resto do caminho
+            if mensagem.futuro.done():
+                continue
+            try:
+                resultado = funcao(mensagem.corpo)
+            except BaseException as exc:
+                self._resolver(mensagem.futuro, excecao=exc)
+                continue
+
+            if indice + 1 < len(filas):
+                filas[indice + 1].put(Mensagem(mensagem.correlation_id, resultado, mensagem.futuro))
+            else:
+                self._resolver(mensagem.futuro, resultado=resultado)
+
+    @staticmethod
+    def _resolver(futuro, resultado=None, excecao=None):
+        try:
+            if excecao is not None:
+                futuro.set_exception(excecao)
+            else:
+                futuro.set_result(resultado)
+        except InvalidStateError:
+            # Futuro já cancelado por timeout de quem chamou
+            pass
+
+    def enviar(self, corpo, correlation_id=None):
+        """
+        Publica a mensagem no primeiro estágio e devolve o futuro do resultado.
+        """
+        self._iniciar()
+        futuro = Future()
+        futuro.correlation_id = correlation_id or uuid.uuid4().hex
+        self._filas[0].put(Mensagem(futuro.correlation_id, corpo, futuro))
+        return futuro
+
+    def processar(self, corpo, timeout=None, correlation_id=None):
+        """
+        Envia a mensagem e espera apenas pelo próprio resultado.
+        Lança TempoEsgotadoPipeline se o timeout estourar.
+        """
+        futuro = self.enviar(corpo, correlation_id)
+        try:
+            return futuro.result(timeout=TIMEOUT_PIPELINE if timeout is None else timeout)
+        except FuturoTimeoutError:
+            futuro.cancel()
+            raise TempoEsgotadoPipeline(
+                f'Pipeline "{self.nome}" não respondeu a tempo (correlation_id={futuro.correlation_id})'
+            )
@@ -0,0 +1,12 @@
+import json
+
+
+def resposta_lambda(corpo, status_code):
+    """
+    Adapta o resultado (corpo, statusCode) das funções para o formato de
+    resposta de uma Lambda, com o body serializado como string JSON.
+    """
+    return {
+        'statusCode': status_code,
+        'body': json.dumps(corpo, ensure_ascii=False, indent=2)
+    }
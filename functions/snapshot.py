@@ -0,0 +1,152 @@
+import copy
+import threading
+from tinydb.table import Document
+
+# Marca o estado "nunca carregado" (diferente de arquivo inexistente)
+_NAO_CARREGADO = object()
+
+
+class SnapshotTabela:
+    """
+    Fotografia imutável de uma tabela do TinyDB carregada em memória,
+    com índices mantidos pelas subclasses em `_indexar`/`_desindexar`.
+    """
+
+    def __init__(self, documentos, versao):
+        # documentos: doc_id do TinyDB -> Document
+        self.documentos = {
+            doc_id: Document(doc, doc_id=doc_id) for doc_id, doc in documentos.items()
+        }
+        self.versao = versao
+        self._criar_indices()
+        for doc_id, doc in self.documentos.items():
+            self._indexar(doc_id, doc)
+
+    def __len__(self):
+        return len(self.documentos)
+
+    def _criar_indices(self):
+        pass
+
+    def _copiar_indices(self):
+        pass
+
+    def _indexar(self, doc_id, doc):
+        pass
+
+    def _desindexar(self, doc_id, doc):
+        pass
+
+    def com_alteracoes(self, alterados=None, removidos=()):
+        """
+        Retorna uma nova versão da tabela com os documentos alterados
+        (doc_id -> documento) e removidos aplicados, atualizando os índices
+        incrementalmente. A versão atual continua válida para quem a lê.
+        """
+        novo = copy.copy(self)
+        novo.documentos = dict(self.documentos)
+        novo.versao = self.versao + 1
+        novo._copiar_indices()
+        novo.alterar(alterados, removidos)
+        return novo
+
+    def alterar(self, alterados=None, removidos=()):
+        """
+        Aplica as mudanças nesta própria versão, sem copiar documentos nem
+        índices. Só para quem é o único dono do snapshot e serializa as
+        leituras com as escritas (ex.: ArmazenamentoUsuariosJournal).
+        """
+        for doc_id in removidos:
+            antigo = self.documentos.pop(doc_id, None)
+            if antigo is not None:
+                self._desindexar(doc_id, antigo)
+
+        for doc_id, doc in (alterados or {}).items():
+            antigo = self.documentos.get(doc_id)
+            if antigo is not None:
+                self._desindexar(doc_id, antigo)
+            doc = Document(doc, doc_id=doc_id)
+            self.documentos[doc_id] = doc
+            self._indexar(doc_id, doc)
+
+
+class SnapshotCompartilhado:
+    """
+    Mantém um único snapshot por processo para uma tabela do armazenamento
+    (TabelaTinyDB ou TabelaSQLite) e só relê a tabela quando a assinatura
+    dela muda (mtime/tamanho/inode do arquivo ou versão no SQLite).
+    """
+
+    def __init__(self, fonte, classe_snapshot):
+        self.fonte = fonte
+        self.classe_snapshot = classe_snapshot
+        self._lock = threading.Lock()
+        self._assinatura = _NAO_CARREGADO
+        self._snapshot = classe_snapshot({}, 0)
+
+    def _assinatura_arquivo(self):
+        return self.fonte.assinatura()
+
+    def _ler_dados(self, assinatura):
+        return self.fonte.ler_dados(assinatura)
+
+    def _preparar_dados(self, dados, assinatura):
+        """
+        Gancho para subclasses validarem/migrarem o conteúdo lido.
+        Retorna (dados, assinatura) possivelmente atualizados.
+        """
+        return dados, assinatura
+
+    def _carregar(self, assinatura):
+        dados, assinatura = self._preparar_dados(self._ler_dados(assinatura), assinatura)
+
+        documentos = self.fonte.extrair_documentos(dados)
+
+        # Troca a referência de uma vez: leitores concorrentes veem
+        # sempre uma versão completa da tabela.
+        self._snapshot = self.classe_snapshot(documentos, self._snapshot.versao + 1)
+        self._assinatura = assinatura
+
+    def obter(self):
+        """
+        Retorna o snapshot atual, recarregando apenas se o arquivo mudou.
+        """
+        assinatura = self._assinatura_arquivo()
+        if assinatura != self._assinatura:
+            with self._lock:
+                if assinatura != self._assinatura:
+                    self._carregar(assinatura)
+        return self._snapshot
+
+    def assinatura_fonte(self):
+        """
+        Assinatura atual da tabela. Quem vai gravar a lê antes da escrita e
+        a repassa para `aplicar_alteracoes`.
+        """
+        return self._assinatura_arquivo()
+
+    def aplicar_alteracoes(self, alterados=None, removidos=(), assinatura_anterior=_NAO_CARREGADO):
+        """
+        Deve ser chamado por quem acabou de gravar na tabela: aplica as
+        mudanças no snapshot e nos índices sem reler a tabela inteira.
+
+        `assinatura_anterior` é a assinatura lida antes da escrita. Se ela
+        não é a do snapshot, outro processo gravou nesse meio tempo: o
+        snapshot é descartado e relido no próximo `obter()`, em vez de marcar
+        a escrita alheia como já vista.
+        """
+        with self._lock:
+            if self._assinatura is _NAO_CARREGADO:
+                return
+            if assinatura_anterior != self._assinatura:
+                self._assinatura = _NAO_CARREGADO
+                return
+            self._snapshot = self._snapshot.com_alteracoes(alterados, removidos)
+            self._assinatura = self._assinatura_arquivo()
+
+    def invalidar(self):
+        """
+        Força a releitura da tabela no próximo `obter()`.
+        """
+        with self._lock:
+            self._assinatura = _NAO_CARREGADO
@@ -0,0 +1,815 @@
+import copy
+import json
+import os
+import threading
+from contextlib import contextmanager
+from tinydb import TinyDB
+from tinydb.table import Document
+from armazenamento import BACKEND, BACKENDS, TabelaSQLite, TabelaTinyDB, SQLITE_DB, trava_arquivo
+from indices import IndiceHash
+from snapshot import SnapshotCompartilhado, SnapshotTabela
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USUARIO_JSON = os.path.join(BASE_DIR, 'data', 'filmeUsuario.json')
+USUARIO_JOURNAL = os.path.join(BASE_DIR, 'data', 'filmeUsuario.journal')
+USUARIOS_SHARDS_DIR = os.path.join(BASE_DIR, 'data', 'usuarios')
+TABELA_USUARIOS = 'usuarios'
+TABELA_META = 'Meta'
+
+# Como as listas dos usuários são gravadas:
+# - 'tinydb': cada escrita regrava `filmeUsuario.json` inteiro (padrão)
+# - 'journal': cada escrita anexa um registro ao journal; um compactador em
+#   segundo plano consolida o journal em `filmeUsuario.json`
+# - 'shards': usuários divididos por doc_id em N arquivos em `data/usuarios/`,
+#   com um diretório pequeno (doc_id -> nome); cada requisição só toca o
+#   shard do seu usuário
+MODOS_ARMAZENAMENTO_USUARIOS = ('tinydb', 'journal', 'shards')
+MODO_ARMAZENAMENTO_USUARIOS = os.environ.get('MOVIEFINDER_ARMAZENAMENTO_USUARIOS', 'tinydb')
+
+# Quantidade de registros no journal que dispara a compactação
+LIMITE_COMPACTACAO = int(os.environ.get('MOVIEFINDER_JOURNAL_LIMITE', '1000'))
+
+# Quantidade de shards criados na primeira execução do modo 'shards'
+QUANTIDADE_SHARDS = int(os.environ.get('MOVIEFINDER_USUARIOS_SHARDS', '16'))
+
+
+def chave_nome_usuario(nome):
+    """
+    Chave dos índices de nome de usuário: o nome em minúsculas
+    (nomes são comparados sem diferenciar maiúsculas/minúsculas).
+    """
+    return nome.lower() if isinstance(nome, str) else None
+
+
+def versao_lista(doc):
+    """
+    Versão da lista de filmes do usuário: `versao_lista` é incrementada a
+    cada gravação da lista (documentos antigos, sem o campo, estão na 0).
+    """
+    return doc.get('versao_lista') or 0
+
+
+def aplicar_filmes(doc, filmes, versao):
+    """
+    Aplica no próprio documento do usuário os filmes alterados da lista:
+    `filmes` mapeia posição na lista -> registro (posições a partir do fim
+    da lista são acréscimos, em ordem) e `versao` é a nova `versao_lista`.
+    Os registros substituem os da lista; nenhum é alterado no lugar.
+    """
+    lista = doc.get('filmes')
+    if not isinstance(lista, list):
+        lista = doc['filmes'] = []
+    for posicao, registro in sorted(filmes.items()):
+        if posicao < len(lista):
+            lista[posicao] = registro
+        else:
+            lista.append(registro)
+    doc['versao_lista'] = versao
+
+
+# Campos indexados da tabela no backend SQLite (o doc_id já é a chave primária)
+COLUNAS_USUARIOS = {
+    'nome_minusculo': lambda usuario: chave_nome_usuario(usuario.get('nome')),
+}
+
+
+class Usuarios(SnapshotTabela):
+    """
+    Fotografia em memória da tabela `usuarios`.
+
+    Índices mantidos:
+    - por_nome: nome em minúsculas -> doc_ids (multimapa: nomes podem repetir)
+    """
+
+    def _criar_indices(self):
+        self.por_nome = IndiceHash()
+
+    def _copiar_indices(self):
+        self.por_nome = self.por_nome.copiar()
+
+    def _indexar(self, doc_id, doc):
+        self.por_nome.adicionar(doc_id, chave_nome_usuario(doc.get('nome')))
+
+    def _desindexar(self, doc_id, doc):
+        self.por_nome.remover(doc_id, chave_nome_usuario(doc.get('nome')))
+
+    def usuario_por_id(self, doc_id):
+        """
+        Retorna o usuário com o doc_id informado ou None.
+        """
+        return self.documentos.get(doc_id)
+
+    def ids_por_nome(self, nome):
+        """
+        Retorna os doc_ids (em ordem crescente) dos usuários com o nome informado.
+        """
+        return tuple(sorted(self.por_nome.todos(chave_nome_usuario(nome))))
+
+    def usuarios_por_nome(self, nome):
+        """
+        Retorna os usuários cujo nome coincide, ignorando maiúsculas/minúsculas.
+        """
+        return [self.documentos[doc_id] for doc_id in self.ids_por_nome(nome)]
+
+
+def _copia(doc):
+    """
+    Cópia independente do documento (com `doc_id`), para que quem chama
+    possa alterá-la sem tocar no estado compartilhado.
+    """
+    return Document(copy.deepcopy(dict(doc)), doc_id=doc.doc_id) if doc is not None else None
+
+
+class ArmazenamentoUsuariosTinyDB:
+    """
+    Armazenamento padrão: cada escrita regrava `filmeUsuario.json` pelo
+    TinyDB. As leituras vêm de um snapshot em memória (com o índice de
+    nomes), relido só quando o arquivo muda.
+    """
+
+    def __init__(self, path=USUARIO_JSON, path_journal=USUARIO_JOURNAL):
+        self.path = path
+        self.path_journal = path_journal
+        self._journal_verificado = False
+        self._lock = threading.Lock()
+        self._snapshot = SnapshotCompartilhado(TabelaTinyDB(path, TABELA_USUARIOS), Usuarios)
+
+    def _verificar_journal(self):
+        if not self._journal_verificado:
+            # Journal deixado pelo modo 'journal': consolida antes de usar o arquivo
+            if os.path.exists(self.path_journal) and os.path.getsize(self.path_journal):
+                ArmazenamentoUsuariosJournal(self.path, self.path_journal).compactar()
+            self._journal_verificado = True
+
+    def _db(self):
+        self._verificar_journal()
+        db = TinyDB(self.path, ensure_ascii=False, indent=2, encoding='utf-8')
+        db.table(TABELA_USUARIOS)
+        return db
+
+    def _obter(self):
+        self._verificar_journal()
+        return self._snapshot.obter()
+
+    def obter_usuario(self, doc_id):
+        return _copia(self._obter().usuario_por_id(doc_id))
+
+    def ids_por_nome(self, nome):
+        return self._obter().ids_por_nome(nome)
+
+    def buscar_por_nome(self, nome):
+        return [_copia(doc) for doc in self._obter().usuarios_por_nome(nome)]
+
+    def versao_lista(self, doc_id):
+        doc = self._obter().usuario_por_id(doc_id)
+        return versao_lista(doc) if doc is not None else None
+
+    def inserir_usuario(self, doc):
+        with self._lock, trava_arquivo(self.path + '.lock'), self._db() as db:
+            self._snapshot.obter()
+            assinatura = self._snapshot.assinatura_fonte()
+            doc_id = db.table(TABELA_USUARIOS).insert(doc)
+            self._snapshot.aplicar_alteracoes({doc_id: copy.deepcopy(dict(doc))}, assinatura_anterior=assinatura)
+            return doc_id
+
+    def atualizar_usuario(self, doc_id, campos):
+        with self._lock, trava_arquivo(self.path + '.lock'), self._db() as db:
+            atual = self._snapshot.obter().usuario_por_id(doc_id)
+            if atual is None:
+                return
+            assinatura = self._snapshot.assinatura_fonte()
+            db.table(TABELA_USUARIOS).update(campos, doc_ids=[doc_id])
+            doc = copy.deepcopy(dict(atual))
+            doc.update(copy.deepcopy(campos))
+            self._snapshot.aplicar_alteracoes({doc_id: doc}, assinatura_anterior=assinatura)
+
+    def gravar_filmes(self, doc_id, filmes, versao):
+        with self._lock, trava_arquivo(self.path + '.lock'), self._db() as db:
+            atual = self._snapshot.obter().usuario_por_id(doc_id)
+            if atual is None:
+                return
+            assinatura = self._snapshot.assinatura_fonte()
+            filmes = copy.deepcopy(filmes)
+            db.table(TABELA_USUARIOS).update(lambda doc: aplicar_filmes(doc, filmes, versao), doc_ids=[doc_id])
+            # Só a lista muda: os registros que ficam são compartilhados com a versão anterior
+            doc = dict(atual)
+            doc['filmes'] = list(atual.get('filmes') or [])
+            aplicar_filmes(doc, filmes, versao)
+            self._snapshot.aplicar_alteracoes({doc_id: doc}, assinatura_anterior=assinatura)
+
+    def todos(self):
+        return {doc_id: _copia(doc) for doc_id, doc in self._obter().documentos.items()}
+
+    def substituir(self, documentos):
+        with self._db() as db:
+            tabela = db.table(TABELA_USUARIOS)
+            tabela.truncate()
+            tabela.insert_multiple(Document(doc, doc_id=doc_id) for doc_id, doc in documentos.items())
+
+
+class ArmazenamentoUsuariosJournal:
+    """
+    Armazenamento com journal (write-ahead log) só de acréscimo.
+
+    Cada escrita vira uma linha JSON anexada (com fsync) a
+    `filmeUsuario.journal` só com a mudança: `{"seq", "doc_id", "doc"}` ao
+    criar um usuário, `{"seq", "doc_id", "filmes", "versao_lista"}` com os
+    filmes alterados da lista (posição -> registro) e `{"seq", "doc_id",
+    "campos"}` nas demais atualizações. O custo de escrita é o da mudança,
+    não o do documento nem o do arquivo inteiro, e ela é aplicada no próprio
+    snapshot em memória (as leituras copiam os documentos sob a mesma
+    trava). O estado é `filmeUsuario.json`
+    (formato TinyDB, com o último `seq` consolidado na tabela `Meta`) mais o
+    replay do journal. Quando o journal passa de `limite_compactacao`
+    registros, uma thread em segundo plano grava um novo `filmeUsuario.json`
+    e descarta do journal o que já foi consolidado.
+
+    Recuperação após queda: registros com `seq` já consolidado são ignorados
+    no replay e uma última linha incompleta é descartada, então qualquer
+    ponto de interrupção (durante o append ou a compactação) é seguro.
+    Outros processos que usam os mesmos arquivos acompanham o journal pelo
+    tamanho/inode; as escritas são serializadas com `flock` quando disponível.
+    """
+
+    def __init__(self, path=USUARIO_JSON, path_journal=USUARIO_JOURNAL, limite_compactacao=LIMITE_COMPACTACAO):
+        self.path = path
+        self.path_journal = path_journal
+        self.path_lock = path_journal + '.lock'
+        self.limite_compactacao = limite_compactacao
+        self._lock = threading.RLock()
+        self._usuarios = None
+        self._seq = 0
+        self._assinatura_base = None
+        self._journal = None  # (inode, bytes já aplicados)
+        self._registros_journal = 0
+        self._compactando = False
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    def _apos_fork(self):
+        self._lock = threading.RLock()
+        self._compactando = False
+
+    @contextmanager
+    def _travar(self):
+        with self._lock, trava_arquivo(self.path_lock):
+            yield
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st
+
+    def _carregar_base(self):
+        st = self._stat(self.path)
+        dados = None
+        if st is not None and st.st_size:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+        dados = dados or {}
+
+        seq = 0
+        for doc in (dados.get(TABELA_META) or {}).values():
+            if isinstance(doc, dict) and isinstance(doc.get('journal_seq'), int):
+                seq = doc['journal_seq']
+
+        tabela = dados.get(TABELA_USUARIOS) or {}
+        versao = self._usuarios.versao + 1 if self._usuarios is not None else 1
+        self._usuarios = Usuarios({int(doc_id): doc for doc_id, doc in tabela.items()}, versao)
+        self._seq = seq
+        self._assinatura_base = (st.st_mtime_ns, st.st_size, st.st_ino) if st else None
+        self._journal = None
+        self._registros_journal = 0
+
+    def _aplicar_journal(self):
+        """
+        Aplica as linhas completas do journal ainda não vistas.
+        """
+        st = self._stat(self.path_journal)
+        if st is None:
+            self._journal = None
+            return
+
+        inicio = 0
+        if self._journal is not None and self._journal[0] == st.st_ino and st.st_size >= self._journal[1]:
+            inicio = self._journal[1]
+            if st.st_size == inicio:
+                return
+        else:
+            # Journal novo ou reescrito pela compactação: relê desde o início
+            self._registros_journal = 0
+
+        with open(self.path_journal, 'rb') as f:
+            f.seek(inicio)
+            bloco = f.read()
+
+        fim = bloco.rfind(b'\n') + 1  # ignora uma última linha incompleta
+        for linha in bloco[:fim].splitlines():
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                continue
+            self._registros_journal += 1
+            if registro.get('seq', 0) <= self._seq:
+                continue
+            self._seq = registro['seq']
+            self._aplicar_registro(registro)
+        self._journal = (st.st_ino, inicio + fim)
+
+    def _aplicar_registro(self, registro):
+        """
+        Aplica um registro do journal no snapshot, no lugar. Chamada com `_lock`.
+        """
+        doc_id = int(registro['doc_id'])
+        if 'doc' in registro:
+            self._usuarios.alterar({doc_id: registro['doc']})
+            return
+        doc = self._usuarios.usuario_por_id(doc_id)
+        if doc is None:
+            return
+        if 'campos' in registro:
+            # Pode mudar o nome: reindexa o documento
+            self._usuarios.alterar({doc_id: dict(doc, **registro['campos'])})
+        if 'filmes' in registro:
+            filmes = {int(posicao): filme for posicao, filme in registro['filmes'].items()}
+            aplicar_filmes(doc, filmes, registro['versao_lista'])
+
+    def _sincronizar(self):
+        st = self._stat(self.path)
+        assinatura = (st.st_mtime_ns, st.st_size, st.st_ino) if st else None
+        if self._usuarios is None or assinatura != self._assinatura_base:
+            self._carregar_base()
+        self._aplicar_journal()
+
+    def _ler(self, funcao):
+        """
+        Resultado de `funcao(snapshot)`, calculado sob a trava: o snapshot é
+        alterado no lugar, então nada dele pode sair sem ser copiado.
+        """
+        with self._lock:
+            self._sincronizar()
+            return funcao(self._usuarios)
+
+    def _anexar(self, registro):
+        """
+        Grava um registro (sem `seq`) no journal e o aplica em memória.
+        Chamada com a trava.
+        """
+        registro = {'seq': self._seq + 1, **registro}
+        linha = (json.dumps(registro, ensure_ascii=False) + '\n').encode('utf-8')
+
+        with open(self.path_journal, 'ab') as f:
+            aplicado = self._journal[1] if self._journal else 0
+            if f.tell() != aplicado:
+                # Sobra de uma escrita interrompida: descarta antes de anexar
+                f.truncate(aplicado)
+            f.write(linha)
+            f.flush()
+            os.fsync(f.fileno())
+            ino = os.fstat(f.fileno()).st_ino
+
+        self._seq = registro['seq']
+        self._journal = (ino, aplicado + len(linha))
+        self._aplicar_registro(registro)
+        self._registros_journal += 1
+
+        if self._registros_journal >= self.limite_compactacao and not self._compactando:
+            self._compactando = True
+            threading.Thread(target=self._compactar_em_segundo_plano, name='compactaJournal', daemon=True).start()
+
+    def _compactar_em_segundo_plano(self):
+        try:
+            self.compactar()
+        finally:
+            self._compactando = False
+
+    def compactar(self):
+        """
+        Consolida o journal em um novo `filmeUsuario.json`.
+        O arquivo é gravado fora da trava; escritas feitas nesse meio tempo
+        continuam no journal.
+        """
+        with self._travar():
+            self._sincronizar()
+            seq, journal = self._seq, self._journal
+            base = self._assinatura_base
+            if journal is None or journal[1] == 0:
+                return
+            # Serializado sob a trava (o snapshot muda no lugar); sem
+            # indentação o json usa o codificador em C
+            conteudo = json.dumps({
+                TABELA_USUARIOS: {str(doc_id): doc for doc_id, doc in self._usuarios.documentos.items()},
+                TABELA_META: {'1': {'journal_seq': seq}}
+            }, ensure_ascii=False, separators=(',', ':'))
+
+        temporario = self.path + '.compactando'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            f.write(conteudo)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with self._travar():
+            self._sincronizar()
+            if self._assinatura_base != base or self._journal is None or self._journal[0] != journal[0]:
+                # Outro processo compactou enquanto esta fotografia era gravada
+                os.remove(temporario)
+                return
+            os.replace(temporario, self.path)
+
+            # Mantém só o que foi anexado depois da fotografia
+            with open(self.path_journal, 'rb') as f:
+                f.seek(journal[1])
+                restante = f.read(self._journal[1] - journal[1]) if self._journal else b''
+            temporario = self.path_journal + '.compactando'
+            with open(temporario, 'wb') as f:
+                f.write(restante)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporario, self.path_journal)
+
+            self._carregar_base()
+            self._aplicar_journal()
+
+    def obter_usuario(self, doc_id):
+        return self._ler(lambda usuarios: _copia(usuarios.usuario_por_id(doc_id)))
+
+    def ids_por_nome(self, nome):
+        return self._ler(lambda usuarios: usuarios.ids_por_nome(nome))
+
+    def buscar_por_nome(self, nome):
+        return self._ler(lambda usuarios: [_copia(doc) for doc in usuarios.usuarios_por_nome(nome)])
+
+    def versao_lista(self, doc_id):
+        doc = self._ler(lambda usuarios: usuarios.usuario_por_id(doc_id))
+        return versao_lista(doc) if doc is not None else None
+
+    def inserir_usuario(self, doc):
+        with self._travar():
+            self._sincronizar()
+            # Mesmo critério do TinyDB: próximo doc_id após o maior existente
+            doc_id = max(self._usuarios.documentos, default=0) + 1
+            self._anexar({'doc_id': doc_id, 'doc': copy.deepcopy(dict(doc))})
+            return doc_id
+
+    def atualizar_usuario(self, doc_id, campos):
+        with self._travar():
+            self._sincronizar()
+            if self._usuarios.usuario_por_id(doc_id) is None:
+                return
+            self._anexar({'doc_id': doc_id, 'campos': copy.deepcopy(campos)})
+
+    def gravar_filmes(self, doc_id, filmes, versao):
+        with self._travar():
+            self._sincronizar()
+            if self._usuarios.usuario_por_id(doc_id) is None:
+                return
+            self._anexar({'doc_id': doc_id, 'filmes': copy.deepcopy(filmes), 'versao_lista': versao})
+
+    def todos(self):
+        return self._ler(lambda usuarios: {doc_id: _copia(doc) for doc_id, doc in usuarios.documentos.items()})
+
+
+class ArmazenamentoUsuariosShards:
+    """
+    Armazenamento particionado: o usuário com doc_id `d` fica no shard
+    `d % N` (`usuarios-XX.json`, formato TinyDB) e um diretório pequeno
+    (`diretorio.json`: quantidade de shards, próximo doc_id e doc_id -> nome)
+    resolve buscas por nome e a geração de ids.
+
+    Leitura e atualização da lista de um usuário abrem só o shard dele;
+    escritas em shards diferentes usam travas diferentes e correm em
+    paralelo. O diretório só é regravado quando um usuário é criado.
+    Na primeira execução os usuários de `filmeUsuario.json` (e de um
+    journal pendente) são distribuídos entre os shards.
+    """
+
+    def __init__(self, diretorio=USUARIOS_SHARDS_DIR, quantidade=QUANTIDADE_SHARDS,
+                 path_origem=USUARIO_JSON, path_journal=USUARIO_JOURNAL):
+        self.diretorio = diretorio
+        self.path_indice = os.path.join(diretorio, 'diretorio.json')
+        self.quantidade = quantidade
+        self.path_origem = path_origem
+        self.path_journal = path_journal
+        self._lock_indice = threading.Lock()
+        self._locks_shards = None
+        self._indice = None
+        self._assinatura_indice = None
+        self._por_nome = IndiceHash()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._apos_fork)
+
+    def _apos_fork(self):
+        self._lock_indice = threading.Lock()
+        if self._locks_shards is not None:
+            self._locks_shards = [threading.Lock() for _ in self._locks_shards]
+
+    def _path_shard(self, indice):
+        return os.path.join(self.diretorio, f'usuarios-{indice:02d}.json')
+
+    def _db_shard(self, indice):
+        db = TinyDB(self._path_shard(indice), ensure_ascii=False, indent=2, encoding='utf-8')
+        db.table(TABELA_USUARIOS)
+        return db
+
+    @contextmanager
+    def _travar_shard(self, indice, compartilhada=False):
+        with self._locks_shards[indice], trava_arquivo(self._path_shard(indice) + '.lock', compartilhada):
+            yield
+
+    def _gravar_indice(self, indice):
+        temporario = self.path_indice + '.gravando'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(indice, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.path_indice)
+
+    def _migrar(self):
+        """
+        Distribui os usuários do arquivo único entre os shards e grava o diretório.
+        """
+        if os.path.exists(self.path_journal) and os.path.getsize(self.path_journal):
+            ArmazenamentoUsuariosJournal(self.path_origem, self.path_journal).compactar()
+
+        tabela = {}
+        if os.path.exists(self.path_origem) and os.path.getsize(self.path_origem):
+            with open(self.path_origem, 'r', encoding='utf-8') as f:
+                tabela = (json.load(f) or {}).get(TABELA_USUARIOS) or {}
+        documentos = {int(doc_id): doc for doc_id, doc in tabela.items()}
+
+        os.makedirs(self.diretorio, exist_ok=True)
+        por_shard = {}
+        for doc_id, doc in documentos.items():
+            por_shard.setdefault(doc_id % self.quantidade, []).append(Document(doc, doc_id=doc_id))
+        for indice in range(self.quantidade):
+            with self._db_shard(indice) as db:
+                tabela_shard = db.table(TABELA_USUARIOS)
+                tabela_shard.truncate()
+                tabela_shard.insert_multiple(por_shard.get(indice, []))
+
+        self._gravar_indice({
+            'shards': self.quantidade,
+            'proximo_id': max(documentos, default=0) + 1,
+            'usuarios': {str(doc_id): doc.get('nome') for doc_id, doc in documentos.items()}
+        })
+
+    def _obter_indice(self):
+        """
+        Retorna o diretório atual, relendo o arquivo só quando ele muda.
+        """
+        try:
+            st = os.stat(self.path_indice)
+            assinatura = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            assinatura = None
+
+        if assinatura is None or assinatura != self._assinatura_indice:
+            with self._lock_indice:
+                if assinatura is None:
+                    os.makedirs(self.diretorio, exist_ok=True)
+                    with trava_arquivo(self.path_indice + '.lock'):
+                        if not os.path.exists(self.path_indice):
+                            self._migrar()
+                self._recarregar_indice()
+        return self._indice
+
+    def _recarregar_indice(self):
+        st = os.stat(self.path_indice)
+        with open(self.path_indice, 'r', encoding='utf-8') as f:
+            indice = json.load(f)
+
+        por_nome = IndiceHash()
+        for doc_id, nome in indice['usuarios'].items():
+            por_nome.adicionar(int(doc_id), chave_nome_usuario(nome))
+
+        if self._locks_shards is None:
+            self._locks_shards = [threading.Lock() for _ in range(indice['shards'])]
+        self.quantidade = indice['shards']
+        self._por_nome = por_nome
+        self._indice = indice
+        self._assinatura_indice = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def obter_usuario(self, doc_id):
+        if not isinstance(doc_id, int):
+            return None
+        self._obter_indice()
+        indice = doc_id % self.quantidade
+        with self._travar_shard(indice, compartilhada=True), self._db_shard(indice) as db:
+            return db.table(TABELA_USUARIOS).get(doc_id=doc_id)
+
+    def ids_por_nome(self, nome):
+        self._obter_indice()
+        return tuple(sorted(self._por_nome.todos(chave_nome_usuario(nome))))
+
+    def buscar_por_nome(self, nome):
+        usuarios = [self.obter_usuario(doc_id) for doc_id in self.ids_por_nome(nome)]
+        return [usuario for usuario in usuarios if usuario is not None]
+
+    def versao_lista(self, doc_id):
+        doc = self.obter_usuario(doc_id)
+        return versao_lista(doc) if doc is not None else None
+
+    def _registrar_no_indice(self, doc_id, nome):
+        """
+        Reserva/atualiza a entrada do usuário no diretório. Retorna o doc_id.
+        """
+        self._obter_indice()
+        with self._lock_indice, trava_arquivo(self.path_indice + '.lock'):
+            self._recarregar_indice()
+            indice = self._indice
+            if doc_id is None:
+                doc_id = indice['proximo_id']
+                indice['proximo_id'] = doc_id + 1
+            indice['usuarios'][str(doc_id)] = nome
+            self._gravar_indice(indice)
+            self._recarregar_indice()
+        return doc_id
+
+    def inserir_usuario(self, doc):
+        # O diretório é gravado antes do shard: uma queda no meio deixa só
+        # uma entrada sem documento, que as buscas ignoram.
+        doc_id = self._registrar_no_indice(None, doc.get('nome'))
+        indice = doc_id % self.quantidade
+        with self._travar_shard(indice), self._db_shard(indice) as db:
+            db.table(TABELA_USUARIOS).upsert(Document(doc, doc_id=doc_id))
+        return doc_id
+
+    def atualizar_usuario(self, doc_id, campos):
+        self._obter_indice()
+        indice = doc_id % self.quantidade
+        with self._travar_shard(indice), self._db_shard(indice) as db:
+            db.table(TABELA_USUARIOS).update(campos, doc_ids=[doc_id])
+        if 'nome' in campos:
+            self._registrar_no_indice(doc_id, campos['nome'])
+
+    def gravar_filmes(self, doc_id, filmes, versao):
+        self._obter_indice()
+        indice = doc_id % self.quantidade
+        with self._travar_shard(indice), self._db_shard(indice) as db:
+            tabela = db.table(TABELA_USUARIOS)
+            if tabela.contains(doc_id=doc_id):
+                tabela.update(lambda doc: aplicar_filmes(doc, filmes, versao), doc_ids=[doc_id])
+
+    def todos(self):
+        self._obter_indice()
+        usuarios = {}
+        for indice in range(self.quantidade):
+            with self._travar_shard(indice, compartilhada=True), self._db_shard(indice) as db:
+                usuarios.update((doc.doc_id, doc) for doc in db.table(TABELA_USUARIOS).all())
+        return dict(sorted(usuarios.items()))
+
+
+class ArmazenamentoUsuariosSQLite:
+    """
+    Usuários no backend SQLite (MOVIEFINDER_BACKEND=sqlite): busca por id
+    pela chave primária e por nome pelo índice de `nome_minusculo`.
+    """
+
+    def __init__(self, tabela=None):
+        self.tabela = tabela or TabelaSQLite(SQLITE_DB, TABELA_USUARIOS, COLUNAS_USUARIOS)
+
+    def obter_usuario(self, doc_id):
+        return self.tabela.obter(doc_id)
+
+    def ids_por_nome(self, nome):
+        if not isinstance(nome, str):
+            return ()
+        return tuple(self.tabela.ids('nome_minusculo', chave_nome_usuario(nome)))
+
+    def buscar_por_nome(self, nome):
+        if not isinstance(nome, str):
+            return []
+        return self.tabela.buscar('nome_minusculo', chave_nome_usuario(nome))
+
+    def versao_lista(self, doc_id):
+        existe, versao = self.tabela.campo(doc_id, 'versao_lista')
+        return (versao or 0) if existe else None
+
+    def inserir_usuario(self, doc):
+        return self.tabela.inserir(doc)
+
+    def atualizar_usuario(self, doc_id, campos):
+        self.tabela.atualizar(doc_id, campos)
+
+    def gravar_filmes(self, doc_id, filmes, versao):
+        self.tabela.atualizar(doc_id, lambda doc: aplicar_filmes(doc, filmes, versao))
+
+    def todos(self):
+        return self.tabela.documentos()
+
+    def substituir(self, documentos):
+        self.tabela.substituir(documentos)
+
+
+_lock = threading.Lock()
+_armazenamento = None
+
+
+def criar_armazenamento_usuarios(backend=None, modo=None):
+    """
+    Cria o armazenamento de usuários para o backend (MOVIEFINDER_BACKEND) e,
+    no TinyDB, para o modo de arquivos (MOVIEFINDER_ARMAZENAMENTO_USUARIOS).
+    """
+    backend = backend or BACKEND
+    modo = modo or MODO_ARMAZENAMENTO_USUARIOS
+    if backend not in BACKENDS:
+        raise ValueError(f'Backend inválido: {backend}. Use um de: {", ".join(BACKENDS)}')
+    if backend == 'sqlite':
+        return ArmazenamentoUsuariosSQLite()
+    if modo not in MODOS_ARMAZENAMENTO_USUARIOS:
+        raise ValueError(
+            f'Armazenamento de usuários inválido: {modo}. '
+            f'Use um de: {", ".join(MODOS_ARMAZENAMENTO_USUARIOS)}'
+        )
+    if modo == 'journal':
+        return ArmazenamentoUsuariosJournal()
+    if modo == 'shards':
+        return ArmazenamentoUsuariosShards()
+    return ArmazenamentoUsuariosTinyDB()
+
+
+def obter_armazenamento_usuarios():
+    """
+    Retorna o armazenamento de usuários do processo.
+    """
+    global _armazenamento
+    if _armazenamento is None:
+        with _lock:
+            if _armazenamento is None:
+                _armazenamento = criar_armazenamento_usuarios()
+    return _armazenamento
+
+
+def carregar_usuarios():
+    """
+    Carrega o snapshot (ou o diretório de shards) de usuários do processo
+    sem copiar documentos; usado para aquecer o processo antes do fork.
+    """
+    obter_armazenamento_usuarios().ids_por_nome(None)
+
+
+def obter_usuario(doc_id):
+    """
+    Retorna uma cópia do usuário (com `doc_id`) ou None.
+    """
+    if isinstance(doc_id, str) and doc_id.strip().isdigit():
+        doc_id = int(doc_id)
+    return obter_armazenamento_usuarios().obter_usuario(doc_id)
+
+
+def ids_usuarios_por_nome(nome):
+    """
+    Retorna os doc_ids dos usuários com o nome informado (sem diferenciar
+    caixa), em ordem crescente, pelo índice de nomes. Mais de um id indica
+    nome ambíguo.
+    """
+    return obter_armazenamento_usuarios().ids_por_nome(nome)
+
+
+def buscar_usuarios_por_nome(nome):
+    """
+    Retorna cópias dos usuários com o nome informado (sem diferenciar caixa).
+    """
+    return obter_armazenamento_usuarios().buscar_por_nome(nome)
+
+
+def versao_lista_usuario(doc_id):
+    """
+    Retorna a versão da lista de filmes do usuário (sem copiar o documento)
+    ou None se ele não existe.
+    """
+    if isinstance(doc_id, str) and doc_id.strip().isdigit():
+        doc_id = int(doc_id)
+    return obter_armazenamento_usuarios().versao_lista(doc_id)
+
+
+def inserir_usuario(doc):
+    """
+    Cria o usuário e retorna o doc_id gerado.
+    """
+    return obter_armazenamento_usuarios().inserir_usuario(doc)
+
+
+def atualizar_usuario(doc_id, campos):
+    """
+    Atualiza os campos informados do usuário.
+    """
+    obter_armazenamento_usuarios().atualizar_usuario(doc_id, campos)
+
+
+def gravar_filmes_usuario(doc_id, filmes, versao):
+    """
+    Grava só os filmes alterados na lista do usuário (posição na lista ->
+    registro; posições a partir do fim são acréscimos) e a nova
+    `versao_lista`, sem reenviar a lista inteira.
+    """
+    obter_armazenamento_usuarios().gravar_filmes(doc_id, filmes, versao)
+
+
+# Compactação manual do journal: python usuarios.py
+if __name__ == '__main__':
+    ArmazenamentoUsuariosJournal().compactar()
+    print(f'Journal consolidado em {USUARIO_JSON}')
@@ -0,0 +1,20 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Os módulos de functions/ se importam pelo nome (como nas Lambdas)
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'functions')
+sys.path.insert(0, FUNCTIONS_DIR)
+
+
+@pytest.fixture
+def arvore(tmp_path):
+    """
+    Cópia de functions/ com um data/ vazio ao lado: os módulos resolvem
+    data/ a partir do próprio arquivo, então nada toca o data/ do repositório.
+    """
+    shutil.copytree(FUNCTIONS_DIR, tmp_path / 'functions', ignore=shutil.ignore_patterns('__pycache__'))
+    (tmp_path / 'data').mkdir()
+    return tmp_path
@@ -0,0 +1,380 @@
+import json
+import os
+
+import pytest
+
+from armazenamento import TabelaSQLite, TabelaTinyDB
+from catalogo import COLUNAS_CATALOGO, TABELA_CATALOGO, Catalogo
+from desejados import (
+    COLUNAS_DESEJADOS,
+    TABELA_DESEJADOS,
+    Desejados,
+    InteressadosJournal,
+    InteressadosSQLite,
+)
+from indices import normaliza_nome
+from snapshot import SnapshotCompartilhado
+from usuarios import (
+    COLUNAS_USUARIOS,
+    TABELA_USUARIOS,
+    ArmazenamentoUsuariosJournal,
+    ArmazenamentoUsuariosShards,
+    ArmazenamentoUsuariosSQLite,
+    ArmazenamentoUsuariosTinyDB,
+)
+from utilitarios import BACKENDS, chaves_inteiras, executar, gravar_json
+
+
+@pytest.fixture(params=BACKENDS)
+def criar_tabela(request, tmp_path):
+    """
+    Cria tabelas do backend do parâmetro num diretório temporário
+    (TinyDB: um JSON por tabela; SQLite: um banco compartilhado).
+    """
+    def criar(nome, colunas=None):
+        if request.param == 'sqlite':
+            return TabelaSQLite(str(tmp_path / 'moviefinder.sqlite3'), nome, colunas)
+        return TabelaTinyDB(str(tmp_path / f'{nome}.json'), nome, colunas)
+    return criar
+
+
+@pytest.fixture(params=BACKENDS)
+def armazenamento_usuarios(request, tmp_path):
+    if request.param == 'sqlite':
+        return ArmazenamentoUsuariosSQLite(
+            TabelaSQLite(str(tmp_path / 'moviefinder.sqlite3'), TABELA_USUARIOS, COLUNAS_USUARIOS)
+        )
+    return ArmazenamentoUsuariosTinyDB(str(tmp_path / 'filmeUsuario.json'), str(tmp_path / 'filmeUsuario.journal'))
+
+
+@pytest.fixture(params=BACKENDS)
+def interessados(request, tmp_path):
+    if request.param == 'sqlite':
+        return InteressadosSQLite(str(tmp_path / 'moviefinder.sqlite3'))
+    return InteressadosJournal(str(tmp_path / 'filmesDesejados.journal'))
+
+
+# Catálogo
+
+def test_catalogo_upsert_e_busca_por_id_e_nome(criar_tabela):
+    tabela = criar_tabela(TABELA_CATALOGO, COLUNAS_CATALOGO)
+    assert tabela.inserir({'id': 1, 'nome': 'Cidade de Deus'}) == 1
+    assert tabela.inserir({'id': 2, 'nome': 'Central do Brasil'}) == 2
+
+    # Upsert: substitui o doc_id 1 e cria o 5 de uma vez
+    tabela.gravar({
+        1: {'id': 1, 'nome': 'Cidade de Deus', 'ano': 2002},
+        5: {'id': 7, 'nome': 'Ação Direta'},
+    })
+
+    assert tabela.obter(1) == {'id': 1, 'nome': 'Cidade de Deus', 'ano': 2002}
+    assert tabela.obter(1).doc_id == 1
+    assert tabela.ids('id', 7) == [5]
+    assert tabela.ids('id', 99) == []
+    assert [doc.doc_id for doc in tabela.buscar('nome_normalizado', normaliza_nome('  ACAO  direta'))] == [5]
+    assert tabela.campo(1, 'ano') == (True, 2002)
+    assert tabela.campo(3, 'ano') == (False, None)
+    assert sorted(tabela.documentos()) == [1, 2, 5]
+    # O próximo doc_id continua depois do maior existente
+    assert tabela.inserir({'id': 8, 'nome': 'Bacurau'}) == 6
+
+
+def test_catalogo_snapshot_acompanha_as_escritas(criar_tabela):
+    tabela = criar_tabela(TABELA_CATALOGO, COLUNAS_CATALOGO)
+    tabela.gravar({1: {'id': 10, 'nome': 'O Auto da Compadecida'}})
+    compartilhado = SnapshotCompartilhado(tabela, Catalogo)
+
+    catalogo = compartilhado.obter()
+    assert catalogo.filme_por_id(10)['nome'] == 'O Auto da Compadecida'
+    assert catalogo.filme_por_nome('o auto da compadecida').doc_id == 1
+
+    assinatura = compartilhado.assinatura_fonte()
+    alterados = {1: {'id': 10, 'nome': 'Auto da Compadecida'}, 2: {'id': 11, 'nome': 'Tropa de Elite'}}
+    tabela.gravar(alterados)
+    compartilhado.aplicar_alteracoes(alterados, assinatura_anterior=assinatura)
+
+    atualizado = compartilhado.obter()
+    assert atualizado.filme_por_nome('o auto da compadecida') is None
+    assert atualizado.filme_por_nome('AUTO DA COMPADECIDA').doc_id == 1
+    assert atualizado.filme_por_id(11).doc_id == 2
+    assert atualizado.maior_doc_id == 2 and atualizado.maior_id == 11
+    # O snapshot anterior não muda
+    assert catalogo.filme_por_id(11) is None
+
+
+def test_catalogo_journal_do_tinydb(tmp_path):
+    path = str(tmp_path / 'filmes.json')
+    tabela = TabelaTinyDB(path, TABELA_CATALOGO, COLUNAS_CATALOGO, journal=True)
+    tabela.gravar({1: {'id': 10, 'nome': 'Bacurau'}})
+    tabela.gravar({1: {'id': 10, 'nome': 'Bacurau', 'ano': 2019}, 2: {'id': 11, 'nome': 'Aquarius'}})
+
+    # Os lotes vão para o journal; o JSON só muda ao consolidar
+    assert not os.path.exists(path)
+    assert tabela.journal_pendente(tabela.assinatura())
+    assert tabela.documentos() == {1: {'id': 10, 'nome': 'Bacurau', 'ano': 2019}, 2: {'id': 11, 'nome': 'Aquarius'}}
+    assert tabela.ids('id', 11) == [2]
+
+    # Uma linha incompleta (escrita interrompida) é ignorada e descartada
+    with open(str(tmp_path / 'filmes.journal'), 'ab') as f:
+        f.write(b'{"doc_id": 3, "doc": {"id"')
+    assert sorted(tabela.documentos()) == [1, 2]
+    tabela.gravar({3: {'id': 12, 'nome': 'Carandiru'}})
+    assert sorted(tabela.documentos()) == [1, 2, 3]
+
+    # Escritas que não são anexáveis consolidam o journal antes
+    assert tabela.inserir({'id': 13, 'nome': 'Tatuagem'}) == 4
+    assert not os.path.exists(str(tmp_path / 'filmes.journal'))
+    assert not tabela.journal_pendente(tabela.assinatura())
+    assert TabelaTinyDB(path, TABELA_CATALOGO).documentos()[1]['ano'] == 2019
+
+
+# Listas dos usuários
+
+def test_usuarios_por_doc_id_e_nome(armazenamento_usuarios):
+    armazenamento = armazenamento_usuarios
+    ana = armazenamento.inserir_usuario({'nome': 'Ana', 'filmes': []})
+    bruno = armazenamento.inserir_usuario({'nome': 'Bruno', 'filmes': [1]})
+    outra_ana = armazenamento.inserir_usuario({'nome': 'ANA', 'filmes': [2]})
+    assert (ana, bruno, outra_ana) == (1, 2, 3)
+
+    assert armazenamento.obter_usuario(bruno) == {'nome': 'Bruno', 'filmes': [1]}
+    assert armazenamento.obter_usuario(99) is None
+    # Nomes são comparados sem diferenciar maiúsculas/minúsculas e podem repetir
+    assert tuple(armazenamento.ids_por_nome('ana')) == (ana, outra_ana)
+    assert [doc.doc_id for doc in armazenamento.buscar_por_nome('Ana')] == [ana, outra_ana]
+    assert tuple(armazenamento.ids_por_nome('Carla')) == ()
+
+    assert armazenamento.versao_lista(ana) == 0
+    armazenamento.atualizar_usuario(ana, {'filmes': [3, 4], 'versao_lista': 1})
+    assert armazenamento.obter_usuario(ana) == {'nome': 'Ana', 'filmes': [3, 4], 'versao_lista': 1}
+    assert armazenamento.versao_lista(ana) == 1
+    assert armazenamento.versao_lista(99) is None
+    # Atualizar um usuário inexistente não cria documento
+    armazenamento.atualizar_usuario(99, {'filmes': [1]})
+    assert sorted(armazenamento.todos()) == [ana, bruno, outra_ana]
+
+
+def test_usuarios_substituir_preserva_doc_ids(armazenamento_usuarios):
+    armazenamento = armazenamento_usuarios
+    armazenamento.inserir_usuario({'nome': 'Ana', 'filmes': []})
+    armazenamento.substituir({4: {'nome': 'Dora', 'filmes': [1]}, 9: {'nome': 'Eli', 'filmes': []}})
+
+    todos = armazenamento.todos()
+    assert sorted(todos) == [4, 9]
+    assert todos[4] == {'nome': 'Dora', 'filmes': [1]}
+    assert tuple(armazenamento.ids_por_nome('eli')) == (9,)
+    assert armazenamento.inserir_usuario({'nome': 'Fabi', 'filmes': []}) == 10
+
+
+@pytest.mark.parametrize('modo', ('tinydb', 'journal', 'shards', 'sqlite'))
+def test_usuarios_gravar_filmes_alterados(tmp_path, modo):
+    if modo == 'sqlite':
+        armazenamento = ArmazenamentoUsuariosSQLite(
+            TabelaSQLite(str(tmp_path / 'moviefinder.sqlite3'), TABELA_USUARIOS, COLUNAS_USUARIOS)
+        )
+    elif modo == 'journal':
+        armazenamento = ArmazenamentoUsuariosJournal(str(tmp_path / 'filmeUsuario.json'), str(tmp_path / 'filmeUsuario.journal'))
+    elif modo == 'shards':
+        armazenamento = ArmazenamentoUsuariosShards(
+            str(tmp_path / 'usuarios'), 4, str(tmp_path / 'filmeUsuario.json'), str(tmp_path / 'filmeUsuario.journal')
+        )
+    else:
+        armazenamento = ArmazenamentoUsuariosTinyDB(str(tmp_path / 'filmeUsuario.json'), str(tmp_path / 'filmeUsuario.journal'))
+
+    ana = armazenamento.inserir_usuario({'nome': 'Ana', 'filmes': [{'id': 1, 'status': 'quero assistir'}], 'versao_lista': 1})
+    antes = armazenamento.obter_usuario(ana)
+
+    # Substitui a posição 0 e acrescenta duas no fim
+    armazenamento.gravar_filmes(ana, {0: {'id': 1, 'status': 'assistido'}, 2: {'id': 3}, 1: {'id': 2}}, 2)
+    assert armazenamento.obter_usuario(ana) == {
+        'nome': 'Ana',
+        'filmes': [{'id': 1, 'status': 'assistido'}, {'id': 2}, {'id': 3}],
+        'versao_lista': 2
+    }
+    assert armazenamento.versao_lista(ana) == 2
+    # Cópias já entregues não mudam
+    assert antes['filmes'] == [{'id': 1, 'status': 'quero assistir'}]
+    # Usuário inexistente: nada é gravado
+    armazenamento.gravar_filmes(99, {0: {'id': 1}}, 1)
+    assert armazenamento.obter_usuario(99) is None
+
+
+def test_journal_de_usuarios_registra_so_a_mudanca(tmp_path):
+    path, path_journal = str(tmp_path / 'filmeUsuario.json'), str(tmp_path / 'filmeUsuario.journal')
+    armazenamento = ArmazenamentoUsuariosJournal(path, path_journal)
+    filmes = [{'id': i, 'nome': f'Filme {i}', 'status': 'assistido'} for i in range(50)]
+    ana = armazenamento.inserir_usuario({'nome': 'Ana', 'filmes': filmes, 'versao_lista': 1})
+    armazenamento.gravar_filmes(ana, {50: {'id': 50, 'nome': 'Filme 50', 'status': 'quero assistir'}}, 2)
+    armazenamento.atualizar_usuario(ana, {'nome': 'Ana Maria'})
+
+    with open(path_journal, encoding='utf-8') as f:
+        registros = [json.loads(linha) for linha in f]
+    assert registros[1] == {
+        'seq': 2, 'doc_id': ana,
+        'filmes': {'50': {'id': 50, 'nome': 'Filme 50', 'status': 'quero assistir'}}, 'versao_lista': 2
+    }
+    assert registros[2] == {'seq': 3, 'doc_id': ana, 'campos': {'nome': 'Ana Maria'}}
+
+    # Outro processo (nova instância) reconstrói o mesmo estado pelo replay
+    outro = ArmazenamentoUsuariosJournal(path, path_journal)
+    assert outro.ids_por_nome('ana maria') == (ana,) and outro.ids_por_nome('ana') == ()
+    assert outro.obter_usuario(ana) == armazenamento.obter_usuario(ana)
+    assert len(outro.obter_usuario(ana)['filmes']) == 51
+
+    outro.compactar()
+    assert os.path.getsize(path_journal) == 0
+    assert ArmazenamentoUsuariosJournal(path, path_journal).obter_usuario(ana)['versao_lista'] == 2
+
+
+# Filmes desejados
+
+def test_desejados_inserir_atualizar_remover(criar_tabela):
+    tabela = criar_tabela(TABELA_DESEJADOS, COLUNAS_DESEJADOS)
+    compartilhado = SnapshotCompartilhado(tabela, Desejados)
+
+    matrix = tabela.inserir({'nome': 'Matrix 5', 'cadastrado_em': '2025-11-27T23:16:15Z'})
+    duna = tabela.inserir({'nome': 'Duna 3', 'cadastrado_em': '2025-11-28T00:00:00Z'})
+    assert tabela.ids('nome_normalizado', normaliza_nome('MATRIX 5')) == [matrix]
+    assert compartilhado.obter().desejado_por_nome('matrix 5').doc_id == matrix
+
+    tabela.atualizar(duna, {'nome': 'Duna: Parte 3'})
+    assert tabela.obter(duna) == {'nome': 'Duna: Parte 3', 'cadastrado_em': '2025-11-28T00:00:00Z'}
+    assert tabela.ids('nome_normalizado', normaliza_nome('Duna 3')) == []
+    desejados = compartilhado.obter()
+    assert desejados.desejado_por_nome('Duna 3') is None
+    assert desejados.desejado_por_nome('duna: parte 3').doc_id == duna
+
+    tabela.remover([matrix])
+    assert tabela.obter(matrix) is None
+    assert sorted(tabela.documentos()) == [duna]
+    assert compartilhado.obter().desejados_por_nome('Matrix 5') == []
+
+
+def test_interessados_registro_contador_e_retirada(interessados):
+    assert interessados.registrar(1, 10) == (True, 1)
+    assert interessados.registrar(1, 30) == (True, 2)
+    # Usuário repetido: nada é gravado e o contador não muda
+    assert interessados.registrar(1, 10) == (False, 2)
+    interessados.registrar_varios([(1, 20), (2, 10), (2, 10)])
+
+    assert interessados.total(1) == 3
+    assert interessados.total(2) == 1
+    assert interessados.total(3) == 0
+    assert interessados.usuarios(1) == [10, 20, 30]
+
+    interessados.retirar([1, 3])
+    assert interessados.total(1) == 0
+    assert interessados.usuarios(1) == []
+    assert [tuple(registro) for registro in interessados.registros()] == [(2, 10)]
+
+    interessados.substituir([(5, 1), (5, 2)])
+    assert interessados.total(2) == 0
+    assert interessados.total(5) == 2
+
+
+def test_journal_de_interessados_compartilhado_e_compactado(tmp_path, monkeypatch):
+    import desejados
+
+    monkeypatch.setattr(desejados, 'LIMITE_COMPACTACAO_INTERESSADOS', 2)
+    monkeypatch.setattr(desejados, 'LIMITE_SEGMENTO', 2)
+    path = str(tmp_path / 'filmesDesejados.journal')
+    escritor, leitor = InteressadosJournal(path), InteressadosJournal(path)
+
+    for usuario_id in range(6):
+        escritor.registrar(1, usuario_id)
+    escritor.registrar(2, 7)
+    # Outra instância (outro processo) lê só as linhas novas do journal
+    assert leitor.total(1) == 6
+    assert leitor.registrar(1, 3) == (False, 6)
+
+    escritor.retirar([1])
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(linha) for linha in f] == [{'desejado': 2, 'usuario': 7}]
+    assert leitor.total(1) == 0
+    assert leitor.registrar(2, 8) == (True, 2)
+    assert escritor.usuarios(2) == [7, 8]
+
+
+# Migração entre backends (numa cópia de functions/, com data/ própria)
+
+SCRIPT_MIGRACAO = '''
+import json
+from migracao import migrar_backend, preparar_armazenamento
+from catalogo import tabela_catalogo
+from desejados import criar_interessados, tabela_desejados
+from usuarios import criar_armazenamento_usuarios
+
+def dados(backend):
+    return {
+        'filmes': tabela_catalogo(backend).documentos(),
+        'usuarios': criar_armazenamento_usuarios(backend, 'tinydb').todos(),
+        'desejados': tabela_desejados(backend).documentos(),
+        'interessados': [list(registro) for registro in criar_interessados(backend).registros()],
+    }
+
+preparar_armazenamento()
+migrados = dados('tinydb')
+migrar_backend('sqlite', 'tinydb')
+no_sqlite = dados('sqlite')
+for nome in ('filmes.json', 'filmeUsuario.json', 'filmesDesejados.json', 'filmesDesejados.journal'):
+    open('../data/' + nome, 'w').close()
+migrar_backend('tinydb', 'sqlite')
+print(json.dumps([migrados, no_sqlite, dados('tinydb')]))
+'''
+
+
+def test_migracao_ida_e_volta_preserva_doc_ids(arvore):
+    filmes = {'3': {'id': 30, 'nome': 'Bacurau'}, '8': {'id': 80, 'nome': 'Ação Direta', 'ano': 2020}}
+    usuarios = {'2': {'nome': 'Ana', 'filmes': [30]}, '5': {'nome': 'Bruno', 'filmes': [], 'versao_lista': 4}}
+    desejados = {
+        '4': {'nome': 'Matrix 5', 'usuarios_interessados': [2, 5], 'cadastrado_em': '2025-11-27T23:16:15Z'},
+        '9': {'nome': 'Duna 3', 'cadastrado_em': '2025-11-28T00:00:00Z'},
+    }
+    gravar_json(arvore / 'data' / 'filmes.json', {'Filmes': filmes})
+    gravar_json(arvore / 'data' / 'filmeUsuario.json', {'usuarios': usuarios})
+    gravar_json(arvore / 'data' / 'filmesDesejados.json', {'FilmesDesejados': desejados})
+
+    migrados, no_sqlite, de_volta = executar(arvore, SCRIPT_MIGRACAO)
+
+    # A lista antiga de interessados vira registros (desejado, usuário)
+    desejados_migrados = chaves_inteiras(desejados)
+    del desejados_migrados[4]['usuarios_interessados']
+    esperado = {
+        'filmes': chaves_inteiras(filmes),
+        'usuarios': chaves_inteiras(usuarios),
+        'desejados': desejados_migrados,
+        'interessados': [[4, 2], [4, 5]],
+    }
+    for dados in (migrados, no_sqlite, de_volta):
+        assert {tabela: chaves_inteiras(docs) if isinstance(docs, dict) else docs
+                for tabela, docs in dados.items()} == esperado
+
+
+SCRIPT_DESEJOS_ANTIGOS = '''
+import json
+from cadastraFilmeDesejado import cadastraFilmeDesejadoDados
+from cadastraFilmesCatalogo import ingerirFilmes
+
+corpo, _ = cadastraFilmeDesejadoDados({'nome_filme': 'Matrix 5', 'usuario_id': 1})
+_, eventos = ingerirFilmes([{'id': 1, 'nome': 'Matrix 5'}])
+print(json.dumps([corpo['filme_desejado']['total_interessados'], eventos[0]['usuarios_interessados']]))
+'''
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_desejos_antigos_sem_preparar_armazenamento(arvore, backend):
+    # Caminho das Lambdas: ninguém chama preparar_armazenamento(), então os
+    # interessados antigos são migrados ao obter trava_desejados()
+    gravar_json(arvore / 'data' / 'filmes.json', {'Filmes': {}, 'Meta': {'1': {'versao_schema': 1}}})
+    gravar_json(arvore / 'data' / 'filmeUsuario.json', {'usuarios': {str(i): {'nome': f'U{i}', 'filmes': []} for i in (1, 2, 3)}})
+    gravar_json(arvore / 'data' / 'filmesDesejados.json', {'FilmesDesejados': {
+        '1': {'nome': 'Matrix 5', 'usuarios_interessados': [1, 2, 3], 'cadastrado_em': '2025-11-27T23:16:15Z'},
+    }})
+    if backend == 'sqlite':
+        # Banco copiado dos JSON sem passar pela migração dos desejados
+        executar(arvore, "import json; from migracao import migrar_backend; "
+                          "print(json.dumps(migrar_backend('sqlite', 'tinydb')))")
+
+    total, notificados = executar(arvore, SCRIPT_DESEJOS_ANTIGOS, backend)
+    assert total == 3
+    assert notificados == [1, 2, 3]
@@ -0,0 +1,154 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from buscaFilme import _candidatos_similares, _ranquear_similares
+from cache import CacheVersionado
+from catalogo import Catalogo
+from utilitarios import BACKENDS, executar, gravar_json
+
+PALAVRAS = (
+    'amor', 'aurora', 'cidade', 'deus', 'enigma', 'estrela', 'fim', 'guerra',
+    'homem', 'lua', 'mar', 'matrix', 'noite', 'ouro', 'rei', 'sertão', 'sol',
+    'terra', 'tempo', 'vento', 'volta', 'vida',
+)
+
+
+def _catalogo_sintetico(total=800, semente=12):
+    """
+    Catálogo com muitos títulos parecidos: sequências numeradas e palavras
+    repetidas geram empates na similaridade arredondada.
+    """
+    aleatorio = random.Random(semente)
+    documentos = {}
+    for doc_id in range(1, total + 1):
+        if doc_id % 10 == 0:
+            nome = f'{aleatorio.choice(PALAVRAS).title()} {aleatorio.randint(1, 9)}'
+        else:
+            nome = ' '.join(aleatorio.choice(PALAVRAS) for _ in range(aleatorio.randint(1, 4))).title()
+        documentos[doc_id] = {'id': doc_id, 'nome': nome}
+    return Catalogo(documentos, 1)
+
+
+def _buscas(catalogo, total=60, semente=7):
+    """
+    Títulos do catálogo com um caractere trocado ou cortados e combinações
+    de palavras que podem não existir, já em minúsculas e sem espaços nas
+    pontas (como _valida_buscas as passa adiante).
+    """
+    aleatorio = random.Random(semente)
+    nomes = [filme['nome'] for filme in catalogo.filmes]
+    buscas = ['matrix', 'o enigma da aurora', 'tempo', 'sol 3']
+    while len(buscas) < total:
+        nome = aleatorio.choice(nomes).lower()
+        sorteio = aleatorio.random()
+        if sorteio < 0.4 and len(nome) > 3:
+            posicao = aleatorio.randrange(len(nome))
+            nome = nome[:posicao] + aleatorio.choice('aeioulmnrst') + nome[posicao + 1:]
+        elif sorteio < 0.7:
+            nome = nome[:max(3, len(nome) * 2 // 3)]
+        else:
+            nome = ' '.join(aleatorio.choice(PALAVRAS) for _ in range(aleatorio.randint(1, 3)))
+        buscas.append(nome.strip())
+    return buscas
+
+
+def _ranking_de_referencia(nome_busca, filmes, limite=5):
+    """
+    O ranking original: similaridade de todos os títulos, os acima de 0.5
+    arredondados e ordenados (ordenação estável, então empates ficam na ordem
+    do catálogo) e os `limite` primeiros.
+    """
+    similares = []
+    for filme in filmes:
+        sim = SequenceMatcher(None, nome_busca, filme['nome'].lower().strip()).ratio()
+        if sim > 0.5:
+            similares.append((filme['id'], round(sim, 2)))
+    similares.sort(key=lambda item: item[1], reverse=True)
+    return similares[:limite]
+
+
+def test_top_k_do_indice_igual_ao_da_busca_exaustiva():
+    catalogo = _catalogo_sintetico()
+    empates = 0
+    for nome_busca in _buscas(catalogo):
+        esperado = _ranking_de_referencia(nome_busca, catalogo.filmes)
+        for modo in ('indice', 'exaustivo'):
+            candidatos = _candidatos_similares(catalogo, nome_busca, modo)
+            obtido = [(filme['id'], sim) for filme, sim in _ranquear_similares(nome_busca, candidatos)]
+            assert obtido == esperado, (modo, nome_busca)
+        sims = [sim for _, sim in esperado]
+        empates += len(sims) != len(set(sims))
+
+    # As buscas precisam exercitar o desempate pela ordem do catálogo
+    assert empates > 0
+
+
+def test_indice_acompanha_as_alteracoes_do_catalogo():
+    catalogo = _catalogo_sintetico(total=200)
+    alterado = catalogo.com_alteracoes(
+        {201: {'id': 201, 'nome': 'O Enigma da Aurora'}, 5: {'id': 5, 'nome': 'Aurora Boreal'}},
+        removidos=[10]
+    )
+    for nome_busca in ('o enigma da aurora', 'aurora boreal', catalogo.documentos[10]['nome'].lower()):
+        candidatos = _candidatos_similares(alterado, nome_busca, 'indice')
+        obtido = [(filme['id'], sim) for filme, sim in _ranquear_similares(nome_busca, candidatos)]
+        assert obtido == _ranking_de_referencia(nome_busca, alterado.filmes)
+
+
+def test_cache_versionado_descarta_outras_versoes():
+    agora = [0.0]
+    cache = CacheVersionado(2, ttl=10, relogio=lambda: agora[0])
+
+    cache.guardar('matrix', 1, 'a')
+    cache.guardar('duna', 1, 'b')
+    assert cache.obter('matrix', 1) == 'a'
+
+    # LRU: "duna" é o menos usado
+    cache.guardar('bacurau', 1, 'c')
+    assert cache.obter('duna', 1) is None
+
+    # Valor calculado a partir de uma versão já substituída é descartado
+    assert cache.obter('matrix', 2) is None
+    cache.guardar('matrix', 1, 'a')
+    assert cache.obter('matrix', 2) is None
+
+    cache.guardar('matrix', 2, 'a2')
+    agora[0] = 11
+    assert cache.obter('matrix', 2) is None
+
+    estatisticas = cache.estatisticas()
+    assert (estatisticas['acertos'], estatisticas['remocoes'], estatisticas['invalidacoes'], estatisticas['expiradas']) == (1, 1, 1, 1)
+
+
+SCRIPT_CACHE_BUSCA = '''
+import json
+from buscaFilme import buscaFilmeDados, cacheBuscaFilme
+from catalogo import gravar_filmes
+from migracao import preparar_armazenamento
+
+preparar_armazenamento()
+status = []
+for _ in range(2):
+    status.append(buscaFilmeDados('Matrix 5')[1])
+gravar_filmes([{'nome': 'Matrix 5', 'descricao': 'Nova'}])
+corpo, status_code = buscaFilmeDados('Matrix 5')
+status.append(status_code)
+print(json.dumps([status, corpo['match_exato'], corpo['dados']['descricao'], cacheBuscaFilme.estatisticas()]))
+'''
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_cache_da_busca_invalidado_quando_o_catalogo_muda(arvore, backend):
+    gravar_json(arvore / 'data' / 'filmes.json', {
+        'Filmes': {'1': {'id': 1, 'nome': 'Bacurau'}},
+        'Meta': {'1': {'versao_schema': 1}}
+    })
+
+    status, match_exato, descricao, estatisticas = executar(arvore, SCRIPT_CACHE_BUSCA, backend)
+
+    # A segunda busca sai do cache; a gravação troca a versão do catálogo
+    assert status == [404, 404, 200]
+    assert (match_exato, descricao) == (True, 'Nova')
+    assert (estatisticas['acertos'], estatisticas['falhas'], estatisticas['invalidacoes']) == (1, 2, 1)
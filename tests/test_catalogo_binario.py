@@ -0,0 +1,80 @@
+from utilitarios import chaves_inteiras, executar, gravar_json
+
+FILMES = {
+    str(doc_id): {
+        'id': doc_id * 10,
+        'nome': f'Filme {doc_id}',
+        'descricao': f'Descrição do filme {doc_id}',
+        'detalhes': {'ano': 1990 + doc_id, 'generos': ['Drama']},
+        'streamings': [{'plataforma': 'Netflix', 'disponivel_ate': '2030-01-01'}] if doc_id % 2 else []
+    }
+    for doc_id in range(1, 31)
+}
+
+SCRIPT_COMPILAR = '''
+import json
+from catalogoBinario import compilar_catalogo
+
+print(json.dumps(compilar_catalogo()['filmes']))
+'''
+
+SCRIPT_LER = '''
+import json
+from catalogo import CatalogoMapeado, obter_catalogo
+
+catalogo = obter_catalogo()
+print(json.dumps([isinstance(catalogo, CatalogoMapeado), {doc_id: dict(doc) for doc_id, doc in catalogo.documentos.items()}]))
+'''
+
+SCRIPT_GRAVAR = '''
+import json
+from buscaFilme import buscaFilmeDados
+from catalogo import CatalogoMapeado, gravar_filmes, obter_catalogo
+
+mapeado = isinstance(obter_catalogo(), CatalogoMapeado)
+gravar_filmes([
+    {'id': 30, 'nome': 'Filme Três', 'descricao': 'Renomeado'},
+    {'nome': 'Filme Novo', 'detalhes': {'ano': 2026}},
+])
+catalogo = obter_catalogo()
+corpo, status_code = buscaFilmeDados('filme trez')
+print(json.dumps({
+    'mapeado': mapeado,
+    'filmes': {doc_id: dict(doc) for doc_id, doc in catalogo.documentos.items()},
+    'nome_antigo': catalogo.filme_por_nome('Filme 3'),
+    'nome_novo': catalogo.filme_por_nome('filme três')['id'],
+    'busca': [status_code, corpo['similares'][0]['id']],
+}))
+'''
+
+
+def test_catalogo_compilado_consistente_apos_escrita(arvore):
+    gravar_json(arvore / 'data' / 'filmes.json', {'Filmes': FILMES, 'Meta': {'1': {'versao_schema': 1}}})
+    assert executar(arvore, SCRIPT_COMPILAR) == 30
+
+    mapeado, filmes = executar(arvore, SCRIPT_LER)
+    assert mapeado
+    assert chaves_inteiras(filmes) == chaves_inteiras(FILMES)
+
+    esperado = chaves_inteiras(FILMES)
+    esperado[3] = {'id': 30, 'nome': 'Filme Três', 'descricao': 'Renomeado'}
+    esperado[31] = {'id': 301, 'nome': 'Filme Novo', 'detalhes': {'ano': 2026}}
+
+    # O processo que grava aplica a escrita sobre o catálogo mapeado
+    resultado = executar(arvore, SCRIPT_GRAVAR)
+    assert resultado['mapeado']
+    assert chaves_inteiras(resultado['filmes']) == esperado
+    assert resultado['nome_antigo'] is None
+    assert resultado['nome_novo'] == 30
+    assert resultado['busca'] == [200, 30]
+
+    # Os outros processos não usam o compilado desatualizado (a escrita
+    # ficou no journal) até ele ser gerado de novo
+    mapeado, filmes = executar(arvore, SCRIPT_LER)
+    assert not mapeado
+    assert chaves_inteiras(filmes) == esperado
+
+    assert executar(arvore, SCRIPT_COMPILAR) == 31
+    mapeado, filmes = executar(arvore, SCRIPT_LER)
+    assert mapeado
+    assert chaves_inteiras(filmes) == esperado
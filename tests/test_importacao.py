@@ -0,0 +1,148 @@
+import json
+
+import pytest
+
+from utilitarios import BACKENDS, executar, gravar_json
+
+SCRIPT_IMPORTACAO = '''
+import json
+import os
+from buscaFilme import buscaFilmeDados
+from cadastraFilmeDesejado import cadastraFilmeDesejadoDados
+from catalogo import obter_catalogo
+from importacao import importar_catalogo
+from migracao import preparar_armazenamento
+
+preparar_armazenamento()
+cadastraFilmeDesejadoDados({'nome_filme': 'Matrix 5', 'usuario_id': 1})
+
+parciais = []
+journal_nos_lotes = []
+
+def progresso(parcial):
+    parciais.append([parcial['lidos'], parcial['inseridos'], parcial['atualizados'], parcial['erros']])
+    journal_nos_lotes.append(os.path.exists('../data/filmes.journal'))
+
+resumo = importar_catalogo(ARQUIVO, tamanho_lote=2, progresso=progresso)
+catalogo = obter_catalogo()
+busca, status_code = buscaFilmeDados('Matrix V')
+print(json.dumps({
+    'resumo': [resumo[campo] for campo in ('lidos', 'inseridos', 'atualizados', 'erros', 'notificacoes', 'lotes', 'escritas')],
+    'linhas_com_erro': [erro['linha'] for erro in resumo['primeiros_erros']],
+    'parciais': parciais,
+    'filmes': {str(filme['id']): filme for filme in catalogo.filmes},
+    'similar': [status_code, busca['similares'][0]['nome']],
+    'journal_nos_lotes': any(journal_nos_lotes),
+    'journal': os.path.exists('../data/filmes.journal'),
+}))
+'''
+
+JSONL = [
+    '{"id": 1, "nome": "Bacurau", "descricao": "Atualizada"}',
+    '{"id": 2, "nome": "Matrix 5", "detalhes": {"ano": 2027}}',
+    'isto não é JSON',
+    '',
+    '{"nome": "Aquarius"}',
+    '{"id": 4}',
+    '[1, 2]',
+    '{"id": 5, "nome": "Tropa de Elite", "streamings": [{"plataforma": "Netflix"}]}',
+]
+
+CSV = [
+    'id,nome,descricao,ano,generos,streamings',
+    '1,Bacurau,Atualizada,,,',
+    '2,Matrix 5,,2027,Ação|Ficção,',
+    '3,Aquarius,,não é ano,,',
+    ',Aquarius,,2016,Drama,',
+    '4,,Sem nome,,,',
+    '6,Marte Um,,,,não é JSON',
+    '5,Tropa de Elite,,,,"[{""plataforma"": ""Netflix""}]"',
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('formato', ('jsonl', 'csv'))
+def test_importacao_em_lotes_faz_upsert_e_conta_erros(arvore, backend, formato):
+    gravar_json(arvore / 'data' / 'filmes.json', {
+        'Filmes': {'1': {'id': 1, 'nome': 'Bacurau'}},
+        'Meta': {'1': {'versao_schema': 1}}
+    })
+    gravar_json(arvore / 'data' / 'filmeUsuario.json', {'usuarios': {'1': {'nome': 'Ana', 'filmes': []}}})
+    dump = arvore / f'catalogo.{formato}'
+    dump.write_text('\n'.join(JSONL if formato == 'jsonl' else CSV) + '\n', encoding='utf-8')
+
+    resultado = executar(arvore, f'ARQUIVO = {str(dump)!r}\n' + SCRIPT_IMPORTACAO, backend)
+
+    # 7 registros em lotes de 2: Bacurau atualizado, 3 inseridos (Matrix 5
+    # notifica quem o desejava) e 3 erros; o lote só com erros não grava
+    assert resultado['resumo'] == [7, 3, 1, 3, 1, 4, 3]
+    assert resultado['linhas_com_erro'] == ([3, 6, 7] if formato == 'jsonl' else [4, 6, 7])
+    assert resultado['parciais'] == [[2, 1, 1, 0], [4, 2, 1, 1], [6, 2, 1, 3], [7, 3, 1, 3]]
+
+    filmes = resultado['filmes']
+    assert sorted(filmes, key=int) == ['1', '2', '3', '5']
+    assert filmes['1']['descricao'] == 'Atualizada'
+    # Sem id, o filme recebe o próximo livre
+    assert filmes['3']['nome'] == 'Aquarius'
+    assert filmes['2']['detalhes']['ano'] == 2027
+    assert filmes['5']['streamings'] == [{'plataforma': 'Netflix'}]
+    # Índice de busca atualizado pelos lotes
+    assert resultado['similar'] == [200, 'Matrix 5']
+    # No TinyDB os lotes vão para o journal, incorporado ao filmes.json no fim
+    assert resultado['journal_nos_lotes'] is (backend == 'tinydb')
+    assert resultado['journal'] is False
+
+    if backend == 'tinydb':
+        with open(arvore / 'data' / 'filmes.json', encoding='utf-8') as f:
+            assert sorted(json.load(f)['Filmes'], key=int) == ['1', '2', '3', '4']
+
+
+SCRIPT_ADICAO_EM_LOTE = '''
+import json
+from adicionaFilme import adicionaFilmesDados
+from listarCatalogoUsuario import listarCatalogoUsuarioDados
+from migracao import preparar_armazenamento
+from usuarios import versao_lista_usuario
+
+preparar_armazenamento()
+corpo, status_code = adicionaFilmesDados({'usuario': 'ANA', 'filmes': [
+    {'filme': {'id': 1}, 'status': 'assistido'},
+    {'filme': {'nome': 'cidade de deus'}, 'status': 'quero assistir'},
+    {'filme': {'id': 99}, 'status': 'assistido'},
+    {'filme': {'nome': 'Cidade de Deus'}, 'status': 'assistido'},
+    {'filme': {'id': 3}, 'status': 'talvez'},
+    'Aquarius',
+]})
+lista, _ = listarCatalogoUsuarioDados(1)
+print(json.dumps({
+    'status': status_code,
+    'totais': [corpo['total'], corpo['total_sucesso'], corpo['total_erros']],
+    'sucessos': [resultado['sucesso'] for resultado in corpo['resultados']],
+    'usuario_id': corpo['usuario_id'],
+    'lista': [[filme['id'], filme['status']] for filme in lista['dados']['assistidos'] + lista['dados']['quero_assistir']],
+    'versao_lista': versao_lista_usuario(1),
+}))
+'''
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_adicao_em_lote_deduplica_e_grava_uma_vez(arvore, backend):
+    gravar_json(arvore / 'data' / 'filmes.json', {
+        'Filmes': {str(i): {'id': i, 'nome': nome} for i, nome in enumerate(('Bacurau', 'Cidade de Deus', 'Aquarius'), start=1)},
+        'Meta': {'1': {'versao_schema': 1}}
+    })
+    gravar_json(arvore / 'data' / 'filmeUsuario.json', {'usuarios': {'1': {
+        'nome': 'Ana',
+        'filmes': [{'id': 1, 'nome': 'Bacurau', 'status': 'quero assistir', 'adicionado_em': '2025-01-01T00:00:00Z'}],
+        'versao_lista': 3
+    }}})
+
+    resultado = executar(arvore, SCRIPT_ADICAO_EM_LOTE, backend)
+
+    assert resultado['status'] == 200
+    assert resultado['totais'] == [6, 3, 3]
+    assert resultado['sucessos'] == [True, True, False, True, False, False]
+    assert resultado['usuario_id'] == 1
+    # Bacurau e Cidade de Deus atualizados no lugar, sem duplicar
+    assert resultado['lista'] == [[1, 'assistido'], [2, 'assistido']]
+    assert resultado['versao_lista'] == 4
@@ -0,0 +1,144 @@
+import pytest
+
+from utilitarios import BACKENDS, executar, gravar_json
+
+FILMES = {
+    str(filme_id): {
+        'id': filme_id,
+        'nome': nome,
+        'descricao': f'Descrição de {nome}',
+        'detalhes': {'ano': 2000 + filme_id},
+        'streamings': [{'plataforma': 'Netflix'}]
+    }
+    for filme_id, nome in enumerate(('Bacurau', 'Cidade de Deus', 'Central do Brasil', 'Aquarius', 'Tropa de Elite', 'O Som ao Redor', 'Marte Um'), start=1)
+}
+
+# Datas repetidas: a paginação desempata por id e nome
+FILMES_ANA = [
+    {'id': filme_id, 'nome': FILMES[str(filme_id)]['nome'], 'status': status, 'adicionado_em': adicionado_em}
+    for filme_id, status, adicionado_em in (
+        (3, 'assistido', '2025-01-02T00:00:00Z'),
+        (1, 'quero assistir', '2025-01-01T00:00:00Z'),
+        (5, 'assistido', '2025-01-02T00:00:00Z'),
+        (2, 'Assistido', '2025-01-03T00:00:00Z'),
+        (4, 'quero assistir', '2025-01-02T00:00:00Z'),
+        (6, 'assistido', '2025-01-01T00:00:00Z'),
+    )
+]
+
+
+@pytest.fixture
+def dados_listagem(arvore):
+    gravar_json(arvore / 'data' / 'filmes.json', {'Filmes': FILMES, 'Meta': {'1': {'versao_schema': 1}}})
+    gravar_json(arvore / 'data' / 'filmeUsuario.json', {'usuarios': {
+        '1': {'nome': 'Ana', 'filmes': FILMES_ANA, 'versao_lista': 1},
+    }})
+    return arvore
+
+
+SCRIPT_ETAG = '''
+import json
+from adicionaFilme import adicionaFilmeDados
+from app import criar_app
+
+cliente = criar_app().test_client()
+url = '/api/listar-catalogo-usuario/1'
+
+primeira = cliente.get(url)
+etag = primeira.headers['ETag']
+repetida = cliente.get(url, headers={'If-None-Match': etag})
+adicionaFilmeDados({'usuario': 'ana', 'filme': {'id': 7}, 'status': 'quero assistir'})
+depois_da_adicao = cliente.get(url, headers={'If-None-Match': etag})
+
+print(json.dumps({
+    'status': [primeira.status_code, repetida.status_code, depois_da_adicao.status_code],
+    'corpo_304': repetida.get_data(as_text=True),
+    'etags': [etag, repetida.headers['ETag'], depois_da_adicao.headers['ETag']],
+    'totais': [primeira.get_json()['dados']['total'], depois_da_adicao.get_json()['dados']['total']],
+}))
+'''
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_etag_e_304_ate_a_lista_mudar(dados_listagem, backend):
+    resultado = executar(dados_listagem, SCRIPT_ETAG, backend)
+
+    assert resultado['status'] == [200, 304, 200]
+    assert resultado['corpo_304'] == ''
+    primeira, repetida, depois_da_adicao = resultado['etags']
+    assert repetida == primeira
+    assert depois_da_adicao != primeira
+    assert resultado['totais'] == [6, 7]
+
+
+SCRIPT_PAGINAS = '''
+import json
+from app import criar_app
+
+cliente = criar_app().test_client()
+
+
+def paginas(status=None):
+    filmes = []
+    cursor = None
+    while True:
+        parametros = {'limite': 2}
+        if cursor:
+            parametros['cursor'] = cursor
+        if status:
+            parametros['status'] = status
+        dados = cliente.get('/api/listar-catalogo-usuario/1', query_string=parametros).get_json()['dados']
+        pagina = dados['assistidos'] + dados['quero_assistir']
+        filmes.append(sorted((filme['adicionado_em'], filme['id']) for filme in pagina))
+        cursor = dados['paginacao']['proximo_cursor']
+        if cursor is None:
+            return filmes, [dados['total'], dados['total_assistidos'], dados['total_quero_assistir']]
+
+
+print(json.dumps({'todos': paginas(), 'assistidos': paginas('assistido')}))
+'''
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_paginas_por_cursor_cobrem_a_lista_sem_repetir(dados_listagem, backend):
+    resultado = executar(dados_listagem, SCRIPT_PAGINAS, backend)
+
+    ordem = sorted((filme['adicionado_em'], filme['id']) for filme in FILMES_ANA)
+    for grupo, esperado in (('todos', ordem), ('assistidos', [chave for chave in ordem if chave[1] in (2, 3, 5, 6)])):
+        paginas, totais = resultado[grupo]
+        # Totais da lista inteira em todas as páginas
+        assert totais == [6, 4, 2]
+        assert all(len(pagina) <= 2 for pagina in paginas)
+        assert [[list(chave) for chave in pagina] for pagina in paginas] == [
+            [list(chave) for chave in esperado[inicio:inicio + 2]] for inicio in range(0, len(esperado), 2)
+        ]
+
+
+SCRIPT_STREAM = '''
+import json
+import listarCatalogoUsuario
+from app import criar_app
+
+# Lotes pequenos: o documento sai em vários pedaços
+listarCatalogoUsuario.LOTE_STREAMING = 2
+cliente = criar_app().test_client()
+url = '/api/listar-catalogo-usuario/1'
+
+resultado = {}
+for status in (None, 'assistido', 'quero assistir'):
+    parametros = {'status': status} if status else {}
+    stream = cliente.get(url + '/stream', query_string=parametros)
+    pedacos = [pedaco.decode('utf-8') for pedaco in stream.response]
+    regular = cliente.get(url, query_string=parametros).get_json()
+    resultado[status or 'todos'] = [len(pedacos), json.loads(''.join(pedacos)) == regular]
+print(json.dumps(resultado))
+'''
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_stream_gera_o_mesmo_documento_da_listagem(dados_listagem, backend):
+    resultado = executar(dados_listagem, SCRIPT_STREAM, backend)
+
+    for status, (pedacos, igual) in resultado.items():
+        assert igual, status
+        assert pedacos > 4, status
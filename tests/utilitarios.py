@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKENDS = ('tinydb', 'sqlite')
+
+
+def gravar_json(path, dados):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False)
+
+
+def chaves_inteiras(documentos):
+    return {int(doc_id): doc for doc_id, doc in documentos.items()}
+
+
+def executar(arvore, script, backend='tinydb'):
+    """
+    Roda `script` na cópia de functions/ e devolve o JSON da última linha impressa.
+    """
+    env = {**os.environ, 'MOVIEFINDER_BACKEND': backend, 'MOVIEFINDER_ARMAZENAMENTO_USUARIOS': 'tinydb'}
+    saida = subprocess.run(
+        [sys.executable, '-c', script], cwd=arvore / 'functions', env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(saida.splitlines()[-1])